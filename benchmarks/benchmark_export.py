@@ -0,0 +1,137 @@
+"""Benchmark the crowdsale export against the replay server.
+
+Runs the same pipeline as ``export-transactions.py`` over synthetic chains of
+different sizes, each in a fresh process, and reports wall time, JSON-RPC
+usage and peak memory. No Ethereum node needed::
+
+    python benchmarks/benchmark_export.py --sizes 1000 100000 --latency 0.01 --json results.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from web3 import HTTPProvider, Web3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from edgeless.batchrpc import BatchRPC  # noqa: E402
+from edgeless.export import EventWriter, ExportState, aggregate, write_csv  # noqa: E402
+from edgeless.logscanner import find_deployment_block  # noqa: E402
+from edgeless.pipeline import fund_transfer_windows  # noqa: E402
+from edgeless.replayserver import SYNTHETIC_ADDRESS, ReplayServer, SyntheticChain  # noqa: E402
+from edgeless.timestamps import BlockTimestampCache  # noqa: E402
+
+
+def run_export(endpoint_uri: str, args, results: multiprocessing.Queue):
+    """Do one export in a child process, so peak memory is measured per run."""
+    web3 = Web3(HTTPProvider(endpoint_uri))
+    batch = BatchRPC.from_web3(web3, batch_size=args.batch_size)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        started = time.time()
+        timestamps = BlockTimestampCache(web3, os.path.join(temp_dir, "timestamps.sqlite"), batch=batch)
+        start_block = find_deployment_block(web3, SYNTHETIC_ADDRESS)
+        scanner, windows = fund_transfer_windows(
+            web3, batch, timestamps, SYNTHETIC_ADDRESS, start_block, web3.eth.blockNumber, window=args.window,
+            concurrency=args.concurrency, processes=args.processes)
+
+        output = os.path.join(temp_dir, "transactions.csv")
+        events = 0
+        if args.mode == "aggregate":
+            state = ExportState(SYNTHETIC_ADDRESS)
+            for _, _, window_events in aggregate(windows, state):
+                events += len(window_events)
+            write_csv(state, output)
+        else:
+            writer = EventWriter(output)
+            for _, _, window_events in writer.write(windows):
+                events += len(window_events)
+            writer.close()
+        timestamps.close()
+        elapsed = time.time() - started
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    results.put({"events": events, "seconds": elapsed, "peak_rss_kb": max(usage, children)})
+
+
+def wait_for_result(child: multiprocessing.Process, results: multiprocessing.Queue, timeout: float) -> dict:
+    """Get the result of a run, exit if the child crashed or took too long."""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not child.is_alive():
+                sys.exit("Export process died with exit code {}".format(child.exitcode))
+            if time.time() > deadline:
+                child.terminate()
+                child.join()
+                sys.exit("Export did not finish in {} seconds".format(timeout))
+
+    child.join(timeout)
+    if child.exitcode != 0:
+        sys.exit("Export process exited with code {}".format(child.exitcode))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000], help="Number of FundTransfer events per run")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every HTTP round trip")
+    parser.add_argument("--max-results", type=int, default=10000, help="Replay server eth_getLogs result cap")
+    parser.add_argument("--mode", choices=["aggregate", "events"], default="aggregate")
+    parser.add_argument("--window", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=3600, help="Give up on a run after this many seconds")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    print("{:>9} {:>9} {:>9} {:>10} {:>10} {:>10}".format("events", "seconds", "events/s", "round trips", "rpc calls", "peak MB"))
+
+    report = []
+    for size in args.sizes:
+        server = ReplayServer(("127.0.0.1", 0), SyntheticChain(size), latency=args.latency, max_results=args.max_results)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        results = multiprocessing.Queue()
+        child = multiprocessing.Process(target=run_export, args=(server.endpoint_uri, args, results))
+        child.start()
+        try:
+            result = wait_for_result(child, results, args.timeout)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        stats = server.stats()
+        result["size"] = size
+        result["round_trips"] = stats["round_trips"]
+        result["calls"] = stats["calls"]
+        report.append(result)
+
+        print("{:>9} {:>9.2f} {:>9.0f} {:>10} {:>10} {:>10.1f}".format(
+            result["events"], result["seconds"], result["events"] / result["seconds"],
+            result["round_trips"], sum(stats["calls"].values()), result["peak_rss_kb"] / 1024))
+
+        if result["events"] != size:
+            sys.exit("Exported {} events, expected {}".format(result["events"], size))
+
+    if args.json:
+        with open(args.json, "wt") as out:
+            json.dump({"settings": vars(args), "results": report}, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Load test the crowdsale with thousands of synthetic investors.
+
+Funds the investors on an in-process EVM and fires their purchases in
+blocks limited by the block gas limit, then reports purchases per block, gas
+used, failure rate and how ``tokensSold`` grew over time. No Ethereum node
+needed, run from the project folder::
+
+    python benchmarks/crowdsale_load.py --investors 5000 --purchases 20000 --size lognormal --median 5 --time rush --half-life 3600 --csv blocks.csv
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from edgeless.compilecache import cached_project  # noqa: E402
+from edgeless.evmchain import DEFAULT_BLOCK_GAS_LIMIT, DEFAULT_STARTGAS, EVMChain  # noqa: E402
+from edgeless.loadgen import (  # noqa: E402
+    BlockStats, LoadGenerator, fixed_size, lognormal_size, plan_purchases, rush_time, summarise, tier_time,
+    uniform_size, uniform_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--investors", type=int, default=1000)
+    parser.add_argument("--purchases", type=int, default=None, help="Defaults to one per investor")
+    parser.add_argument("--size", choices=["fixed", "uniform", "lognormal"], default="lognormal", help="Purchase size distribution")
+    parser.add_argument("--median", type=float, default=5.0, help="Purchase size in ether: fixed size, or lognormal median")
+    parser.add_argument("--sigma", type=float, default=1.5, help="Lognormal spread")
+    parser.add_argument("--low", type=float, default=0.1, help="Uniform size minimum in ether")
+    parser.add_argument("--high", type=float, default=50.0, help="Uniform size maximum in ether")
+    parser.add_argument("--time", choices=["rush", "uniform", "tiers"], default="rush", help="Purchase time distribution")
+    parser.add_argument("--half-life", type=float, default=3600.0, help="Rush: seconds until buying interest halves")
+    parser.add_argument("--tier-weights", type=float, nargs=4, default=[0.4, 0.3, 0.2, 0.1], help="Tiers: share of purchases in each price tier")
+    parser.add_argument("--block-time", type=int, default=15)
+    parser.add_argument("--block-gas-limit", type=int, default=DEFAULT_BLOCK_GAS_LIMIT)
+    parser.add_argument("--startgas", type=int, default=DEFAULT_STARTGAS, help="Gas limit investors put on their purchase")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", default=None, help="Write per block stats to this file")
+    parser.add_argument("--json", default=None, help="Write the summary to this file")
+    args = parser.parse_args()
+
+    project = cached_project()
+    chain = EVMChain(project.compiled_contracts, block_gas_limit=args.block_gas_limit)
+    generator = LoadGenerator(chain, args.investors, block_time=args.block_time, startgas=args.startgas)
+    boundaries = generator.boundaries()
+    start, end = boundaries[0], boundaries[-1]
+
+    size = {
+        "fixed": lambda: fixed_size(args.median),
+        "uniform": lambda: uniform_size(args.low, args.high),
+        "lognormal": lambda: lognormal_size(args.median, args.sigma),
+    }[args.size]()
+    purchase_time = {
+        "rush": lambda: rush_time(start, end, args.half_life),
+        "uniform": lambda: uniform_time(start, end),
+        "tiers": lambda: tier_time(boundaries, args.tier_weights),
+    }[args.time]()
+
+    purchases = plan_purchases(args.purchases or args.investors, args.investors, size, purchase_time, seed=args.seed)
+
+    out = writer = None
+    if args.csv:
+        out = open(args.csv, "wt")
+        writer = csv.writer(out)
+        writer.writerow(BlockStats._fields)
+
+    print("{:>8} {:>20} {:>9} {:>8} {:>10} {:>8} {:>12}".format("block", "time", "purchases", "failed", "gas used", "pending", "tokens sold"))
+
+    started = time.time()
+    blocks = []
+    for stats in generator.run(purchases):
+        blocks.append(stats)
+        if writer:
+            writer.writerow(stats)
+        if len(blocks) % 100 == 1:
+            print("{:>8} {:>20} {:>9} {:>8} {:>10} {:>8} {:>12}".format(
+                stats.number, datetime.datetime.utcfromtimestamp(stats.timestamp).strftime("%Y-%m-%d %H:%M:%S"),
+                stats.purchases, stats.failures, stats.gas_used, stats.pending, stats.tokens_sold))
+    elapsed = time.time() - started
+
+    if out:
+        out.close()
+
+    summary = summarise(blocks, boundaries, args.block_gas_limit)
+    summary["seconds"] = elapsed
+    summary["purchase_gas"] = generator.purchase_gas
+    summary["failure_gas"] = generator.failure_gas
+
+    print()
+    print("Blocks with purchases:   {blocks}, {full_blocks} of them full".format(**summary))
+    print("Purchases:               {purchases}, {failures} failed ({:.1%})".format(summary["failure_rate"], **summary))
+    print("Purchases per block:     {purchases_per_block:.1f} on average, {max_purchases_per_block} at most".format(**summary))
+    print("Most waiting purchases:  {max_pending}".format(**summary))
+    print("Gas used:                {gas_used}, failed purchases burned {failure_gas}".format(**summary))
+    print("Successful buys by tier: {}".format(", ".join(str(n) for n in summary["tier_purchases"])))
+    print("Tokens sold:             {tokens_sold}".format(**summary))
+    print("Ether raised:            {}".format(summary["amount_raised"] / 10 ** 18))
+    print("Simulated in {:.1f} seconds, {:.0f} purchases/s".format(elapsed, summary["purchases"] / elapsed if elapsed else 0))
+
+    if args.json:
+        with open(args.json, "wt") as out:
+            json.dump({"settings": vars(args), "summary": summary}, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Print gas used by crowdsale and token functions.
+
+Runs every scenario of :py:mod:`edgeless.gasprofile` on an in-process EVM
+and compares against the budgets in ``tests/gas-baseline.json`` if it has
+been recorded, or against the gas optimised contracts. Run from the project folder::
+
+    python benchmarks/gas_profile.py
+    python benchmarks/gas_profile.py --optimised
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from edgeless.compilecache import cached_project  # noqa: E402
+from edgeless.evmchain import OPTIMISED_CONTRACTS  # noqa: E402
+from edgeless.gasprofile import load_baseline, over_budget, profile  # noqa: E402
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "..", "tests", "gas-baseline.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--optimised", action="store_true", help="Show gas saved by the optimised contracts instead")
+    args = parser.parse_args()
+
+    project = cached_project()
+    gas = profile(project.compiled_contracts)
+
+    if args.optimised:
+        optimised = profile(project.compiled_contracts, contracts=OPTIMISED_CONTRACTS)
+        print("{:<50} {:>8} {:>9} {:>8}".format("scenario", "gas", "optimised", "saved"))
+        for name, used in gas.items():
+            print("{:<50} {:>8} {:>9} {:>8}".format(name, used, optimised[name], used - optimised[name]))
+        print("{:<50} {:>8} {:>9} {:>8}".format("total", sum(gas.values()), sum(optimised.values()), sum(gas.values()) - sum(optimised.values())))
+        return
+    baseline = load_baseline(args.baseline)
+
+    print("{:<50} {:>8} {:>8} {:>8}".format("scenario", "gas", "budget", "change"))
+    for name, used in gas.items():
+        budget = baseline.get(name)
+        if budget is None:
+            print("{:<50} {:>8} {:>8} {:>8}".format(name, used, "-", "-"))
+        else:
+            print("{:<50} {:>8} {:>8} {:>+8}".format(name, used, budget, used - budget))
+
+    over = over_budget(gas, baseline)
+    if over:
+        print()
+        print("Over budget: {}".format(", ".join(sorted(over))))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
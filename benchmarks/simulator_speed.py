@@ -0,0 +1,106 @@
+"""Measure how many transactions per second the reference simulator runs.
+
+Random operation sequences, the mix and length of the cross-check against
+the contracts, each run on a fresh :py:mod:`edgeless.simulator` sale. The
+mix draws ``checkGoalReached`` after the last deadline often enough to close
+the sale within a couple of hundred operations, after which investments
+fail on the first check, so long sequences would mostly time failures.
+
+Investments and token transfers are then timed on their own on a live sale,
+counting the ones that went through. No Ethereum or solc needed::
+
+    python benchmarks/simulator_speed.py --sequences 5000 --operations 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from edgeless.simulator import START, TOKEN_START, Simulation, apply, random_operations  # noqa: E402
+
+
+#: Operations per second the simulator was meant to reach
+TARGET = 1000000
+
+#: Investors of the plain investment and transfer runs
+INVESTORS = 1000
+
+
+def report(name: str, operations: int, succeeded: int, elapsed: float):
+    rate = operations / elapsed
+    print("{:<14} {:>8} operations, {:>8} succeeded, {:>9.0f} operations/s, {:.1f}x short of {}/s".format(
+        name, operations, succeeded, rate, TARGET / rate, TARGET))
+
+
+def random_sequences(sequences: int, length: int, seed: int):
+    """Cross-check length sequences, a fresh sale each."""
+    rnd = random.Random(seed)
+    batches = [random_operations(rnd, length) for i in range(sequences)]
+
+    started = time.time()
+    results = []
+    for operations in batches:
+        simulation = Simulation()
+        results.append([apply(simulation, operation) for operation in operations])
+    elapsed = time.time() - started
+
+    total, succeeded = Counter(), Counter()
+    for operations, outcomes in zip(batches, results):
+        for operation, outcome in zip(operations, outcomes):
+            total[operation.function] += 1
+            succeeded[operation.function] += outcome
+    report("Random mix", sum(total.values()), sum(succeeded.values()), elapsed)
+    for function in ("invest", "send", "transfer"):
+        print("  {:<12} {:>8} drawn, {:>8} succeeded".format(function, total[function], succeeded[function]))
+
+
+def investments(count: int):
+    """Plain method calls on an open sale, one token each."""
+    simulation = Simulation()
+    simulation.set_current(START + 1)
+    invest = simulation.crowdsale.invest
+    started = time.time()
+    succeeded = 0
+    for i in range(count):
+        investor = 2 + i % INVESTORS
+        succeeded += invest(investor, investor, 10 ** 15)
+    report("Investments", count, succeeded, time.time() - started)
+
+
+def transfers(count: int):
+    """Plain method calls after the sale, between investors holding tokens."""
+    simulation = Simulation()
+    simulation.set_current(START + 1)
+    for investor in range(2, 2 + INVESTORS):
+        simulation.invest(investor, investor, 10 ** 18)
+    simulation.set_current(TOKEN_START + 1)
+
+    transfer = simulation.token.transfer
+    started = time.time()
+    succeeded = 0
+    for i in range(count):
+        sender = 2 + i % INVESTORS
+        succeeded += transfer(sender, 2 + (i + 1) % INVESTORS, 1)
+    report("Transfers", count, succeeded, time.time() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sequences", type=int, default=5000, help="Random sequences, each on a fresh sale")
+    parser.add_argument("--length", type=int, default=200, help="Operations in a random sequence")
+    parser.add_argument("--operations", type=int, default=1000000, help="Investments and transfers in the plain runs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random_sequences(args.sequences, args.length, args.seed)
+    investments(args.operations)
+    transfers(args.operations)
+
+
+if __name__ == "__main__":
+    main()
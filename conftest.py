@@ -0,0 +1 @@
+"""Make the edgeless helper package importable when running py.test tests."""
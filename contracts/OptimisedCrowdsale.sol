@@ -0,0 +1,213 @@
+/**
+*	Crowdsale for Edgeless Tokens, gas optimised.
+*	Behaves like TestableCrowdsale.sol for every input the crowdsale can meet, verified by tests/test_optimised.py.
+*	Where the gas goes:
+*	- price tiers and goals are constants instead of storage
+*	- storage reads are cached in memory, current() is read once per call
+*	- beneficiary, start and flags share a slot, as do the multisig and the time override, and amountRaised and tokensSold
+*	What differs from the original because of it:
+*	- start and the time override are uint64. A constructor _start or setCurrent() argument of 2**64 or more
+*	  keeps only its low 64 bits, the original keeps all of it. If those bits are 0, current() falls back to now.
+*	- amountRaised and tokensSold are uint128. invest() throws if amountRaised would reach 2**128 wei, where the
+*	  original stores it. A buy pays less than twice the price of its tokens and at most maxGoal tokens are sold,
+*	  which keeps amountRaised below 10**24 wei, so this throw is never reached.
+*	- the getters of start, amountRaised and tokensSold are typed uint64 and uint128 in the ABI, the values
+*	  they return are encoded the same.
+*	- current() is declared constant, so web3 calls it instead of sending a transaction.
+**/
+
+pragma solidity ^0.4.6;
+
+contract token {
+	function transferFrom(address sender, address receiver, uint amount) returns(bool success){}
+	function burn() {}
+}
+
+contract SafeMath {
+  //internals
+
+  function safeMul(uint a, uint b) internal returns (uint) {
+    uint c = a * b;
+    assert(a == 0 || c / a == b);
+    return c;
+  }
+
+  function safeSub(uint a, uint b) internal returns (uint) {
+    assert(b <= a);
+    return a - b;
+  }
+
+  function safeAdd(uint a, uint b) internal returns (uint) {
+    uint c = a + b;
+    assert(c>=a && c>=b);
+    return c;
+  }
+
+  function assert(bool assertion) internal {
+    if (!assertion) throw;
+  }
+}
+
+
+contract OptimisedCrowdsale is SafeMath {
+	/* if the funding goal is not reached, investors may withdraw their funds */
+	uint public constant fundingGoal = 50000000;
+	/* the maximum amount of tokens to be sold */
+	uint public constant maxGoal = 440000000;
+	/* there are different prices in different time intervals */
+	uint constant DEADLINE_1 = 1488297600;
+	uint constant DEADLINE_2 = 1488902400;
+	uint constant DEADLINE_3 = 1489507200;
+	uint constant DEADLINE_4 = 1490112000;
+	uint constant PRICE_1 = 833333333333333;
+	uint constant PRICE_2 = 909090909090909;
+	uint constant PRICE_3 = 952380952380952;
+	uint constant PRICE_4 = 1000000000000000;
+
+	/* tokens will be transfered from this address */
+	address public beneficiary = 0;
+	/* the start date of the crowdsale */
+	uint64 public start = 1488294000;
+	/* indicated if the funding goal has been reached. */
+	bool public fundingGoalReached = false;
+	/* indicates if the crowdsale has been closed already */
+	bool public crowdsaleClosed = false;
+
+	/* the multisignature wallet on which the funds will be stored */
+	address msWallet = 0;
+	/* Time override. Set to non-zero to allow test different moments. */
+	uint64 _current = 0;
+
+	/* the address of the token contract */
+	token public tokenReward;
+
+	/* how much has been raised by crowdale (in ETH) */
+	uint128 public amountRaised;
+	/* the number of tokens already sold */
+	uint128 public tokensSold;
+
+	/* the balances (in ETH) of all investors */
+	mapping(address => uint256) public balanceOf;
+	/* notifying transfers and the success of the crowdsale*/
+	event GoalReached(address beneficiary, uint amountRaised);
+	event FundTransfer(address backer, uint amount, bool isContribution, uint amountRaised);
+
+
+    /*  initialization, set the token address */
+    function OptimisedCrowdsale(address _beneficiary, address _msWallet, uint _start) {
+        beneficiary = _beneficiary;
+        msWallet = _msWallet;
+
+        // Allow to override the start time to test the contract in testnet
+        if(_start > 0) {
+            start = uint64(_start);
+        }
+    }
+
+    /** Override current() for testing */
+    function current() public constant returns (uint) {
+        uint64 time = _current;
+        if(time == 0) {
+            return now;
+        }
+        return time;
+    }
+
+    function setCurrent(uint __current) {
+        _current = uint64(__current);
+    }
+
+    /* Build circular references between contracts. Only in test version. */
+    function setToken(address _token) public {
+        if(msg.sender != beneficiary) throw;
+        if(address(tokenReward) != 0) throw; // No double set
+        tokenReward = token(_token);
+    }
+
+    /* invest by sending ether to the contract. */
+    function () payable{
+		if(msg.sender != msWallet) //do not trigger investment if the multisig wallet is returning the funds
+        	invest(msg.sender);
+    }
+
+    /* make an investment
+    *  only callable if the crowdsale started and hasn't been closed already and the maxGoal wasn't reached yet.
+    *  the current token price is looked up and the corresponding number of tokens is transfered to the receiver.
+    *  the sent value is directly forwarded to a safe multisig wallet.
+    *  this method allows to purchase tokens in behalf of another address.*/
+    function invest(address receiver) payable{
+    	uint amount = msg.value;
+    	uint time = current();
+    	uint price = priceAt(time);
+    	if(price > amount) throw;
+		uint numTokens = amount / price;
+		uint sold = safeAdd(tokensSold, numTokens);
+		if (crowdsaleClosed||time<start||sold>maxGoal) throw;
+		if(!msWallet.send(amount)) throw;
+		balanceOf[receiver] = safeAdd(balanceOf[receiver],amount);
+		uint raised = safeAdd(amountRaised, amount);
+		if(raised != uint128(raised)) throw; // more than all ether there is
+		amountRaised = uint128(raised);
+		tokensSold = uint128(sold);
+		if(!tokenReward.transferFrom(beneficiary, receiver, numTokens)) throw;
+        FundTransfer(receiver, amount, true, raised);
+    }
+
+    /* looks up the current token price */
+    function getPrice() constant returns (uint256 price){
+        return priceAt(current());
+    }
+
+    function priceAt(uint time) internal constant returns (uint256 price){
+        if(time < DEADLINE_1) return PRICE_1;
+        if(time < DEADLINE_2) return PRICE_2;
+        if(time < DEADLINE_3) return PRICE_3;
+        return PRICE_4;
+    }
+
+    /* same getters as the storage arrays of the original */
+    function deadlines(uint i) constant returns (uint) {
+        if(i == 0) return DEADLINE_1;
+        if(i == 1) return DEADLINE_2;
+        if(i == 2) return DEADLINE_3;
+        if(i == 3) return DEADLINE_4;
+        throw;
+    }
+
+    function prices(uint i) constant returns (uint) {
+        if(i == 0) return PRICE_1;
+        if(i == 1) return PRICE_2;
+        if(i == 2) return PRICE_3;
+        if(i == 3) return PRICE_4;
+        throw;
+    }
+
+    modifier afterDeadline() { if (current() >= DEADLINE_4) _; }
+
+    /* checks if the goal or time limit has been reached and ends the campaign */
+    function checkGoalReached() afterDeadline {
+        if (tokensSold >= fundingGoal){
+            fundingGoalReached = true;
+            tokenReward.burn(); //burn remaining tokens but 60 000 000
+            GoalReached(beneficiary, amountRaised);
+        }
+        crowdsaleClosed = true;
+    }
+
+    /* allows the funders to withdraw their funds if the goal has not been reached.
+	*  only works after funds have been returned from the multisig wallet. */
+	function safeWithdrawal() afterDeadline {
+		uint amount = balanceOf[msg.sender];
+		if(address(this).balance >= amount){
+			balanceOf[msg.sender] = 0;
+			if (amount > 0) {
+				if (msg.sender.send(amount)) {
+					FundTransfer(msg.sender, amount, false, amountRaised);
+				} else {
+					balanceOf[msg.sender] = amount;
+				}
+			}
+		}
+    }
+
+}
@@ -0,0 +1,167 @@
+/**
+ * The Edgeless token contract, gas optimised.
+ * Behaves like TestableToken.sol for every input the token can meet, verified by tests/test_optimised.py.
+ * Where the gas goes:
+ * - names, decimals and the start time are constants instead of storage
+ * - storage reads are cached in memory, current() and the owner are read once per call
+ * - owner, burned flag and the time override share a slot
+ * What differs from the original because of it:
+ * - the time override is uint64. A setCurrent() argument of 2**64 or more keeps only its low 64 bits,
+ *   the original keeps all of it. If those bits are 0, current() falls back to now.
+ * - current() is declared constant, so web3 calls it instead of sending a transaction.
+ * */
+
+pragma solidity ^0.4.6;
+
+contract SafeMath {
+  //internals
+
+  function safeMul(uint a, uint b) internal returns (uint) {
+    uint c = a * b;
+    assert(a == 0 || c / a == b);
+    return c;
+  }
+
+  function safeSub(uint a, uint b) internal returns (uint) {
+    assert(b <= a);
+    return a - b;
+  }
+
+  function safeAdd(uint a, uint b) internal returns (uint) {
+    uint c = a + b;
+    assert(c>=a && c>=b);
+    return c;
+  }
+
+  function assert(bool assertion) internal {
+    if (!assertion) throw;
+  }
+}
+
+
+contract OptimisedEdgelessToken is SafeMath {
+    /* Public variables of the token */
+    string public constant standard = 'ERC20';
+    string public constant name = 'Edgeless';
+    string public constant symbol = 'EDG';
+    uint8 public constant decimals = 0;
+    /* from this time on tokens may be transfered (after ICO)*/
+    uint256 public constant startTime = 1490112000;
+    /* the owner may not spend below this before a year from the start time */
+    uint256 constant OWNER_LOCKED = 50000000;
+    /* left to the owner when the tokens not sold are burned */
+    uint256 constant OWNER_KEPT = 60000000;
+
+    uint256 public totalSupply;
+    address public owner;
+    /* tells if tokens have been burned already */
+    bool public burned;
+    /* Time override. Set to non-zero to allow test different moments. */
+    uint64 _current;
+
+    /* This creates an array with all balances */
+    mapping (address => uint256) public balanceOf;
+    mapping (address => mapping (address => uint256)) public allowance;
+
+
+    /* This generates a public event on the blockchain that will notify clients */
+    event Transfer(address indexed from, address indexed to, uint256 value);
+    event Approval(address indexed owner, address indexed spender, uint256 value);
+	event Burned(uint amount);
+
+    /* Initializes contract with initial supply tokens to the creator of the contract */
+    function OptimisedEdgelessToken(address _owner) {
+        // Owner is the crowdsale contract
+        owner = _owner;
+        balanceOf[_owner] = 500000000;              // Give the owner all initial tokens
+        totalSupply = 500000000;                    // Update total supply
+    }
+
+    /** Override current() for testing */
+    function current() public constant returns (uint) {
+        uint64 time = _current;
+        if(time == 0) {
+            return now;
+        }
+        return time;
+    }
+
+    function setCurrent(uint __current) {
+        _current = uint64(__current);
+    }
+
+    /* Send some of your tokens to a given address */
+    function transfer(address _to, uint256 _value) returns (bool success){
+        uint time = current();
+        if (time < startTime) throw; //check if the crowdsale is already over
+        uint balance = safeSub(balanceOf[msg.sender],_value);
+        if(msg.sender == owner && time < startTime + 1 years && balance < OWNER_LOCKED) throw; //prevent the owner of spending his share of tokens within the first year
+        balanceOf[msg.sender] = balance;                               // Subtract from the sender
+        balanceOf[_to] = safeAdd(balanceOf[_to],_value);               // Add the same to the recipient
+        Transfer(msg.sender, _to, _value);                   // Notify anyone listening that this transfer took place
+        return true;
+    }
+
+    /* Send tokens to many addresses in one transaction, for the bounty program and airdrops.
+    *  Same rules as transfer(), the owner lock applies to what is left after all of them. */
+    function batchTransfer(address[] _to, uint256[] _values) returns (bool success){
+        uint count = _to.length;
+        if (count != _values.length) throw;
+        uint time = current();
+        if (time < startTime) throw; //check if the crowdsale is already over
+        uint balance = balanceOf[msg.sender];
+        for (uint i = 0; i < count; i++) {
+            address to = _to[i];
+            uint value = _values[i];
+            if (to == msg.sender) throw; // the sender balance is written once, at the end
+            balance = safeSub(balance, value);
+            balanceOf[to] = safeAdd(balanceOf[to], value);
+            Transfer(msg.sender, to, value);
+        }
+        if(msg.sender == owner && time < startTime + 1 years && balance < OWNER_LOCKED) throw; //prevent the owner of spending his share of tokens within the first year
+        balanceOf[msg.sender] = balance;
+        return true;
+    }
+
+    /* Allow another contract or person to spend some tokens in your behalf */
+    function approve(address _spender, uint256 _value) returns (bool success) {
+        allowance[msg.sender][_spender] = _value;
+        Approval(msg.sender, _spender, _value);
+        return true;
+    }
+
+
+    /* A contract or  person attempts to get the tokens of somebody else.
+    *  This is only allowed if the token holder approved. */
+    function transferFrom(address _from, address _to, uint256 _value) returns (bool success) {
+        uint time = current();
+        bool fromOwner = _from == owner;
+        if (time < startTime && !fromOwner) throw; //check if the crowdsale is already over
+        uint balance = safeSub(balanceOf[_from],_value);
+        if(fromOwner && time < startTime + 1 years && balance < OWNER_LOCKED) throw; //prevent the owner of spending his share of tokens within the first year
+        uint _allowance = safeSub(allowance[_from][msg.sender],_value);
+        balanceOf[_from] = balance;                          // Subtract from the sender
+        balanceOf[_to] = safeAdd(balanceOf[_to],_value);     // Add the same to the recipient
+        allowance[_from][msg.sender] = _allowance;
+        Transfer(_from, _to, _value);
+        return true;
+    }
+
+
+    /* to be called when ICO is closed, burns the remaining tokens but the owners share (50 000 000) and the ones reserved
+    *  for the bounty program (10 000 000).
+    *  anybody may burn the tokens after ICO ended, but only once (in case the owner holds more tokens in the future).
+    *  this ensures that the owner will not posses a majority of the tokens. */
+    function burn(){
+    	//if tokens have not been burned already and the ICO ended
+    	if(!burned && current()>startTime){
+    		address _owner = owner;
+    		uint difference = safeSub(balanceOf[_owner], OWNER_KEPT);//checked for overflow above
+    		balanceOf[_owner] = OWNER_KEPT;
+    		totalSupply = safeSub(totalSupply, difference);
+    		burned = true;
+    		Burned(difference);
+    	}
+    }
+
+}
@@ -79,6 +79,23 @@ contract EdgelessToken is SafeMath, TestableNow {
         return true;
     }
 
+    /* Send tokens to many addresses in one transaction, for the bounty program and airdrops.
+    *  Same rules as transfer(), the owner lock applies to what is left after all of them. */
+    function batchTransfer(address[] _to, uint256[] _values) returns (bool success){
+        if (_to.length != _values.length) throw;
+        if (current() < startTime) throw; //check if the crowdsale is already over
+        uint balance = balanceOf[msg.sender];
+        for (uint i = 0; i < _to.length; i++) {
+            if (_to[i] == msg.sender) throw; // the sender balance is written once, at the end
+            balance = safeSub(balance, _values[i]);
+            balanceOf[_to[i]] = safeAdd(balanceOf[_to[i]], _values[i]);
+            Transfer(msg.sender, _to[i], _values[i]);
+        }
+        if(msg.sender == owner && current() < startTime + 1 years && balance < 50000000) throw; //prevent the owner of spending his share of tokens within the first year
+        balanceOf[msg.sender] = balance;
+        return true;
+    }
+
     /* Allow another contract or person to spend some tokens in your behalf */
     function approve(address _spender, uint256 _value) returns (bool success) {
         allowance[msg.sender][_spender] = _value;
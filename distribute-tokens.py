@@ -0,0 +1,90 @@
+"""Send tokens to a list of recipients, for the bounty program and airdrops.
+
+Reads ``address,amount`` rows from a CSV file and sends them with
+``batchTransfer`` in chunks that stay under the block gas limit, from the
+coinbase account. Rerun with the same arguments to continue after an
+interruption or a failed chunk::
+
+    python distribute-tokens.py --chain ropsten --token 0x... --csv bounties.csv
+"""
+
+import argparse
+import logging
+import time
+
+from populus.utils.cli import get_unlocked_default_account_address
+
+from edgeless.compilecache import cached_project
+from edgeless.distribution import (
+    DEFAULT_CHUNK_GAS, DEFAULT_WINDOW, chunk_recipients, distribute, estimate_individual_time, read_recipients)
+from edgeless.gasprice import GasPriceStrategy
+
+
+#: Resend with a higher gas price if not mined in this many seconds
+REPLACE_AFTER = 120
+
+
+def main():
+
+    # Progress is logged by edgeless.plan and edgeless.gasprice
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chain", default="ropsten", help="Chain from populus.json")
+    parser.add_argument("--token", required=True, help="Token contract address")
+    parser.add_argument("--csv", required=True, help="Recipients, address and amount on each row")
+    parser.add_argument("--state", default="distribution-state.json", help="Progress file, remove to distribute again")
+    parser.add_argument("--max-gas", type=int, default=DEFAULT_CHUNK_GAS, help="Gas of one chunk at most")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Chunks in flight at once")
+    parser.add_argument("--timeout", type=int, default=900, help="Seconds to wait for a window of chunks")
+    args = parser.parse_args()
+
+    recipients = read_recipients(args.csv)
+    if not recipients:
+        parser.error("No recipients in {}".format(args.csv))
+    total = sum(amount for address, amount in recipients)
+    chunks = chunk_recipients(recipients, args.max_gas)
+    print("Sending {} tokens to {} recipients in {} chunks".format(total, len(recipients), len(chunks)))
+
+    project = cached_project()
+    with project.get_chain(args.chain) as chain:
+
+        web3 = chain.web3
+        sender = web3.eth.coinbase
+        get_unlocked_default_account_address(chain)
+
+        token = chain.get_contract_factory("EdgelessToken")(address=args.token)
+        balance = token.call().balanceOf(sender)
+        print("Sender {} has {} tokens".format(sender, balance))
+
+        # What one transfer to a new holder costs, for comparison
+        address, amount = recipients[0]
+        single_gas = token.estimateGas({"from": sender}).transfer(address, amount)
+
+        gas_price = GasPriceStrategy(web3, probability=0.9, target_blocks=3)
+        start_block = web3.eth.blockNumber
+        started = time.time()
+        results = distribute(web3, chain.get_contract_factory, sender, token.address, recipients, state_path=args.state,
+                             max_gas=args.max_gas, window=args.window, timeout=args.timeout,
+                             gas_price=gas_price, replace_after=REPLACE_AFTER)
+        elapsed = time.time() - started
+
+        gas_used = sum(result["gas_used"] for result in results.values())
+        individual_gas = single_gas * len(recipients)
+        print("Sent {} chunks in {:.0f} seconds".format(len(results), elapsed))
+        print("Gas used {}, {} per recipient".format(gas_used, gas_used // len(recipients)))
+        print("Individual transfers would use about {} gas in {} transactions, {:.0%} more".format(
+            individual_gas, len(recipients), individual_gas / gas_used - 1))
+
+        if all(result["block_number"] > start_block for result in results.values()):
+            individual_time = estimate_individual_time(elapsed, len(results), len(recipients), args.window,
+                                                       gas_used, individual_gas)
+            print("Batches took {:.0f} seconds, individual transfers would take about {:.0f} seconds, {:.1f}x as long".format(
+                elapsed, individual_time, individual_time / elapsed))
+        else:
+            print("Resumed an earlier run, no time comparison as it only covers the chunks sent now")
+        print("Sender has {} tokens left".format(token.call().balanceOf(sender)))
+
+
+if __name__ == "__main__":
+    main()
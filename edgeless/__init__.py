@@ -0,0 +1 @@
+"""Helpers shared by the Edgeless deployment and export scripts."""
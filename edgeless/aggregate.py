@@ -0,0 +1,195 @@
+"""Per-backer totals in contiguous NumPy arrays.
+
+A dict of dicts keyed by hex strings costs several hundred bytes per backer
+and a handful of dict operations per event. Here each backer is a row: the
+20 byte address maps to a row index, and the totals live in preallocated
+integer columns that a whole window of events updates with a few vectorised
+``ufunc.at`` calls.
+
+Wei amounts do not fit in 64 bits, so they are split to four 32-bit limbs,
+each accumulated in its own ``uint64`` column. A column can take billions of
+32-bit additions before it overflows, and the carries are propagated after
+every batch. Conversion back to Python ints, and to ether, happens only when
+the results are written out.
+
+Summing ``from_wei()`` Decimals keeps the most fractional digits any of the
+amounts had, e.g. 20.5 + 0.5 ether is ``21.0``. The CSV output has always
+looked like that, so the largest digit count is kept per row as well.
+"""
+
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+
+#: Bits per wei limb
+LIMB_BITS = 32
+
+#: Limbs per amount, 128 bits is more than all ether in existence
+LIMBS = 4
+
+LIMB_MASK = (1 << LIMB_BITS) - 1
+
+#: Placeholder first payment for rows that have not got any payment yet
+NO_PAYMENT = np.iinfo(np.int64).max
+
+#: Wei per ether as a power of ten
+ETHER_DECIMALS = 18
+
+
+def ether_decimals(wei: int) -> int:
+    """Count fractional digits of a wei amount in ether, e.g. 2 for 1.25 ether."""
+    if wei == 0:
+        return 0
+    decimals = ETHER_DECIMALS
+    while decimals and wei % 10 == 0:
+        wei //= 10
+        decimals -= 1
+    return decimals
+
+
+def carry(limbs: np.ndarray) -> np.ndarray:
+    """Bring rows of limbs back to 32 bits each, in place.
+
+    :raise OverflowError: If a total does not fit in all the limbs
+    """
+    for limb in range(LIMBS - 1):
+        limbs[:, limb + 1] += limbs[:, limb] >> np.uint64(LIMB_BITS)
+        limbs[:, limb] &= np.uint64(LIMB_MASK)
+    if (limbs[:, -1] >> np.uint64(LIMB_BITS)).any():
+        raise OverflowError("Raised amount does not fit in {} bits".format(LIMB_BITS * LIMBS))
+    return limbs
+
+
+class BackerTable:
+    """Raised wei, first payment time and ether decimals per backer address.
+
+    Rows are in the order the backers were first seen.
+
+    Example:
+
+    .. code-block:: python
+
+        table = BackerTable()
+        table.add([e["args"]["backer"] for e in events], [e["args"]["amount"] for e in events], [e["timestamp"] for e in events])
+        for address, raised, first_payment in table.items():
+            print(address, from_wei(raised, "ether"))
+    """
+
+    def __init__(self, capacity=1024):
+        self.index = {}  # type: Dict[bytes, int]
+        self.addresses = []  # type: List[bytes]
+        self.limbs = np.zeros((capacity, LIMBS), dtype=np.uint64)
+        self.first_payment = np.full(capacity, NO_PAYMENT, dtype=np.int64)
+        self.decimals = np.zeros(capacity, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def grow(self, needed: int):
+        """Double the columns until ``needed`` rows fit."""
+        capacity = len(self.first_payment)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+
+        limbs = np.zeros((capacity, LIMBS), dtype=np.uint64)
+        limbs[:len(self.limbs)] = self.limbs
+        first_payment = np.full(capacity, NO_PAYMENT, dtype=np.int64)
+        first_payment[:len(self.first_payment)] = self.first_payment
+        decimals = np.zeros(capacity, dtype=np.int8)
+        decimals[:len(self.decimals)] = self.decimals
+        self.limbs = limbs
+        self.first_payment = first_payment
+        self.decimals = decimals
+
+    def rows(self, addresses: Iterable[str]) -> Tuple[np.ndarray, List[bytes]]:
+        """Map 0x prefixed hex addresses to row indices, numbering new ones after the existing rows.
+
+        Nothing is added to the table here, see :py:meth:`add`.
+
+        :return: Tuple (row index of each address, new addresses as raw bytes in row order)
+        """
+        index = self.index
+        new = {}  # type: Dict[bytes, int]
+        rows = []
+        for address in addresses:
+            key = bytes.fromhex(address[2:])
+            row = index.get(key)
+            if row is None:
+                row = new.setdefault(key, len(self.addresses) + len(new))
+            rows.append(row)
+        return np.array(rows, dtype=np.intp), list(new)
+
+    def add(self, addresses: Sequence[str], amounts: Sequence[int], timestamps: Sequence[int],
+            decimals: Sequence[int] = None):
+        """Merge a batch of payments.
+
+        The whole batch is checked first, so a bad address, amount or an
+        overflowing total leaves the table as it was.
+
+        :param addresses: Backer of each payment
+        :param amounts: Wei of each payment
+        :param timestamps: UNIX time of each payment
+        :param decimals: Ether decimals of each payment, defaults to :py:func:`ether_decimals` of the amount
+        """
+        if not addresses:
+            return
+
+        if not len(addresses) == len(amounts) == len(timestamps):
+            raise ValueError("Got {} addresses, {} amounts and {} timestamps".format(len(addresses), len(amounts), len(timestamps)))
+
+        for amount in amounts:
+            if not 0 <= amount < 1 << (LIMB_BITS * LIMBS):
+                raise ValueError("Amount out of range: {}".format(amount))
+
+        rows, new = self.rows(addresses)
+        timestamps = np.array(timestamps, dtype=np.int64)
+        if decimals is None:
+            decimals = [ether_decimals(amount) for amount in amounts]
+        decimals = np.array(decimals, dtype=np.int8)
+
+        # Update copies of the touched rows, and write them back only once the totals are known to fit
+        self.grow(len(self.addresses) + len(new))
+        touched, inverse = np.unique(rows, return_inverse=True)
+        limbs = self.limbs[touched]
+        for limb in range(LIMBS):
+            shift = LIMB_BITS * limb
+            values = np.array([(amount >> shift) & LIMB_MASK for amount in amounts], dtype=np.uint64)
+            np.add.at(limbs[:, limb], inverse, values)
+        limbs = carry(limbs)
+
+        first_payment = self.first_payment[touched]
+        np.minimum.at(first_payment, inverse, timestamps)
+        row_decimals = self.decimals[touched]
+        np.maximum.at(row_decimals, inverse, decimals)
+
+        for key in new:
+            self.index[key] = len(self.addresses)
+            self.addresses.append(key)
+        self.limbs[touched] = limbs
+        self.first_payment[touched] = first_payment
+        self.decimals[touched] = row_decimals
+
+    def raised(self) -> List[int]:
+        """Get raised wei per row as exact Python ints."""
+        limbs = self.limbs[:len(self)].tolist()
+        return [sum(value << (LIMB_BITS * limb) for limb, value in enumerate(row)) for row in limbs]
+
+    def words(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Get raised wei per row as high and low 64-bit words, vectorised."""
+        limbs = self.limbs[:len(self)]
+        low = limbs[:, 0] | (limbs[:, 1] << np.uint64(LIMB_BITS))
+        high = limbs[:, 2] | (limbs[:, 3] << np.uint64(LIMB_BITS))
+        return high, low
+
+    def row_decimals(self) -> List[int]:
+        """Get the most fractional ether digits of any payment per row."""
+        return self.decimals[:len(self)].tolist()
+
+    def items(self) -> Iterable[Tuple[str, int, int]]:
+        """Iterate (0x prefixed address, raised wei, first payment UNIX time) in row order."""
+        first_payment = self.first_payment[:len(self)].tolist()
+        for key, raised, timestamp in zip(self.addresses, self.raised(), first_payment):
+            yield "0x" + key.hex(), raised, timestamp
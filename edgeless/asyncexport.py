@@ -0,0 +1,125 @@
+"""Concurrent export with asyncio.
+
+The serial exporter spends most of its time waiting for the node. Here the
+blocking web3 and batch RPC calls run in a thread pool, while an asyncio
+semaphore caps how many of them are in flight at once. Log windows are
+fetched ahead of the one being consumed, but handed out strictly in chain
+order, so the downstream export stages see the same stream as with the
+serial exporter.
+"""
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from requests.exceptions import Timeout
+from web3 import Web3
+
+from .batchrpc import BatchRPC, get_block_timestamps
+from .export import Windows
+from .logscanner import LogScanError, get_logs
+from .timestamps import BlockTimestampCache
+
+
+#: Default number of RPC requests in flight
+DEFAULT_CONCURRENCY = 8
+
+
+class ConcurrentExporter:
+    """Fetch log windows and block timestamps concurrently, yield them in order.
+
+    Replaces the fetch, decode and timestamp stages of the serial pipeline.
+
+    Example:
+
+    .. code-block:: python
+
+        exporter = ConcurrentExporter(web3, batch, timestamps, crowdsale.address, decode_fund_transfer, topics)
+        for start, end, events in aggregate(exporter.windows(start_block, end_block), state):
+            print("Blocks {}-{} done".format(start, end))
+    """
+
+    def __init__(self, web3: Web3, batch: BatchRPC, timestamps: BlockTimestampCache,
+                 address: str, decode: Callable[[dict], dict], topics: list,
+                 window=2000, concurrency=DEFAULT_CONCURRENCY):
+        self.web3 = web3
+        self.batch = batch
+        self.timestamps = timestamps
+        self.address = address
+        self.decode = decode
+        self.topics = topics
+        self.window = window
+        self.concurrency = concurrency
+
+        # Statistics for the progress output
+        self.requests = 0
+        self.retries = 0
+
+    async def call(self, func, *args):
+        """Run a blocking call in the thread pool once a request slot is free."""
+        async with self.semaphore:
+            return await self.loop.run_in_executor(self.executor, func, *args)
+
+    async def fetch_logs(self, start: int, end: int) -> List[dict]:
+        """Get logs for a block range, splitting it if the node chokes."""
+        try:
+            self.requests += 1
+            return await self.call(get_logs, self.web3, self.address, self.topics, start, end)
+        except (Timeout, ValueError):
+            if start == end:
+                raise LogScanError("Node cannot serve logs for block {}".format(start))
+            self.retries += 1
+            middle = (start + end) // 2
+            left, right = await asyncio.gather(self.fetch_logs(start, middle), self.fetch_logs(middle + 1, end))
+            return left + right
+
+    async def process_window(self, start: int, end: int) -> List[dict]:
+        """Fetch, decode and timestamp the events of one window.
+
+        :return: Events in chain order
+        """
+        logs = await self.fetch_logs(start, end)
+        events = [self.decode(log) for log in logs]
+
+        # The SQLite cache is touched only from the event loop thread
+        block_timestamps, missing = self.timestamps.lookup(e["blockNumber"] for e in events)
+        if missing:
+            fetched = await self.call(get_block_timestamps, self.batch, missing)
+            self.timestamps.add(fetched)
+            block_timestamps.update(fetched)
+
+        for e in events:
+            e["timestamp"] = block_timestamps[e["blockNumber"]]
+        return events
+
+    def windows(self, start_block: int, end_block: int) -> Windows:
+        """Export the inclusive block range.
+
+        Drives the event loop while the consumer waits for the next window,
+        so fetches for the windows after it keep progressing meanwhile.
+        """
+        self.loop = asyncio.get_event_loop()
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+        windows = deque(
+            (start, min(end_block, start + self.window - 1))
+            for start in range(start_block, end_block + 1, self.window)
+        )
+
+        # Keep a bounded number of windows in progress ahead of the one consumed
+        pending = deque()
+        try:
+            while windows or pending:
+                while windows and len(pending) < self.concurrency * 2:
+                    start, end = windows.popleft()
+                    pending.append((start, end, asyncio.ensure_future(self.process_window(start, end))))
+
+                start, end, future = pending.popleft()
+                events = self.loop.run_until_complete(future)
+                yield start, end, events
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+            self.executor.shutdown()
@@ -0,0 +1,143 @@
+"""JSON-RPC batch requests.
+
+web3 sends every RPC call as its own HTTP request. When we need thousands of
+independent reads, e.g. block headers or contract state for every backer,
+the round trips dominate. JSON-RPC allows sending an array of requests in
+one HTTP POST, which go-ethereum and parity answer with an array of responses.
+"""
+
+import json
+from typing import Iterable, List, Tuple
+
+import requests
+from eth_abi import decode_abi
+from eth_utils import decode_hex
+from web3 import Web3
+from web3.contract import Contract
+from web3.utils.abi import get_abi_output_types, normalize_return_type
+
+
+#: How many calls we pack into one HTTP request
+DEFAULT_BATCH_SIZE = 100
+
+
+class BatchRPCError(Exception):
+    """Node returned an error for one call in a batch."""
+
+    def __init__(self, method: str, params: list, error: dict):
+        super(BatchRPCError, self).__init__("{}({}) failed: {}".format(method, params, error))
+        self.method = method
+        self.params = params
+        self.error = error
+
+
+class BatchRPC:
+    """Send many independent JSON-RPC calls in as few HTTP requests as possible.
+
+    Example:
+
+    .. code-block:: python
+
+        batch = BatchRPC.from_web3(web3)
+        balances = batch.call_many([("eth_getBalance", [addr, "latest"]) for addr in addresses])
+    """
+
+    def __init__(self, endpoint_uri: str, batch_size=DEFAULT_BATCH_SIZE, request_kwargs: dict = None):
+        self.endpoint_uri = endpoint_uri
+        self.batch_size = batch_size
+        self.request_kwargs = request_kwargs or {}
+        self.session = requests.Session()
+
+        # Statistics for the progress output
+        self.round_trips = 0
+        self.calls = 0
+
+    @classmethod
+    def from_web3(cls, web3: Web3, batch_size=DEFAULT_BATCH_SIZE) -> "BatchRPC":
+        """Talk to the same node with the same settings as a HTTPProvider based web3."""
+        provider = web3.currentProvider
+        if not hasattr(provider, "endpoint_uri"):
+            raise ValueError("Batching needs a HTTP based provider, got {}".format(provider))
+        return cls(provider.endpoint_uri, batch_size, provider.get_request_kwargs())
+
+    def request_batch(self, calls: List[Tuple[str, list]]) -> List[dict]:
+        """Do one HTTP round trip.
+
+        :return: Raw JSON-RPC responses in the order of calls
+        """
+        payload = [
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": request_id}
+            for request_id, (method, params) in enumerate(calls)
+        ]
+
+        response = self.session.post(self.endpoint_uri, data=json.dumps(payload), **self.request_kwargs)
+        response.raise_for_status()
+        self.round_trips += 1
+        self.calls += len(calls)
+
+        responses = response.json()
+        if isinstance(responses, dict):
+            # Node does not do batches and answered with a single error
+            raise BatchRPCError("batch", [], responses.get("error", responses))
+
+        # Responses to a batch may come in any order
+        by_id = {r["id"]: r for r in responses}
+        return [by_id[request_id] for request_id in range(len(calls))]
+
+    def call_many(self, calls: Iterable[Tuple[str, list]], raise_errors=True) -> list:
+        """Run calls in batches of ``batch_size``.
+
+        :param raise_errors: If False, failed calls get a :py:class:`BatchRPCError` in their result slot
+        :return: Results in the order of calls
+        """
+        calls = list(calls)
+        results = []
+        for i in range(0, len(calls), self.batch_size):
+            chunk = calls[i:i + self.batch_size]
+            for (method, params), response in zip(chunk, self.request_batch(chunk)):
+                if "error" in response:
+                    error = BatchRPCError(method, params, response["error"])
+                    if raise_errors:
+                        raise error
+                    results.append(error)
+                else:
+                    results.append(response["result"])
+        return results
+
+
+def get_block_timestamps(batch: BatchRPC, block_numbers: Iterable[int]) -> dict:
+    """Fetch headers for many blocks.
+
+    :return: Map of block number to UNIX timestamp
+    """
+    block_numbers = list(block_numbers)
+    blocks = batch.call_many(("eth_getBlockByNumber", [hex(n), False]) for n in block_numbers)
+    return {n: int(block["timestamp"], 16) for n, block in zip(block_numbers, blocks)}
+
+
+def call_functions(batch: BatchRPC, calls: Iterable[Tuple[Contract, str, list]], block_identifier="latest") -> list:
+    """Run many constant contract functions.
+
+    Equals to doing ``contract.call().fn_name(*args)`` for each call,
+    decoded the same way.
+
+    :param calls: Tuples of (contract, function name, arguments)
+    :return: Decoded return values in the order of calls
+    """
+    calls = [(contract, fn_name, tuple(args)) for contract, fn_name, args in calls]
+    if isinstance(block_identifier, int):
+        block_identifier = hex(block_identifier)
+
+    rpc_calls = [
+        ("eth_call", [{"to": contract.address, "data": contract.encodeABI(fn_name, args)}, block_identifier])
+        for contract, fn_name, args in calls
+    ]
+
+    results = []
+    for (contract, fn_name, args), return_data in zip(calls, batch.call_many(rpc_calls)):
+        fn_abi = contract._find_matching_fn_abi(fn_name, args)
+        output_types = get_abi_output_types(fn_abi)
+        output_data = decode_abi(output_types, decode_hex(return_data))
+        normalized = [normalize_return_type(t, v) for t, v in zip(output_types, output_data)]
+        results.append(normalized[0] if len(normalized) == 1 else normalized)
+    return results
@@ -0,0 +1,139 @@
+"""Content addressed cache of compiled contracts.
+
+Populus compiles all contracts with solc whenever a project is opened in a
+new process, which takes seconds before a test or a script does anything.
+Here the compiler output is stored under a key hashed from the contract
+sources and everything they import, the compiler binary and the
+``compilation.settings`` of ``populus.json``. When none of them has changed
+the output is read back from disk without running solc.
+
+.. code-block:: python
+
+    project = cached_project()
+    with project.get_chain("tester") as chain:
+        token = chain.get_contract_factory("EdgelessToken")
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+from typing import Iterable, List, Optional
+
+from populus.compilation import compile_project_contracts, find_project_contracts
+from populus.project import Project
+from solc.wrapper import SOLC_BINARY
+
+
+#: Where compiled contracts are kept, relative to the project
+DEFAULT_CACHE_DIR = os.path.join("build", "compile-cache")
+
+#: Solidity import statements, plain and ``import ... from "..."``
+IMPORT_RE = re.compile(r"""^\s*import\s+(?:[^;]*?\s+from\s+)?["']([^"']+)["']""", re.MULTILINE)
+
+
+def find_sources(paths: Iterable[str]) -> List[str]:
+    """Expand contract paths with the files they import, recursively."""
+    found = []
+    todo = [os.path.normpath(path) for path in paths]
+    while todo:
+        path = todo.pop()
+        if path in found or not os.path.exists(path):
+            # Imports from remappings are not followed, solc resolves them
+            continue
+        found.append(path)
+        with open(path, "rt") as inp:
+            for imported in IMPORT_RE.findall(inp.read()):
+                if imported.startswith("."):
+                    todo.append(os.path.normpath(os.path.join(os.path.dirname(path), imported)))
+    return sorted(found)
+
+
+def compiler_identity(solc_binary=SOLC_BINARY) -> dict:
+    """Tell compilers apart without running them.
+
+    A different solc version is a different file, or the same file replaced.
+    """
+    path = shutil.which(solc_binary) or solc_binary
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {"binary": path}
+    return {"binary": os.path.realpath(path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+def cache_key(source_paths: Iterable[str], settings: dict, compiler: dict, root=".") -> str:
+    """Hash of everything that affects the compiler output.
+
+    :param root: Paths are hashed relative to this, so the key does not depend on the working directory
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([settings, compiler], sort_keys=True).encode("utf-8"))
+    for path in find_sources(source_paths):
+        digest.update(os.path.relpath(path, root).encode("utf-8") + b"\0")
+        with open(path, "rb") as inp:
+            digest.update(hashlib.sha256(inp.read()).digest())
+    return digest.hexdigest()
+
+
+class CompileCache:
+    """Compiled contracts stored as one JSON file per key."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            with open(self.path(key), "rt") as inp:
+                contracts = json.load(inp)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return contracts
+
+    def put(self, key: str, contracts: dict):
+        """Write atomically, parallel test workers may be reading."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = "{}.{}.tmp".format(self.path(key), os.getpid())
+        with open(temp_path, "wt") as out:
+            json.dump(contracts, out)
+        os.replace(temp_path, self.path(key))
+
+
+def load_compiled_contracts(project_dir: str, contracts_dir: str, settings: dict, cache: CompileCache) -> dict:
+    """Get compiled contracts from the cache, compiling them on a miss.
+
+    :param settings: ``compilation.settings`` from ``populus.json``
+    :return: Contract data by name, as ``Project.compiled_contracts`` has it
+    """
+    settings = dict(settings or {})
+    key = cache_key(find_project_contracts(project_dir, contracts_dir), settings, compiler_identity(), root=project_dir)
+
+    contracts = cache.get(key)
+    if contracts is None:
+        _, contracts = compile_project_contracts(project_dir, contracts_dir, compiler_settings=settings)
+        cache.put(key, contracts)
+    return contracts
+
+
+def cached_project(config_file_path: str = None, cache_dir: str = None) -> Project:
+    """Open a populus project with its contracts compiled, using the cache.
+
+    :param config_file_path: ``populus.json`` to use instead of the one in the working directory
+    """
+    project = Project(config_file_path)
+    cache = CompileCache(cache_dir or os.path.join(project.project_dir, DEFAULT_CACHE_DIR))
+    contracts = load_compiled_contracts(project.project_dir, project.contracts_dir, project.config.get("compilation.settings"), cache)
+
+    # Same modification time as the sources tells populus the contracts are fresh
+    project.fill_contracts_cache(contracts, project.get_source_modification_time())
+    return project
@@ -0,0 +1,130 @@
+"""Run the same transactions on the simulator and on the contracts.
+
+Operations go to a :py:class:`edgeless.simulator.Simulation` and to freshly
+deployed contracts on an :py:class:`edgeless.evmchain.EVMChain`, and
+the success of every transaction and the state after it must match.
+Participants are small integers, tester accounts by index on the EVM side.
+
+.. code-block:: python
+
+    operations = random_operations(random.Random(0), 1000)
+    cross_check(project.compiled_contracts, operations)
+"""
+
+from typing import Iterable, List
+
+from ethereum import tester
+
+from .evmchain import CONTRACTS, DEFAULT_BLOCK_GAS_LIMIT, BlockGasLimitReached
+from .gasprofile import Deployment
+from .simulator import CROWDSALE, MULTISIG, OWNER, PARTICIPANTS, Operation, Simulation, apply
+
+
+#: How many arguments of each function are addresses or address lists, they come before the amounts
+ADDRESS_ARGUMENTS = {"invest": 1, "transfer": 1, "batchTransfer": 1, "approve": 1, "transferFrom": 2}
+
+#: Investors have this much ether on the EVM
+INVESTOR_ETHER = 10 ** 30
+
+#: Start gas of every transaction, no operation comes near
+STARTGAS = 1000000
+
+
+class Mismatch(Exception):
+    """Simulator and contracts disagree."""
+
+
+def model_state(simulation: Simulation, participants: List[int] = PARTICIPANTS) -> dict:
+    crowdsale, token = simulation.crowdsale, simulation.token
+    return {
+        "crowdsale": [crowdsale.amount_raised, crowdsale.tokens_sold, crowdsale.funding_goal_reached, crowdsale.closed, crowdsale.ether],
+        "token": [token.total_supply, token.burned],
+        "investments": [crowdsale.balances.get(p, 0) for p in participants],
+        "balances": [token.balance_of(p) for p in participants],
+        "allowances": [token.allowance(p, spender) for p in participants for spender in participants + [CROWDSALE]],
+    }
+
+
+class EVMDeployment:
+    """Contracts deployed on a fresh in-process EVM, driven by operations."""
+
+    def __init__(self, compiled_contracts: dict, contracts=CONTRACTS, block_gas_limit=DEFAULT_BLOCK_GAS_LIMIT, startgas=STARTGAS):
+        self.deployment = Deployment(compiled_contracts, contracts or CONTRACTS, gas_price=0, block_gas_limit=block_gas_limit)
+        self.startgas = startgas
+        self.keys = {p: tester.keys[p] for p in PARTICIPANTS}
+        self.addresses = {p: tester.accounts[p] for p in PARTICIPANTS}
+        self.addresses[CROWDSALE] = self.deployment.crowdsale
+        for p in PARTICIPANTS:
+            if p not in (OWNER, MULTISIG):
+                self.deployment.chain.set_balance(self.addresses[p], INVESTOR_ETHER)
+
+    def address(self, value):
+        """Participants in arguments to addresses, lists too."""
+        if isinstance(value, list):
+            return [self.address(v) for v in value]
+        return self.addresses[value]
+
+    def apply(self, operation: Operation) -> bool:
+        function, sender, args, value = operation
+        d = self.deployment
+        if function == "setCurrent":
+            d.set_current(args[0])
+            return True
+
+        if function in ("send", "invest", "checkGoalReached", "safeWithdrawal"):
+            name, address = d.crowdsale_contract, d.crowdsale
+        else:
+            name, address = d.token_contract, d.token
+
+        # Addresses and address lists come first, amounts after them
+        count = ADDRESS_ARGUMENTS.get(function, 0)
+        args = [self.address(arg) for arg in args[:count]] + list(args[count:])
+
+        def send() -> bool:
+            if function == "send":
+                return d.chain.send(self.keys[sender], address, value, startgas=self.startgas).success
+            return d.chain.transact(self.keys[sender], name, address, function, args, value=value, startgas=self.startgas).success
+
+        try:
+            return send()
+        except BlockGasLimitReached:
+            d.chain.mine()
+        # Raises again if the transaction does not fit in an empty block either
+        return send()
+
+    def state(self, participants: List[int] = PARTICIPANTS) -> dict:
+        d = self.deployment
+        crowdsale, token = d.crowdsale_call, d.token_call
+        addresses = [self.addresses[p] for p in participants]
+        return {
+            "crowdsale": [crowdsale(name) for name in ["amountRaised", "tokensSold", "fundingGoalReached", "crowdsaleClosed"]] + [d.chain.block.get_balance(d.crowdsale)],
+            "token": [token("totalSupply"), token("burned")],
+            "investments": [crowdsale("balanceOf", a) for a in addresses],
+            "balances": [token("balanceOf", a) for a in addresses],
+            "allowances": [token("allowance", a, spender) for a in addresses for spender in addresses + [d.crowdsale]],
+        }
+
+
+def cross_check(compiled_contracts: dict, operations: Iterable[Operation], check_every=1, contracts=None):
+    """Run operations on both and compare.
+
+    :param check_every: Compare the full state after this many operations, success is compared after each
+    :raise Mismatch: On the first difference
+    """
+    simulation = Simulation()
+    evm = EVMDeployment(compiled_contracts, contracts)
+    count = 0
+    for count, operation in enumerate(operations, start=1):
+        expected, actual = apply(simulation, operation), evm.apply(operation)
+        if expected != actual:
+            raise Mismatch("Operation {} {}: simulator says {}, contracts {}".format(count, operation, expected, actual))
+        if count % check_every == 0:
+            _compare(count, operation, simulation, evm)
+    _compare(count, None, simulation, evm)
+
+
+def _compare(count: int, operation: Operation, simulation: Simulation, evm: EVMDeployment):
+    expected, actual = model_state(simulation), evm.state()
+    if expected != actual:
+        differences = {key: (expected[key], actual[key]) for key in expected if expected[key] != actual[key]}
+        raise Mismatch("State after operation {} {} differs: {}".format(count, operation, differences))
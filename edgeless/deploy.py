@@ -0,0 +1,51 @@
+"""Crowdsale deployment plan.
+
+Deploying one contract, waiting for it to be mined, then deploying the next
+pays a full block time for every step. Here both contracts are deployed in
+the same block with locally assigned nonces and wired up in the next one,
+see :py:mod:`edgeless.plan`.
+"""
+
+from typing import Callable, List, Tuple
+
+from web3 import Web3
+from web3.contract import Contract
+
+from .gasprice import GasPriceStrategy
+from .plan import Deploy, Plan, PlanExecutor, Ref, Step, Transact
+
+
+#: How many tokens the crowdsale may sell on behalf of the owner
+CROWDSALE_ALLOWANCE = 440000000
+
+
+def crowdsale_steps(beneficiary: str, multisig: str, start: int, allowance=CROWDSALE_ALLOWANCE) -> List[Step]:
+    """Steps to deploy crowdsale and token and make them aware of each other.
+
+    :param start: Crowdsale start time, or 1 to have it open since 1970
+    :param allowance: Tokens the crowdsale may sell, ``None`` to leave the approval for later
+    """
+    steps = [
+        Deploy("crowdsale", "Crowdsale", [beneficiary, multisig, start]),
+        Deploy("token", "EdgelessToken", [beneficiary]),
+        Transact("set_token", Ref("crowdsale"), "setToken", [Ref("token")]),
+    ]
+    if allowance is not None:
+        steps.append(Transact("approve", Ref("token"), "approve", [Ref("crowdsale"), allowance]))
+    return steps
+
+
+def deploy_crowdsale(web3: Web3, get_factory: Callable[[str], type], beneficiary: str, multisig: str, start: int,
+                     allowance=CROWDSALE_ALLOWANCE, state_path: str = None, timeout=180,
+                     gas_price: GasPriceStrategy = None, replace_after=120) -> Tuple[Contract, Contract]:
+    """Deploy crowdsale and token in two block times.
+
+    :param get_factory: Contract factory lookup, like ``chain.get_contract_factory``
+    :param state_path: Progress file, to resume an interrupted deployment
+    :param gas_price: Price transactions from recent blocks and replace ones pending longer than ``replace_after`` seconds
+    :return: Tuple (crowdsale, token) contracts
+    """
+    executor = PlanExecutor(web3, get_factory, beneficiary, state_path, timeout=timeout,
+                            gas_price=gas_price, replace_after=replace_after)
+    executor.run(Plan(crowdsale_steps(beneficiary, multisig, start, allowance)))
+    return executor.contract("crowdsale"), executor.contract("token")
@@ -0,0 +1,148 @@
+"""Send tokens to thousands of recipients, for bounties and airdrops.
+
+One ``transfer`` per recipient pays the 21000 gas transaction fee every time
+and needs a transaction of its own to be signed, priced and waited for.
+Here recipients are packed into ``batchTransfer`` chunks sized to stay well
+under the block gas limit. The chunks are steps of a
+:py:class:`edgeless.plan.Plan`, so they are sent back-to-back with local
+nonces, ``window`` chunks at a time, and progress goes to a state file.
+Running the same distribution again skips chunks that went through and
+sends failed ones again.
+
+.. code-block:: python
+
+    recipients = read_recipients("bounties.csv")
+    results = distribute(web3, chain.get_contract_factory, owner, token.address, recipients, state_path="bounties-state.json")
+"""
+
+import csv
+import math
+from typing import Callable, Dict, List, Tuple
+
+from eth_utils import is_address
+from web3 import Web3
+
+from .gasprice import GasPriceStrategy
+from .plan import Plan, PlanExecutor, Step
+
+
+#: Gas of a chunk at most, under half of the block gas limit so that chunks get in next to other transactions
+DEFAULT_CHUNK_GAS = 2000000
+
+#: Gas of a batch transaction besides its recipients: transaction fee, call and sender balance
+BATCH_BASE_GAS = 50000
+
+#: Gas per recipient, with some margin: a new balance slot, the Transfer event and call data
+BATCH_RECIPIENT_GAS = 30000
+
+#: Chunks in flight at once
+DEFAULT_WINDOW = 10
+
+
+#: Recipient address and token amount
+Recipient = Tuple[str, int]
+
+
+def read_recipients(path: str) -> List[Recipient]:
+    """Read a CSV file of ``address,amount`` rows, a header row is allowed.
+
+    :raise ValueError: On a bad address or amount, or an address given twice
+    """
+    recipients = []
+    seen = set()
+    with open(path, "rt") as inp:
+        for line, row in enumerate(csv.reader(inp), start=1):
+            if not row or (line == 1 and not is_address(row[0].strip())):
+                continue
+            address, amount = row[0].strip(), row[1].strip()
+            if not is_address(address):
+                raise ValueError("{} line {}: bad address {}".format(path, line, address))
+            if not amount.isdigit():
+                raise ValueError("{} line {}: bad amount {}".format(path, line, amount))
+            if address.lower() in seen:
+                raise ValueError("{} line {}: {} is listed twice".format(path, line, address))
+            seen.add(address.lower())
+            recipients.append((address, int(amount)))
+    return recipients
+
+
+def batch_gas(count: int, base_gas=BATCH_BASE_GAS, recipient_gas=BATCH_RECIPIENT_GAS) -> int:
+    """Gas limit for a batch transfer to ``count`` recipients."""
+    return base_gas + count * recipient_gas
+
+
+def chunk_recipients(recipients: List[Recipient], max_gas=DEFAULT_CHUNK_GAS, base_gas=BATCH_BASE_GAS,
+                     recipient_gas=BATCH_RECIPIENT_GAS) -> List[List[Recipient]]:
+    """Split recipients to chunks that fit in ``max_gas``, keeping their order."""
+    size = (max_gas - base_gas) // recipient_gas
+    if size < 1:
+        raise ValueError("Not even one recipient fits in {} gas".format(max_gas))
+    return [recipients[i:i + size] for i in range(0, len(recipients), size)]
+
+
+def estimate_individual_time(elapsed: float, chunks: int, recipients: int, window: int, gas_used: int,
+                             individual_gas: int) -> float:
+    """Seconds one ``transfer`` per recipient would have taken, scaled from a timed batch distribution.
+
+    Sent ``window`` at a time like the chunks, transfers wait for a round of
+    receipts per window, and they get no more block space per second than
+    the chunks got. The slower of the two decides.
+
+    :param elapsed: Seconds the chunks took
+    :param gas_used: Gas the chunks used
+    :param individual_gas: Gas of the transfers
+    """
+    round_time = elapsed / math.ceil(chunks / window)
+    by_rounds = round_time * math.ceil(recipients / window)
+    by_gas = elapsed * individual_gas / gas_used
+    return max(by_rounds, by_gas)
+
+
+class BatchTransfer(Step):
+    """Send tokens to a chunk of recipients with ``batchTransfer``."""
+
+    def __init__(self, name: str, token: str, recipients: List[Recipient], contract="EdgelessToken", **kwargs):
+        super().__init__(name, **kwargs)
+        self.token = token
+        self.recipients = list(recipients)
+        self.contract = contract
+
+    def describe(self):
+        return super().describe() + [self.token, self.contract, [list(r) for r in self.recipients]]
+
+    def send(self, executor, transaction):
+        token = executor.get_factory(self.contract)(address=self.token)
+        addresses = [address for address, amount in self.recipients]
+        amounts = [amount for address, amount in self.recipients]
+        return token.transact(transaction).batchTransfer(addresses, amounts)
+
+
+def distribution_steps(token: str, recipients: List[Recipient], max_gas=DEFAULT_CHUNK_GAS,
+                       window=DEFAULT_WINDOW, contract="EdgelessToken") -> List[Step]:
+    """One step per chunk, each waiting for the chunk ``window`` places before it."""
+    steps = []
+    for i, chunk in enumerate(chunk_recipients(recipients, max_gas)):
+        depends = [steps[i - window].name] if i >= window else []
+        steps.append(BatchTransfer("batch-{:05d}".format(i), token, chunk, contract,
+                                   depends=depends, transaction={"gas": batch_gas(len(chunk))}))
+    return steps
+
+
+def distribute(web3: Web3, get_factory: Callable[[str], type], sender: str, token: str, recipients: List[Recipient],
+               state_path: str = None, max_gas=DEFAULT_CHUNK_GAS, window=DEFAULT_WINDOW, timeout=600,
+               assign_nonces=True, gas_price: GasPriceStrategy = None, replace_after=120) -> Dict[str, dict]:
+    """Send tokens to all recipients, or the ones left from an earlier run.
+
+    :param state_path: Progress file, to resume an interrupted or partially failed distribution
+    :param max_gas: Gas of a chunk at most, changing it gives different chunks and the state file no longer applies
+    :return: Map of chunk name to result with ``txid``, ``block_number`` and ``gas_used``
+    :raise edgeless.receipts.TransactionFailed: If a chunk threw, after the chunks sent with it are mined
+    """
+    gas_limit = web3.eth.getBlock("latest")["gasLimit"]
+    if max_gas > gas_limit:
+        raise ValueError("Chunks of {} gas do not fit in blocks of {}".format(max_gas, gas_limit))
+
+    plan = Plan(distribution_steps(token, recipients, max_gas, window))
+    executor = PlanExecutor(web3, get_factory, sender, state_path, timeout=timeout, assign_nonces=assign_nonces,
+                            gas_price=gas_price, replace_after=replace_after)
+    return executor.run(plan)
@@ -0,0 +1,182 @@
+"""Crowdsale contracts on an in-process EVM with real blocks.
+
+The populus tester chain mines every transaction in a block of its own,
+which hides how many purchases fit in a block and what happens when they
+compete for the same one. This drives ``ethereum.tester`` directly: any
+number of transactions go in the pending block until its gas limit is
+reached, failed transactions burn their gas like on mainnet, and block
+timestamps are set by the caller. The contracts come compiled from the
+populus project.
+
+.. code-block:: python
+
+    chain = EVMChain(project.compiled_contracts)
+    crowdsale, token = chain.deploy_crowdsale()
+    result = chain.send(investor_key, crowdsale, to_wei(1, "ether"))
+    chain.mine(timestamp=start + 15)
+"""
+
+from collections import namedtuple
+from typing import Dict, Tuple
+
+from ethereum import processblock, tester, transactions, utils
+from ethereum.abi import ContractTranslator
+from ethereum.exceptions import BlockGasLimitReached  # noqa: F401, callers catch it from here
+
+
+#: Mainnet block gas limit during the crowdsale
+DEFAULT_BLOCK_GAS_LIMIT = 4712388
+
+#: Gas limit wallets put on a crowdsale purchase
+DEFAULT_STARTGAS = 200000
+
+#: Tokens the crowdsale may sell on behalf of the owner
+CROWDSALE_ALLOWANCE = 440000000
+
+#: Crowdsale and token contract names
+CONTRACTS = ("Crowdsale", "EdgelessToken")
+
+#: Gas optimised variants with the same behaviour
+OPTIMISED_CONTRACTS = ("OptimisedCrowdsale", "OptimisedEdgelessToken")
+
+#: Sends constant function calls, the state is reverted after each
+CALLER_KEY = tester.k9
+
+
+#: Outcome of one transaction, ``gas_used`` is all of the start gas for failed ones.
+#: ``logs`` are ``ethereum.processblock.Log`` events, none for failed ones.
+TransactionResult = namedtuple("TransactionResult", ["success", "gas_used", "output", "logs"])
+
+
+class ContractCallFailed(Exception):
+    """A constant function threw."""
+
+
+def account(seed: str) -> Tuple[bytes, bytes]:
+    """Derive a private key and its address from a seed string.
+
+    :return: (private key, address), both raw bytes
+    """
+    key = utils.sha3(seed.encode("utf-8"))
+    return key, utils.privtoaddr(key)
+
+
+class EVMChain:
+    """Contracts of a populus project on a ``ethereum.tester`` state."""
+
+    def __init__(self, compiled_contracts: Dict[str, dict], block_gas_limit=DEFAULT_BLOCK_GAS_LIMIT, gas_price=1):
+        self.state = tester.state()
+        self.compiled_contracts = compiled_contracts
+        self.block_gas_limit = block_gas_limit
+        self.gas_price = gas_price
+        self.translators = {}  # type: Dict[str, ContractTranslator]
+        self.block.gas_limit = block_gas_limit
+
+    @property
+    def block(self):
+        """The pending block transactions go to."""
+        return self.state.block
+
+    def translator(self, contract: str) -> ContractTranslator:
+        translator = self.translators.get(contract)
+        if translator is None:
+            translator = self.translators[contract] = ContractTranslator(self.compiled_contracts[contract]["abi"])
+        return translator
+
+    def deploy(self, contract: str, args: list = None, key=tester.k0) -> bytes:
+        """Deploy a contract in the pending block.
+
+        :return: Contract address
+        """
+        code = utils.decode_hex(utils.remove_0x_head(self.compiled_contracts[contract]["code"]))
+        if args:
+            code += self.translator(contract).encode_constructor_arguments(args)
+
+        # Deployments do not count against the block gas limit
+        gas_limit = self.block.gas_limit
+        self.block.gas_limit = max(gas_limit, self.block.gas_used + tester.gas_limit)
+        try:
+            return self.state.evm(code, sender=key)
+        finally:
+            self.block.gas_limit = gas_limit
+
+    def deploy_crowdsale(self, beneficiary_key=tester.k0, multisig=tester.a1, start=0,
+                         allowance=CROWDSALE_ALLOWANCE, contracts=CONTRACTS) -> Tuple[bytes, bytes]:
+        """Deploy crowdsale and token and wire them up, like :py:func:`edgeless.deploy.crowdsale_steps`.
+
+        :param contracts: Names of the crowdsale and token contracts
+        :return: (crowdsale address, token address)
+        """
+        crowdsale_contract, token_contract = contracts
+        beneficiary = utils.privtoaddr(beneficiary_key)
+        crowdsale = self.deploy(crowdsale_contract, [beneficiary, multisig, start], key=beneficiary_key)
+        token = self.deploy(token_contract, [beneficiary], key=beneficiary_key)
+        self.mine()
+        for result in [
+            self.transact(beneficiary_key, crowdsale_contract, crowdsale, "setToken", [token]),
+            self.transact(beneficiary_key, token_contract, token, "approve", [crowdsale, allowance]),
+        ]:
+            assert result.success
+        return crowdsale, token
+
+    def send(self, key: bytes, to: bytes, value=0, data=b"", startgas=DEFAULT_STARTGAS) -> TransactionResult:
+        """Apply a transaction to the pending block.
+
+        :raise BlockGasLimitReached: If the block has no room for ``startgas``, mine and try again
+        """
+        transaction = transactions.Transaction(self.block.get_nonce(utils.privtoaddr(key)), self.gas_price, startgas, to, value, data)
+        transaction.sign(key)
+        return self.apply(transaction)
+
+    def apply(self, transaction: transactions.Transaction) -> TransactionResult:
+        """Apply a signed transaction to the pending block.
+
+        :raise ethereum.exceptions.InvalidTransaction: If the nonce, balance or block gas limit does not allow it
+        """
+        block = self.block
+        gas_used = block.gas_used
+        success, output = processblock.apply_transaction(block, transaction)
+        logs = block.get_receipt(block.transaction_count - 1).logs
+        return TransactionResult(bool(success), block.gas_used - gas_used, output, logs)
+
+    def transact(self, key: bytes, contract: str, address: bytes, function: str, args: list = None,
+                 value=0, startgas=DEFAULT_STARTGAS) -> TransactionResult:
+        """Call a contract function in a transaction."""
+        data = self.translator(contract).encode_function_call(function, args or [])
+        return self.send(key, address, value, data, startgas)
+
+    def call(self, contract: str, address: bytes, function: str, *args):
+        """Call a constant function against the pending block, leaving no trace."""
+        block = self.block
+        gas_limit = block.gas_limit
+        snapshot = block.snapshot()
+
+        # Block snapshots do not cover the transaction and receipt lists
+        lists = block.transactions.root_hash, block.receipts.root_hash, block.bloom
+
+        block.gas_limit = block.gas_used + tester.gas_limit
+        try:
+            result = self.transact(CALLER_KEY, contract, address, function, list(args), startgas=tester.gas_limit)
+        finally:
+            block.revert(snapshot)
+            block.transactions.root_hash, block.receipts.root_hash, block.bloom = lists
+            block.gas_limit = gas_limit
+
+        if not result.success:
+            raise ContractCallFailed("{}.{}{} threw".format(contract, function, args))
+        decoded = self.translator(contract).decode_function_result(function, result.output)
+        return decoded[0] if len(decoded) == 1 else decoded
+
+    def set_balance(self, address: bytes, wei: int):
+        """Fund an account without a transaction."""
+        self.block.set_balance(address, wei)
+
+    def mine(self, timestamp: int = None):
+        """Seal the pending block and start a new one.
+
+        :param timestamp: Time of the new block, what contracts see as ``now``
+        """
+        self.state.mine()
+        self.block.gas_limit = self.block_gas_limit
+        if timestamp is not None:
+            self.block.timestamp = timestamp
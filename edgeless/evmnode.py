@@ -0,0 +1,305 @@
+"""web3 provider over an in-process EVM with a transaction pool.
+
+The testrpc chain mines every transaction the moment it is sent and does
+not take explicit nonces, so gas price competition, stuck transactions and
+their replacement never happen on it. :py:class:`EVMNode` serves the
+JSON-RPC calls that sending and tracking transactions need from an
+:py:class:`edgeless.evmchain.EVMChain`, and keeps sent transactions in a
+pool the way geth does:
+
+* A transaction with the nonce of a pooled one replaces it, if its gas price
+  is at least 10% higher. The replaced one is gone for good.
+
+* Transactions wait in the pool until the transactions with lower nonces of
+  the same sender have been mined.
+
+* Blocks are mined on demand, highest gas price first, as long as the block
+  gas limit allows.
+
+.. code-block:: python
+
+    node = EVMNode(EVMChain({}, block_gas_limit=63000))
+    web3 = Web3(node)
+    txid = web3.eth.sendTransaction({"from": web3.eth.accounts[0], "to": to, "value": 1, "gasPrice": 20 * GWEI})
+    node.mine()
+"""
+
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ethereum import tester, transactions, utils
+from ethereum.exceptions import InvalidTransaction
+from web3.providers.base import BaseProvider
+
+from .evmchain import EVMChain
+
+
+#: Geth accepts a replacement only if it pays this much more than the pooled transaction
+REPLACEMENT_RATIO = 1.1
+
+#: What eth_gasPrice answers, wei
+DEFAULT_GAS_PRICE = 1000000000
+
+#: Gas limit of a transaction sent without one, like web3 gives
+DEFAULT_GAS = 90000
+
+
+class NodeError(Exception):
+    """Sent back as a JSON-RPC error, web3 raises ``ValueError`` for it."""
+
+
+def to_hex(value: bytes) -> str:
+    return "0x" + value.hex()
+
+
+def from_hex(value: str) -> bytes:
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+
+
+def quantity(value: Optional[str], default: int = None) -> Optional[int]:
+    return default if value is None else int(value, 16)
+
+
+class EVMNode(BaseProvider):
+    """Answer web3 requests from an :py:class:`EVMChain`, with a transaction pool.
+
+    :param keys: Private keys of the accounts that can send, defaults to the ``ethereum.tester`` ones
+    :param mine_on_poll: Mine a block every time a new block filter is polled,
+        like a chain producing a block per poll interval
+    """
+
+    def __init__(self, chain: EVMChain, keys: Sequence[bytes] = None, mine_on_poll=False, gas_price=DEFAULT_GAS_PRICE):
+        self.chain = chain
+        self.keys = {utils.privtoaddr(key): key for key in (keys or tester.keys)}
+        self.mine_on_poll = mine_on_poll
+        self.gas_price = gas_price
+        self.lock = threading.RLock()
+
+        #: Sent and not yet mined transactions by (sender, nonce)
+        self.pool = OrderedDict()  # type: Dict[Tuple[bytes, int], transactions.Transaction]
+
+        #: Every known transaction by hash, with its (block number, index in block, gas used) once mined
+        self.transactions = {}  # type: Dict[bytes, transactions.Transaction]
+        self.mined = {}  # type: Dict[bytes, Tuple[int, int, int]]
+
+        #: Block filters by id, with the next block number they report
+        self.filters = {}  # type: Dict[str, int]
+        self.filter_ids = itertools.count(1)
+
+        if chain.block.number == 0:
+            # Seal the genesis block, so that there is a head to report
+            chain.mine()
+
+    def isConnected(self):
+        return True
+
+    def make_request(self, method: str, params: list) -> dict:
+        handler = getattr(self, method, None)
+        if handler is None or not method.startswith(("eth_", "web3_")):
+            return {"error": {"code": -32601, "message": "Method {} not supported".format(method)}}
+        with self.lock:
+            try:
+                return {"result": handler(*params)}
+            except NodeError as e:
+                return {"error": {"code": -32000, "message": str(e)}}
+
+    #
+    # Chain and pool
+    #
+
+    @property
+    def head(self) -> int:
+        """Number of the last mined block."""
+        return self.chain.block.number - 1
+
+    def block(self, identifier) -> Optional[object]:
+        if identifier in ("latest", "pending"):
+            number = self.head
+        elif identifier == "earliest":
+            number = 0
+        else:
+            number = quantity(identifier)
+        if number > self.head:
+            return None
+        return self.chain.state.blocks[number]
+
+    def pending_nonce(self, sender: bytes) -> int:
+        """Nonce after the mined and the pooled gapless transactions of the sender."""
+        nonce = self.chain.block.get_nonce(sender)
+        while (sender, nonce) in self.pool:
+            nonce += 1
+        return nonce
+
+    def add(self, transaction: transactions.Transaction):
+        """Put a signed transaction to the pool.
+
+        :raise NodeError: If the nonce is used or the price is too low to replace a pooled transaction
+        """
+        sender, nonce = transaction.sender, transaction.nonce
+        if nonce < self.chain.block.get_nonce(sender):
+            raise NodeError("nonce too low")
+
+        pooled = self.pool.get((sender, nonce))
+        if pooled is not None:
+            if transaction.gasprice < pooled.gasprice * REPLACEMENT_RATIO:
+                raise NodeError("replacement transaction underpriced")
+            del self.transactions[pooled.hash]
+
+        self.pool[(sender, nonce)] = transaction
+        self.transactions[transaction.hash] = transaction
+
+    def mine(self, timestamp: int = None) -> int:
+        """Seal a block of the best paying pooled transactions that can run.
+
+        :param timestamp: Time of the block after this one
+        :return: Number of the mined block
+        """
+        with self.lock:
+            block = self.chain.block
+            while True:
+                runnable = [tx for (sender, nonce), tx in self.pool.items() if nonce == block.get_nonce(sender)]
+                fitting = [tx for tx in runnable if block.gas_used + tx.startgas <= block.gas_limit]
+                if not fitting:
+                    break
+
+                transaction = max(fitting, key=lambda tx: tx.gasprice)
+                del self.pool[(transaction.sender, transaction.nonce)]
+                try:
+                    result = self.chain.apply(transaction)
+                except InvalidTransaction:
+                    # E.g. the sender ran out of ether, a node drops these
+                    del self.transactions[transaction.hash]
+                    continue
+                self.mined[transaction.hash] = (block.number, block.transaction_count - 1, result.gas_used)
+
+            number = block.number
+            self.chain.mine(timestamp)
+            return number
+
+    #
+    # JSON-RPC methods, web3 formats the results
+    #
+
+    def web3_clientVersion(self) -> str:
+        return "EVMNode"
+
+    def eth_accounts(self) -> List[str]:
+        return [to_hex(address) for address in self.keys]
+
+    def eth_coinbase(self) -> str:
+        return self.eth_accounts()[0]
+
+    def eth_blockNumber(self) -> str:
+        return hex(self.head)
+
+    def eth_gasPrice(self) -> str:
+        return hex(self.gas_price)
+
+    def eth_getBalance(self, address: str, block="latest") -> str:
+        return hex(self.chain.block.get_balance(utils.normalize_address(address)))
+
+    def eth_getTransactionCount(self, address: str, block="latest") -> str:
+        sender = utils.normalize_address(address)
+        if block == "pending":
+            return hex(self.pending_nonce(sender))
+        return hex(self.chain.block.get_nonce(sender))
+
+    def eth_sendTransaction(self, params: dict) -> str:
+        sender = utils.normalize_address(params["from"])
+        key = self.keys.get(sender)
+        if key is None:
+            raise NodeError("unknown account")
+
+        transaction = transactions.Transaction(
+            quantity(params.get("nonce"), self.pending_nonce(sender)),
+            quantity(params.get("gasPrice"), self.gas_price),
+            quantity(params.get("gas"), DEFAULT_GAS),
+            utils.normalize_address(params["to"]) if params.get("to") else b"",
+            quantity(params.get("value"), 0),
+            from_hex(params.get("data") or "0x"))
+        transaction.sign(key)
+        self.add(transaction)
+        return to_hex(transaction.hash)
+
+    def eth_getTransactionByHash(self, txid: str) -> Optional[dict]:
+        transaction = self.transactions.get(from_hex(txid))
+        if transaction is None:
+            return None
+
+        mined = self.mined.get(transaction.hash)
+        return {
+            "hash": to_hex(transaction.hash),
+            "nonce": hex(transaction.nonce),
+            "from": to_hex(transaction.sender),
+            "to": to_hex(transaction.to) if transaction.to else None,
+            "value": hex(transaction.value),
+            "gas": hex(transaction.startgas),
+            "gasPrice": hex(transaction.gasprice),
+            "input": to_hex(transaction.data),
+            "blockNumber": hex(mined[0]) if mined else None,
+            "blockHash": to_hex(self.chain.state.blocks[mined[0]].hash) if mined else None,
+            "transactionIndex": hex(mined[1]) if mined else None,
+        }
+
+    def eth_getTransactionReceipt(self, txid: str) -> Optional[dict]:
+        mined = self.mined.get(from_hex(txid))
+        if mined is None:
+            return None
+
+        number, index, gas_used = mined
+        block = self.chain.state.blocks[number]
+        transaction = self.transactions[from_hex(txid)]
+        receipt = block.get_receipt(index)
+        return {
+            "transactionHash": to_hex(transaction.hash),
+            "transactionIndex": hex(index),
+            "blockNumber": hex(number),
+            "blockHash": to_hex(block.hash),
+            "gasUsed": hex(gas_used),
+            "cumulativeGasUsed": hex(receipt.gas_used),
+            "contractAddress": to_hex(transaction.creates) if transaction.creates else None,
+            "logs": [{
+                "address": to_hex(log.address),
+                "topics": ["0x{:064x}".format(topic) for topic in log.topics],
+                "data": to_hex(log.data),
+                "blockNumber": hex(number),
+                "blockHash": to_hex(block.hash),
+                "transactionHash": to_hex(transaction.hash),
+                "transactionIndex": hex(index),
+                "logIndex": hex(log_index),
+            } for log_index, log in enumerate(receipt.logs)],
+        }
+
+    def eth_getBlockByNumber(self, identifier, full_transactions=False) -> Optional[dict]:
+        block = self.block(identifier)
+        if block is None:
+            return None
+
+        txids = [to_hex(tx.hash) for tx in block.get_transactions()]
+        return {
+            "number": hex(block.number),
+            "hash": to_hex(block.hash),
+            "parentHash": to_hex(block.prevhash),
+            "timestamp": hex(block.timestamp),
+            "gasLimit": hex(block.gas_limit),
+            "gasUsed": hex(block.gas_used),
+            "transactions": [self.eth_getTransactionByHash(txid) for txid in txids] if full_transactions else txids,
+        }
+
+    def eth_newBlockFilter(self) -> str:
+        filter_id = hex(next(self.filter_ids))
+        self.filters[filter_id] = self.head + 1
+        return filter_id
+
+    def eth_getFilterChanges(self, filter_id: str) -> List[str]:
+        if filter_id not in self.filters:
+            raise NodeError("filter not found")
+        if self.mine_on_poll:
+            self.mine()
+        first, self.filters[filter_id] = self.filters[filter_id], self.head + 1
+        return [to_hex(self.chain.state.blocks[number].hash) for number in range(first, self.head + 1)]
+
+    def eth_uninstallFilter(self, filter_id: str) -> bool:
+        return self.filters.pop(filter_id, None) is not None
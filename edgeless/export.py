@@ -0,0 +1,195 @@
+"""Crowdsale investment export.
+
+The export is a chain of generator stages: fetch log windows, decode them,
+add block timestamps and finally aggregate per backer or write one row per
+event.
+
+Per-backer aggregates are kept in integer wei in a
+:py:class:`edgeless.aggregate.BackerTable` and converted to ether only when
+written out, so they can be checkpointed and merged without rounding.
+The ether column is formatted like the sum of ``from_wei()`` Decimals of
+the investments, digit for digit, see :py:func:`format_ether`.
+"""
+
+import csv
+import datetime
+import json
+import os
+from collections import OrderedDict
+from decimal import Decimal, localcontext
+from typing import Callable, Iterable, List, Tuple
+
+from .aggregate import ETHER_DECIMALS, BackerTable
+from .timestamps import BlockTimestampCache
+
+
+#: Stream of (first block, last block, log entries or events) tuples
+Windows = Iterable[Tuple[int, int, List[dict]]]
+
+
+class ExportState:
+    """Per-backer aggregates and the last block they cover.
+
+    Saved as JSON so that the next run can scan only the blocks
+    after ``last_block`` and merge them in.
+    """
+
+    def __init__(self, address: str, last_block: int = None, backers: BackerTable = None):
+        self.address = address
+        self.last_block = last_block
+        self.backers = backers if backers is not None else BackerTable()
+
+    def add(self, backer: str, amount: int, timestamp: int):
+        """Merge one investment."""
+        self.backers.add([backer], [amount], [timestamp])
+
+    def add_events(self, events: List[dict]):
+        """Merge a batch of timestamped FundTransfer events in one vectorised update."""
+        self.backers.add(
+            [e["args"]["backer"] for e in events],
+            [e["args"]["amount"] for e in events],
+            [e["timestamp"] for e in events],
+        )
+
+    @classmethod
+    def load(cls, path: str, address: str) -> "ExportState":
+        """Read a checkpoint, or start from scratch if there is none yet."""
+        if not os.path.exists(path):
+            return cls(address)
+
+        with open(path, "rt") as inp:
+            data = json.load(inp, object_pairs_hook=OrderedDict)
+
+        if data["address"] != address:
+            raise ValueError("Checkpoint {} is for contract {}, not {}".format(path, data["address"], address))
+
+        backers = BackerTable(capacity=max(1024, len(data["backers"])))
+        entries = data["backers"].values()
+        backers.add(
+            list(data["backers"].keys()),
+            [int(entry["raised"]) for entry in entries],
+            [entry["first_payment"] for entry in entries],
+            # Checkpoints from before decimals were tracked fall back to those of the total
+            [entry["decimals"] for entry in entries] if all("decimals" in entry for entry in entries) else None,
+        )
+        return cls(address, data["last_block"], backers)
+
+    def save(self, path: str):
+        """Write a checkpoint atomically, so a crash never leaves a half written file."""
+        data = OrderedDict([
+            ("address", self.address),
+            ("last_block", self.last_block),
+            # JSON numbers lose precision in many readers, keep wei as strings
+            ("backers", OrderedDict(
+                (backer, {"raised": str(raised), "first_payment": first_payment, "decimals": decimals})
+                for (backer, raised, first_payment), decimals in zip(self.backers.items(), self.backers.row_decimals())
+            )),
+        ])
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wt") as out:
+            json.dump(data, out)
+        os.replace(temp_path, path)
+
+
+def format_ether(raised: int, decimals: int) -> str:
+    """Format wei as ether with the given number of fractional digits.
+
+    Gives the same string as summing ``from_wei(amount, "ether")`` of the
+    investments, whose Decimal result keeps the most fractional digits of
+    any amount, e.g. ``"21.0"`` for 20.5 + 0.5 ether. Totals over 28
+    significant digits, which the Decimal sum would round, stay exact here.
+    """
+    with localcontext() as context:
+        # Enough digits for any uint256, so nothing gets rounded
+        context.prec = 80
+        return str((Decimal(raised) / 10 ** ETHER_DECIMALS).quantize(Decimal(10) ** -decimals))
+
+
+def write_csv(state: ExportState, path: str):
+    """Write one row per backer: address, first payment time, ether raised."""
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+
+        for (address, raised, timestamp), decimals in zip(state.backers.items(), state.backers.row_decimals()):
+            dt = datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+            writer.writerow([address, dt.isoformat(), format_ether(raised, decimals)])
+
+
+#
+# Streaming pipeline stages. Every stage consumes and yields
+# (first block, last block, items) windows, so only one window
+# worth of events is held in memory at a time.
+#
+
+def decode_events(windows: Windows, decode: Callable[[dict], dict]) -> Windows:
+    """Turn raw log entries to web3 style event dicts.
+
+    :param decode: Decoder from :py:mod:`edgeless.logdecoder`, or ``functools.partial(get_event_data, event_abi)``
+    """
+    for start, end, logs in windows:
+        yield start, end, [decode(log) for log in logs]
+
+
+def sort_events(windows: Windows) -> Windows:
+    """Put the events of each window to chain order.
+
+    Windows cover contiguous block ranges in order, so sorting inside
+    each one gives a global ``(blockNumber, logIndex)`` order, no matter
+    how the logs were fetched or in what order the node returned them.
+    """
+    for start, end, events in windows:
+        yield start, end, sorted(events, key=lambda e: (e["blockNumber"], e["logIndex"]))
+
+
+def add_timestamps(windows: Windows, timestamps: BlockTimestampCache) -> Windows:
+    """Set ``timestamp`` on events, one header lookup per distinct block of a window."""
+    for start, end, events in windows:
+        block_timestamps = timestamps.resolve(e["blockNumber"] for e in events)
+        for e in events:
+            e["timestamp"] = block_timestamps[e["blockNumber"]]
+        yield start, end, events
+
+
+def aggregate(windows: Windows, state: ExportState) -> Windows:
+    """Merge investments to per-backer totals, passing windows through for progress reporting."""
+    for start, end, events in windows:
+        # First payment and row order depend on events coming in chain order, see sort_events()
+        state.add_events(events)
+        # An empty or already covered range must not rewind the checkpoint
+        if state.last_block is None or end > state.last_block:
+            state.last_block = end
+        yield start, end, events
+
+
+class EventWriter:
+    """Write one CSV row per investment as the windows stream by.
+
+    Rows are flushed after each window, so a long export can be followed
+    with ``tail -f`` and an interrupted one keeps everything written so far.
+    """
+
+    header = ["transaction_hash", "block_number", "log_index", "backer", "timestamp", "amount_wei"]
+
+    def __init__(self, path: str):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.header)
+
+    def write(self, windows: Windows) -> Windows:
+        for start, end, events in windows:
+            for e in events:
+                dt = datetime.datetime.fromtimestamp(e["timestamp"], tz=datetime.timezone.utc)
+                self.writer.writerow([
+                    e["transactionHash"],
+                    e["blockNumber"],
+                    e["logIndex"],
+                    e["args"]["backer"],
+                    dt.isoformat(),
+                    e["args"]["amount"],
+                ])
+            self.file.flush()
+            yield start, end, events
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,222 @@
+"""Stateful fuzzing of crowdsale and token.
+
+Random operation sequences from :py:func:`edgeless.simulator.random_operations`
+run on an in-process EVM with a high block gas limit, so that a whole block
+of transactions goes in before anything is read back. After each block the
+invariants are checked, and every transaction's success is compared with the
+reference simulator as it goes. A failing sequence is shrunk with delta
+debugging to the fewest operations that still break the same invariant.
+
+.. code-block:: python
+
+    fuzzer = Fuzzer(project.compiled_contracts)
+    failure = fuzzer.fuzz(runs=100, length=200)
+    if failure:
+        print(failure.violation, failure.shrunk)
+"""
+
+import random
+import time
+from collections import OrderedDict, namedtuple
+from typing import Callable, Dict, List, Optional
+
+from .crosscheck import STARTGAS, EVMDeployment
+from .evmchain import CONTRACTS
+from .simulator import (
+    CROWDSALE_ALLOWANCE, MAX_GOAL, MULTISIG, OWNER, PARTICIPANTS, TOTAL_SUPPLY, Operation, Simulation, apply,
+    random_operations)
+
+
+#: Operations in a block, invariants are checked after each
+DEFAULT_BLOCK_SIZE = 50
+
+
+#: An invariant that did not hold, ``index`` is the operation after which it was found
+Violation = namedtuple("Violation", ["index", "invariant", "message"])
+
+#: A failing run, with its operations and the shrunk sequence
+Failure = namedtuple("Failure", ["seed", "violation", "operations", "shrunk"])
+
+
+def read_state(evm: EVMDeployment, participants: List[int] = PARTICIPANTS) -> dict:
+    """What the invariants look at, read from the contracts."""
+    d = evm.deployment
+    addresses = [evm.addresses[p] for p in participants]
+    return {
+        "amount_raised": d.crowdsale_call("amountRaised"),
+        "tokens_sold": d.crowdsale_call("tokensSold"),
+        "total_supply": d.token_call("totalSupply"),
+        "crowdsale_allowance": d.token_call("allowance", evm.addresses[OWNER], d.crowdsale),
+        "ether": d.chain.block.get_balance(d.crowdsale),
+        "investments": [d.crowdsale_call("balanceOf", a) for a in addresses],
+        "balances": [d.token_call("balanceOf", a) for a in addresses + [d.crowdsale]],
+    }
+
+
+def model_state(simulation: Simulation, participants: List[int] = PARTICIPANTS) -> dict:
+    """Same as :py:func:`read_state`, from the simulator."""
+    crowdsale, token = simulation.crowdsale, simulation.token
+    return {
+        "amount_raised": crowdsale.amount_raised,
+        "tokens_sold": crowdsale.tokens_sold,
+        "total_supply": token.total_supply,
+        "crowdsale_allowance": token.allowance(OWNER, crowdsale.address),
+        "ether": crowdsale.ether,
+        "investments": [crowdsale.balances.get(p, 0) for p in participants],
+        "balances": [token.balance_of(p) for p in participants + [crowdsale.address]],
+    }
+
+
+def token_conservation(state: dict, returned: int) -> Optional[str]:
+    """Tokens only move between participants, burning lowers the supply with them."""
+    if sum(state["balances"]) != state["total_supply"]:
+        return "balances add up to {}, total supply is {}".format(sum(state["balances"]), state["total_supply"])
+
+
+def supply_never_grows(state: dict, returned: int) -> Optional[str]:
+    if state["total_supply"] > TOTAL_SUPPLY:
+        return "total supply {} is over the initial {}".format(state["total_supply"], TOTAL_SUPPLY)
+
+
+def max_goal(state: dict, returned: int) -> Optional[str]:
+    if state["tokens_sold"] > MAX_GOAL:
+        return "{} tokens sold, max goal is {}".format(state["tokens_sold"], MAX_GOAL)
+
+
+def tokens_sold_from_allowance(state: dict, returned: int) -> Optional[str]:
+    """Every token sold comes out of the owner's allowance to the crowdsale."""
+    used = CROWDSALE_ALLOWANCE - state["crowdsale_allowance"]
+    if state["tokens_sold"] != used:
+        return "{} tokens sold, {} taken from the allowance".format(state["tokens_sold"], used)
+
+
+def amount_raised(state: dict, returned: int) -> Optional[str]:
+    """Raised ether is what investors have in, plus what was refunded out of the returned funds."""
+    refunded = returned - state["ether"]
+    if state["amount_raised"] != sum(state["investments"]) + refunded:
+        return "amount raised {}, investments {} and refunds {}".format(state["amount_raised"], sum(state["investments"]), refunded)
+
+
+#: Name to check, returning a message when broken. Checks get the read state and the ether the multisig returned.
+INVARIANTS = OrderedDict([
+    ("token conservation", token_conservation),
+    ("supply never grows", supply_never_grows),
+    ("max goal", max_goal),
+    ("tokens sold from allowance", tokens_sold_from_allowance),
+    ("amount raised", amount_raised),
+])  # type: Dict[str, Callable[[dict, int], Optional[str]]]
+
+
+def shrink(operations: list, fails: Callable[[list], bool]) -> list:
+    """Delta debugging: the smallest subsequence found that still fails.
+
+    Tries dropping ever smaller chunks of the sequence, keeping any smaller sequence that fails.
+    """
+    parts = 2
+    while len(operations) >= 2:
+        size = -(-len(operations) // parts)
+        chunks = [operations[i:i + size] for i in range(0, len(operations), size)]
+        for i, chunk in enumerate(chunks):
+            complement = [op for other in chunks[:i] + chunks[i + 1:] for op in other]
+            if fails(chunk):
+                operations, parts = chunk, 2
+                break
+            if fails(complement):
+                operations, parts = complement, max(parts - 1, 2)
+                break
+        else:
+            if parts >= len(operations):
+                break
+            parts = min(parts * 2, len(operations))
+    return operations
+
+
+class Fuzzer:
+    """Run operation sequences against the contracts and check invariants.
+
+    :param model: Also compare with the reference simulator, a broken invariant of its own called ``simulator``
+    :param invariants: Checks to run after every block, see :py:data:`INVARIANTS`
+    """
+
+    def __init__(self, compiled_contracts: dict, contracts=CONTRACTS, block_gas_limit: int = None,
+                 block_size=DEFAULT_BLOCK_SIZE, model=True, invariants: Dict[str, Callable] = None):
+        self.compiled_contracts = compiled_contracts
+        self.contracts = contracts
+        # Room for a whole block of operations at the cross-check start gas
+        self.block_gas_limit = block_gas_limit or block_size * STARTGAS
+        self.block_size = block_size
+        self.model = model
+        self.invariants = INVARIANTS if invariants is None else invariants
+
+        # Statistics
+        self.operations = 0
+        self.blocks = 0
+        self.seconds = 0.0
+
+    def run(self, operations: List[Operation]) -> Optional[Violation]:
+        """Run a sequence on freshly deployed contracts.
+
+        :return: The first invariant found broken, or None
+        """
+        started = time.time()
+        try:
+            return self._run(operations)
+        finally:
+            self.seconds += time.time() - started
+
+    def _run(self, operations: List[Operation]) -> Optional[Violation]:
+        evm = EVMDeployment(self.compiled_contracts, self.contracts, self.block_gas_limit)
+
+        # Shrunk sequences may not set the time at all. The simulator then has zero and
+        # the contracts the tester block time of 2014, both before every crowdsale date.
+        simulation = Simulation() if self.model else None
+        returned = 0
+        for i, operation in enumerate(operations):
+            success = evm.apply(operation)
+            self.operations += 1
+            if success and operation.function == "send" and operation.sender == MULTISIG:
+                returned += operation.value
+
+            if simulation:
+                expected = apply(simulation, operation)
+                if expected != success:
+                    return Violation(i, "simulator", "{} {} on the contracts, {} on the simulator".format(
+                        operation, "succeeded" if success else "threw", "succeeds" if expected else "throws"))
+
+            if (i + 1) % self.block_size == 0 or i == len(operations) - 1:
+                violation = self.check(i, evm, simulation, returned)
+                if violation:
+                    return violation
+                evm.deployment.chain.mine()
+                self.blocks += 1
+
+    def check(self, index: int, evm: EVMDeployment, simulation: Optional[Simulation], returned: int) -> Optional[Violation]:
+        state = read_state(evm)
+        for name, invariant in self.invariants.items():
+            message = invariant(state, returned)
+            if message:
+                return Violation(index, name, message)
+        if simulation:
+            expected = model_state(simulation)
+            if state != expected:
+                differences = {key: (expected[key], state[key]) for key in state if state[key] != expected[key]}
+                return Violation(index, "simulator", "state differs, simulator and contracts: {}".format(differences))
+
+    def shrink(self, operations: List[Operation], violation: Violation) -> List[Operation]:
+        """Fewest operations that break the same invariant."""
+        def fails(candidate):
+            found = self.run(candidate)
+            return found is not None and found.invariant == violation.invariant
+        return shrink(operations[:violation.index + 1], fails)
+
+    def fuzz(self, runs: int, length: int, seed=0) -> Optional[Failure]:
+        """Run random sequences until one fails.
+
+        :return: The first failure with its shrunk sequence, or None
+        """
+        for run_seed in range(seed, seed + runs):
+            operations = random_operations(random.Random(run_seed), length)
+            violation = self.run(operations)
+            if violation:
+                return Failure(run_seed, violation, operations, self.shrink(operations, violation))
+        return None
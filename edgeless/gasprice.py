@@ -0,0 +1,258 @@
+"""Gas price selection and replacement of stuck transactions.
+
+Sending without a gas price leaves it to the node, which on a busy network
+often picks one that takes many blocks to get in. Here the price comes from
+recent blocks: for a wanted confirmation time of ``target_blocks`` and a
+``probability``, we look at every run of ``target_blocks`` consecutive
+recent blocks, take the cheapest price that got in during it, and pick the
+price that would have made it in the wanted share of runs. Blocks with room
+to spare took anything, so their cheapest price counts as the floor.
+
+Transactions still pending past a deadline are sent again with the same
+nonce and a higher price, which makes the node replace the old one. A
+miner that never saw the replacement may still mine the old one, so every
+attempt is followed: the latest on every new block, the replaced ones once
+per deadline, which keeps the receipt requests per block at one for each
+transaction.
+"""
+
+import logging
+import math
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+from populus.utils.compat import Timeout
+from web3 import Web3
+
+from .batchrpc import BatchRPC
+from .receipts import ReceiptTracker
+
+
+logger = logging.getLogger(__name__)
+
+
+#: Geth and Parity replace a pending transaction only if the new price is at least 10% higher
+REPLACEMENT_BUMP = 1.125
+
+#: Do not go below this, wei
+DEFAULT_MIN_PRICE = 1000000000
+
+#: A block with more gas used than this share of its limit is full
+DEFAULT_FULL_RATIO = 0.9
+
+
+def percentile(values: List[int], probability: float) -> int:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(probability * len(ordered))))
+    return ordered[rank - 1]
+
+
+def block_floor(block: dict, min_price: int, full_ratio=DEFAULT_FULL_RATIO) -> int:
+    """Cheapest gas price that got in to a block, or the floor if the block had room left."""
+    prices = [tx["gasPrice"] for tx in block["transactions"]]
+    if not prices or block["gasUsed"] < block["gasLimit"] * full_ratio:
+        return min_price
+    return max(min_price, min(prices))
+
+
+def price_for(blocks: List[dict], probability: float, target_blocks: int, min_price: int, full_ratio=DEFAULT_FULL_RATIO) -> int:
+    """Gas price to get in within ``target_blocks`` with ``probability``, judging from past blocks.
+
+    :param blocks: Consecutive blocks with full transaction data, ints as web3 formats them
+    """
+    floors = [block_floor(block, min_price, full_ratio) for block in blocks]
+    if not floors:
+        return min_price
+    target_blocks = max(1, min(target_blocks, len(floors)))
+    windows = [min(floors[i:i + target_blocks]) for i in range(len(floors) - target_blocks + 1)]
+    return percentile(windows, probability)
+
+
+def bump_price(old_price: int, suggested_price: int, max_price: Optional[int] = None) -> int:
+    """Price for a replacement transaction, high enough for the node to accept it."""
+    price = max(int(math.ceil(old_price * REPLACEMENT_BUMP)), suggested_price)
+    if max_price is not None:
+        price = min(price, max_price)
+    return price
+
+
+class GasPriceStrategy:
+    """Suggest gas prices from recently mined blocks.
+
+    Example:
+
+    .. code-block:: python
+
+        strategy = GasPriceStrategy(web3, probability=0.9, target_blocks=3)
+        txid = web3.eth.sendTransaction({"from": owner, "to": to, "value": 1, "gasPrice": strategy.suggest()})
+    """
+
+    def __init__(self, web3: Web3, probability=0.9, target_blocks=3, sample_blocks=50,
+                 min_price=DEFAULT_MIN_PRICE, max_price: Optional[int] = None,
+                 full_ratio=DEFAULT_FULL_RATIO, batch: BatchRPC = None, cache_seconds=15):
+        self.web3 = web3
+        self.probability = probability
+        self.target_blocks = target_blocks
+        self.sample_blocks = sample_blocks
+        self.min_price = min_price
+        self.max_price = max_price
+        self.full_ratio = full_ratio
+        self.batch = batch
+        self.cache_seconds = cache_seconds
+        self.cached = None
+        self.cached_at = 0
+
+    def fetch_blocks(self) -> List[dict]:
+        """Get the most recent blocks with their transactions."""
+        head = self.web3.eth.blockNumber
+        numbers = range(max(0, head - self.sample_blocks + 1), head + 1)
+        if self.batch:
+            blocks = self.batch.call_many(("eth_getBlockByNumber", [hex(n), True]) for n in numbers)
+            return [{
+                "gasUsed": int(block["gasUsed"], 16),
+                "gasLimit": int(block["gasLimit"], 16),
+                "transactions": [{"gasPrice": int(tx["gasPrice"], 16)} for tx in block["transactions"]],
+            } for block in blocks if block]
+        return [block for block in (self.web3.eth.getBlock(n, True) for n in numbers) if block]
+
+    def suggest(self) -> int:
+        """Get the gas price for new transactions, cached for a block time."""
+        if self.cached is None or time.time() - self.cached_at > self.cache_seconds:
+            price = price_for(self.fetch_blocks(), self.probability, self.target_blocks, self.min_price, self.full_ratio)
+            if self.max_price is not None:
+                price = min(price, self.max_price)
+            self.cached = price
+            self.cached_at = time.time()
+        return self.cached
+
+
+class ReplacingSender:
+    """Send transactions and replace the ones stuck past a deadline.
+
+    Every transaction is identified by a caller chosen key, and may have
+    several attempts with the same nonce. Any of those can end up mined,
+    the first one found mined is the outcome.
+    """
+
+    def __init__(self, web3: Web3, tracker: ReceiptTracker, strategy: Optional[GasPriceStrategy] = None,
+                 deadline=120, on_send: Callable[[Hashable, List[str]], None] = None):
+        self.web3 = web3
+        self.tracker = tracker
+        self.strategy = strategy
+        self.deadline = deadline
+        self.on_send = on_send
+        self.attempts = {}  # type: Dict[Hashable, dict]
+
+        # Statistics
+        self.replacements = 0
+
+    def send(self, key: Hashable, send_func: Callable[[dict], str], transaction: dict):
+        """Send a new transaction.
+
+        :param send_func: Sends transaction parameters and returns the hash, called again for replacements
+        :param transaction: Parameters, must have ``nonce`` for replacements to work
+        """
+        transaction = dict(transaction)
+        if self.strategy and "gasPrice" not in transaction:
+            transaction["gasPrice"] = self.strategy.suggest()
+        txid = send_func(transaction)
+        self.attempts[key] = {"send": send_func, "transaction": transaction, "txids": [], "futures": []}
+        self.attempt(key, txid)
+
+    def resume(self, key: Hashable, send_func: Callable[[dict], str], transaction: dict, txids: List[str]):
+        """Follow transactions sent by an earlier run.
+
+        Nonce and price are taken from the last attempt, so it can still be replaced.
+        """
+        transaction = dict(transaction)
+        last = self.web3.eth.getTransaction(txids[-1])
+        if last:
+            transaction.update({"nonce": last["nonce"], "gasPrice": last["gasPrice"]})
+        self.attempts[key] = {"send": send_func, "transaction": transaction, "txids": [], "futures": []}
+        for txid in txids:
+            self.attempt(key, txid, notify=False)
+
+    def attempt(self, key: Hashable, txid: str, notify=True):
+        data = self.attempts[key]
+        data["txids"].append(txid)
+        data["futures"].append(self.tracker.track(txid))
+        data["sent_at"] = time.time()
+        if notify and self.on_send:
+            self.on_send(key, list(data["txids"]))
+
+    def txids(self, key: Hashable) -> List[str]:
+        return list(self.attempts[key]["txids"])
+
+    def outcome(self, key: Hashable) -> Optional[Future]:
+        """Get the future of the attempt that was mined, if any."""
+        for future in self.attempts[key]["futures"]:
+            if future.done():
+                return future
+        return None
+
+    def replace(self, key: Hashable):
+        """Send the transaction again with a higher price."""
+        data = self.attempts[key]
+        transaction = data["transaction"]
+        if not self.strategy or "nonce" not in transaction:
+            return
+
+        if self.recheck(key):
+            return
+
+        old_price = transaction.get("gasPrice") or self.web3.eth.gasPrice
+        price = bump_price(old_price, self.strategy.suggest(), self.strategy.max_price)
+        if price <= old_price:
+            # Already at the ceiling, keep waiting
+            data["sent_at"] = time.time()
+            return
+
+        transaction = dict(transaction, gasPrice=price)
+        try:
+            txid = data["send"](transaction)
+        except ValueError:
+            # Nonce too low, an earlier attempt got mined in the meanwhile
+            data["sent_at"] = time.time()
+            self.recheck(key)
+            return
+
+        data["transaction"] = transaction
+        self.replacements += 1
+        logger.info("Replaced stuck transaction %s with %s at gas price %d", data["txids"][-1], txid, price)
+
+        # Still followed, but not on every block
+        for old_txid in data["txids"]:
+            self.tracker.pause(old_txid)
+        self.attempt(key, txid)
+
+    def recheck(self, key: Hashable) -> bool:
+        """Look for the replaced attempts of a transaction.
+
+        :return: True if an attempt was mined
+        """
+        txids = self.attempts[key]["txids"][:-1]
+        if txids:
+            self.tracker.check(txids)
+        return self.outcome(key) is not None
+
+    def wait(self, keys: Iterable[Hashable], timeout=600, poll_interval=1.0) -> Dict[Hashable, Future]:
+        """Poll until one attempt of each transaction is mined, replacing stuck ones.
+
+        :return: Map of key to the future of the mined attempt
+        """
+        keys = list(keys)
+        with Timeout(timeout) as _timeout:
+            while True:
+                self.tracker.poll()
+                outcomes = {key: self.outcome(key) for key in keys}
+                if all(outcomes.values()):
+                    return outcomes
+
+                now = time.time()
+                for key, outcome in outcomes.items():
+                    if outcome is None and now - self.attempts[key]["sent_at"] > self.deadline:
+                        self.replace(key)
+
+                _timeout.sleep(poll_interval)
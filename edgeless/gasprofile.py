@@ -0,0 +1,267 @@
+"""Gas used by every crowdsale and token entry point.
+
+Each scenario deploys crowdsale and token on a fresh
+:py:class:`edgeless.evmchain.EVMChain`, brings them to the state it needs,
+and measures the gas of one transaction: an entry point in every price tier,
+first buys against repeat buys, the owner lock path and so on. Results are
+compared against a baseline file, where the recorded gas of each scenario is
+its budget.
+
+.. code-block:: python
+
+    gas = profile(project.compiled_contracts)
+    over = over_budget(gas, load_baseline("tests/gas-baseline.json"))
+"""
+
+import json
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+from ethereum import tester, utils
+
+from .evmchain import CONTRACTS, DEFAULT_BLOCK_GAS_LIMIT, EVMChain, TransactionResult
+
+
+#: Match in TestableCrowdsale
+START = 1488294000
+
+#: Price tier deadlines, match in TestableCrowdsale
+DEADLINES = [1488297600, 1488902400, 1489507200, 1490112000]
+
+#: Tokens unlock for everybody, match in TestableToken
+TOKEN_START = 1490112000
+
+#: The owner share stays locked for a year after the token start
+OWNER_UNLOCKED = TOKEN_START + 365 * 24 * 3600
+
+#: Tokens for 50000 ether in the first tier, over the funding goal
+GOAL_REACHING_ETHER = 50000
+
+ETHER = 10 ** 18
+
+#: Deploys contracts and owns the tokens
+OWNER_KEY, OWNER = tester.k0, tester.a0
+
+#: The crowdsale multisig wallet
+MULTISIG_KEY, MULTISIG = tester.k1, tester.a1
+
+#: Buy and move tokens
+INVESTOR_KEY, INVESTOR = tester.k2, tester.a2
+INVESTOR_2_KEY, INVESTOR_2 = tester.k3, tester.a3
+
+
+#: Scenario name to function, filled by @scenario
+SCENARIOS = OrderedDict()  # type: Dict[str, Callable[[Deployment], TransactionResult]]
+
+
+def scenario(name: str):
+    """Register a scenario. It sets up the deployment and returns the result of the measured transaction."""
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+class Deployment:
+    """Freshly deployed crowdsale and token.
+
+    :param contracts: Names of the crowdsale and token contracts, see :py:data:`edgeless.evmchain.OPTIMISED_CONTRACTS`
+    """
+
+    def __init__(self, compiled_contracts: dict, contracts=CONTRACTS, gas_price=1, block_gas_limit=DEFAULT_BLOCK_GAS_LIMIT):
+        self.chain = EVMChain(compiled_contracts, block_gas_limit=block_gas_limit, gas_price=gas_price)
+        self.crowdsale_contract, self.token_contract = contracts
+        self.crowdsale, self.token = self.chain.deploy_crowdsale(OWNER_KEY, MULTISIG, contracts=contracts)
+
+    def crowdsale_transact(self, key: bytes, function: str, *args, value=0) -> TransactionResult:
+        return self.chain.transact(key, self.crowdsale_contract, self.crowdsale, function, list(args), value=value)
+
+    def token_transact(self, key: bytes, function: str, *args) -> TransactionResult:
+        return self.chain.transact(key, self.token_contract, self.token, function, list(args))
+
+    def crowdsale_call(self, function: str, *args):
+        return self.chain.call(self.crowdsale_contract, self.crowdsale, function, *args)
+
+    def token_call(self, function: str, *args):
+        return self.chain.call(self.token_contract, self.token, function, *args)
+
+    def set_current(self, timestamp: int):
+        """Move both contracts in time."""
+        self.crowdsale_transact(OWNER_KEY, "setCurrent", timestamp)
+        self.token_transact(OWNER_KEY, "setCurrent", timestamp)
+
+    def invest(self, key: bytes, ether: int) -> TransactionResult:
+        return self.chain.send(key, self.crowdsale, ether * ETHER)
+
+
+def tier_time(tier: int) -> int:
+    """A moment when the price tier is on."""
+    return DEADLINES[tier] - 1
+
+
+def _invest_scenarios():
+    for tier in range(len(DEADLINES)):
+        def first(d, tier=tier):
+            d.set_current(tier_time(tier))
+            return d.crowdsale_transact(INVESTOR_KEY, "invest", INVESTOR, value=ETHER)
+
+        def repeat(d, tier=tier):
+            d.set_current(tier_time(tier))
+            d.crowdsale_transact(INVESTOR_KEY, "invest", INVESTOR, value=ETHER)
+            return d.crowdsale_transact(INVESTOR_KEY, "invest", INVESTOR, value=ETHER)
+
+        def price(d, tier=tier):
+            d.set_current(tier_time(tier))
+            return d.crowdsale_transact(INVESTOR_KEY, "getPrice")
+
+        scenario("Crowdsale.invest tier {} first buy".format(tier + 1))(first)
+        scenario("Crowdsale.invest tier {} repeat buy".format(tier + 1))(repeat)
+        scenario("Crowdsale.getPrice tier {}".format(tier + 1))(price)
+
+
+_invest_scenarios()
+
+
+@scenario("Crowdsale.fallback first buy")
+def fallback_buy(d: Deployment):
+    d.set_current(tier_time(0))
+    return d.invest(INVESTOR_KEY, 1)
+
+
+@scenario("Crowdsale.checkGoalReached goal reached")
+def goal_reached(d: Deployment):
+    d.set_current(tier_time(0))
+    d.invest(INVESTOR_KEY, GOAL_REACHING_ETHER)
+    d.set_current(DEADLINES[-1] + 1)
+    return d.crowdsale_transact(OWNER_KEY, "checkGoalReached")
+
+
+@scenario("Crowdsale.checkGoalReached goal missed")
+def goal_missed(d: Deployment):
+    d.set_current(tier_time(0))
+    d.invest(INVESTOR_KEY, 1)
+    d.set_current(DEADLINES[-1] + 1)
+    return d.crowdsale_transact(OWNER_KEY, "checkGoalReached")
+
+
+@scenario("Crowdsale.safeWithdrawal refund")
+def refund(d: Deployment):
+    d.set_current(tier_time(0))
+    d.invest(INVESTOR_KEY, 1)
+
+    # Multisig returns the funds for refunds
+    d.chain.send(MULTISIG_KEY, d.crowdsale, ETHER)
+    d.set_current(DEADLINES[-1] + 1)
+    d.crowdsale_transact(OWNER_KEY, "checkGoalReached")
+    return d.crowdsale_transact(INVESTOR_KEY, "safeWithdrawal")
+
+
+def _give_tokens(d: Deployment, amount=1000):
+    """Investor gets tokens from the owner after the crowdsale."""
+    d.set_current(TOKEN_START + 1)
+    d.token_transact(OWNER_KEY, "transfer", INVESTOR, amount)
+
+
+@scenario("EdgelessToken.transfer new holder")
+def transfer_new(d: Deployment):
+    _give_tokens(d)
+    return d.token_transact(INVESTOR_KEY, "transfer", INVESTOR_2, 100)
+
+
+@scenario("EdgelessToken.transfer existing holder")
+def transfer_existing(d: Deployment):
+    _give_tokens(d)
+    d.token_transact(INVESTOR_KEY, "transfer", INVESTOR_2, 100)
+    return d.token_transact(INVESTOR_KEY, "transfer", INVESTOR_2, 100)
+
+
+@scenario("EdgelessToken.transfer owner locked")
+def transfer_owner_locked(d: Deployment):
+    """Owner spends above the locked share during the lock year."""
+    d.set_current(TOKEN_START + 1)
+    return d.token_transact(OWNER_KEY, "transfer", INVESTOR, 1000)
+
+
+@scenario("EdgelessToken.transfer owner unlocked")
+def transfer_owner_unlocked(d: Deployment):
+    d.set_current(OWNER_UNLOCKED + 1)
+    return d.token_transact(OWNER_KEY, "transfer", INVESTOR, 1000)
+
+
+@scenario("EdgelessToken.batchTransfer 10 new holders")
+def batch_transfer(d: Deployment):
+    d.set_current(TOKEN_START + 1)
+    recipients = [utils.int_to_addr(0x1000 + i) for i in range(10)]
+    return d.token_transact(OWNER_KEY, "batchTransfer", recipients, [1000] * 10)
+
+
+@scenario("EdgelessToken.approve")
+def approve(d: Deployment):
+    _give_tokens(d)
+    return d.token_transact(INVESTOR_KEY, "approve", INVESTOR_2, 100)
+
+
+@scenario("EdgelessToken.transferFrom")
+def transfer_from(d: Deployment):
+    _give_tokens(d)
+    d.token_transact(INVESTOR_KEY, "approve", INVESTOR_2, 100)
+    return d.token_transact(INVESTOR_2_KEY, "transferFrom", INVESTOR, INVESTOR_2, 100)
+
+
+@scenario("EdgelessToken.transferFrom owner during crowdsale")
+def transfer_from_owner(d: Deployment):
+    """What the crowdsale does for every buy."""
+    d.set_current(tier_time(0))
+    d.token_transact(OWNER_KEY, "approve", INVESTOR, 1000)
+    return d.token_transact(INVESTOR_KEY, "transferFrom", OWNER, INVESTOR, 1000)
+
+
+@scenario("EdgelessToken.burn")
+def burn(d: Deployment):
+    d.set_current(TOKEN_START + 1)
+    return d.token_transact(OWNER_KEY, "burn")
+
+
+def measure(compiled_contracts: dict, name: str, contracts=CONTRACTS) -> int:
+    """Run one scenario.
+
+    :return: Gas used by the measured transaction
+    """
+    result = SCENARIOS[name](Deployment(compiled_contracts, contracts))
+    if not result.success:
+        raise RuntimeError("Scenario {} transaction threw".format(name))
+    return result.gas_used
+
+
+def profile(compiled_contracts: dict, names: List[str] = None, contracts=CONTRACTS) -> Dict[str, int]:
+    """Run scenarios, all by default.
+
+    :return: Gas used by scenario name
+    """
+    return OrderedDict((name, measure(compiled_contracts, name, contracts)) for name in (names or SCENARIOS))
+
+
+def load_baseline(path: str) -> Dict[str, int]:
+    """Read recorded gas, empty if there is no baseline yet."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rt") as inp:
+        return json.load(inp)
+
+
+def save_baseline(path: str, gas: Dict[str, int]):
+    """Record gas as the new budgets."""
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temp_path, "wt") as out:
+        json.dump(gas, out, indent=2, sort_keys=True)
+        out.write("\n")
+    os.replace(temp_path, path)
+
+
+def over_budget(gas: Dict[str, int], baseline: Dict[str, int]) -> Dict[str, Tuple[int, int]]:
+    """Scenarios using more gas than recorded.
+
+    :return: Scenario name to (gas used, budget)
+    """
+    return {name: (used, baseline[name]) for name, used in gas.items() if name in baseline and used > baseline[name]}
@@ -0,0 +1,213 @@
+"""Simulate a rush of crowdsale investors.
+
+Thousands of synthetic investors buy tokens at times drawn from a chosen
+distribution over the crowdsale price tiers. Purchases wait in a pool until
+their time comes and then go in blocks, ``block_time`` seconds apart, as
+many as fit in the block gas limit. What does not fit waits for the next
+block, like on a congested network. Idle stretches with nothing pending
+are skipped over.
+
+Every block is recorded with its purchases, failures, gas used, pending
+pool size and the crowdsale ``tokensSold`` after it, see
+:py:class:`BlockStats`.
+"""
+
+import math
+import random
+from collections import deque, namedtuple
+from typing import Callable, Iterable, List
+
+from ethereum.exceptions import BlockGasLimitReached
+
+from .evmchain import DEFAULT_STARTGAS, EVMChain, account
+
+
+#: Seconds between blocks
+DEFAULT_BLOCK_TIME = 15
+
+#: One ether in wei
+ETHER = 10 ** 18
+
+
+#: A planned purchase
+Purchase = namedtuple("Purchase", ["time", "investor", "wei"])
+
+#: What happened in one block
+BlockStats = namedtuple("BlockStats", ["number", "timestamp", "purchases", "failures", "gas_used", "pending", "price", "tokens_sold", "amount_raised"])
+
+
+def fixed_size(ether: float) -> Callable[[random.Random], int]:
+    return lambda rnd: int(ether * ETHER)
+
+
+def uniform_size(low: float, high: float) -> Callable[[random.Random], int]:
+    return lambda rnd: int(rnd.uniform(low, high) * ETHER)
+
+
+def lognormal_size(median: float, sigma: float) -> Callable[[random.Random], int]:
+    """Most buy around the median, a few whales buy a lot."""
+    return lambda rnd: int(rnd.lognormvariate(math.log(median), sigma) * ETHER)
+
+
+def rush_time(start: int, end: int, half_life: float) -> Callable[[random.Random], int]:
+    """Buying interest halves every ``half_life`` seconds after the start."""
+    rate = math.log(2) / half_life
+    return lambda rnd: min(end - 1, start + int(rnd.expovariate(rate)))
+
+
+def uniform_time(start: int, end: int) -> Callable[[random.Random], int]:
+    return lambda rnd: rnd.randrange(start, end)
+
+
+def tier_time(boundaries: List[int], weights: List[float]) -> Callable[[random.Random], int]:
+    """Pick a price tier by weight, then a time within it.
+
+    :param boundaries: Crowdsale start followed by the tier deadlines
+    """
+    tiers = list(zip(boundaries[:-1], boundaries[1:]))
+    if len(weights) != len(tiers):
+        raise ValueError("Need {} tier weights, got {}".format(len(tiers), len(weights)))
+
+    def draw(rnd):
+        low, high = weighted_choice(rnd, tiers, weights)
+        return rnd.randrange(low, high)
+    return draw
+
+
+def weighted_choice(rnd: random.Random, items: list, weights: List[float]):
+    """Same as random.choices(), which needs Python 3.6."""
+    point = rnd.uniform(0, sum(weights))
+    for item, weight in zip(items, weights):
+        point -= weight
+        if point < 0:
+            return item
+    return items[-1]
+
+
+def plan_purchases(purchases: int, investors: int, size: Callable[[random.Random], int],
+                   time: Callable[[random.Random], int], seed=0) -> List[Purchase]:
+    """Draw purchases, each investor buying about the same number of times.
+
+    :return: Purchases in time order
+    """
+    rnd = random.Random(seed)
+    planned = [Purchase(time(rnd), i % investors, size(rnd)) for i in range(purchases)]
+    planned.sort()
+    return planned
+
+
+class LoadGenerator:
+    """Run planned purchases against a crowdsale on an :py:class:`edgeless.evmchain.EVMChain`.
+
+    Example:
+
+    .. code-block:: python
+
+        chain = EVMChain(project.compiled_contracts)
+        generator = LoadGenerator(chain, investors=1000)
+        start, end = generator.boundaries()[0], generator.boundaries()[-1]
+        purchases = plan_purchases(5000, 1000, lognormal_size(5, 1.5), rush_time(start, end, 3600))
+        for stats in generator.run(purchases):
+            print(stats)
+    """
+
+    def __init__(self, chain: EVMChain, investors: int, block_time=DEFAULT_BLOCK_TIME, startgas=DEFAULT_STARTGAS):
+        self.chain = chain
+        self.block_time = block_time
+        self.startgas = startgas
+        self.crowdsale, self.token = chain.deploy_crowdsale()
+        self.investors = [account("investor-{}".format(i)) for i in range(investors)]
+
+        # Gas of purchases that got through, and of those that threw
+        self.purchase_gas = 0
+        self.failure_gas = 0
+
+    def call(self, function: str, *args):
+        return self.chain.call("Crowdsale", self.crowdsale, function, *args)
+
+    def boundaries(self) -> List[int]:
+        """Crowdsale start and the price tier deadlines."""
+        return [self.call("start")] + [self.call("deadlines", i) for i in range(4)]
+
+    def fund(self, purchases: Iterable[Purchase]):
+        """Give every investor the ether for their purchases and gas."""
+        needed = [0] * len(self.investors)
+        for purchase in purchases:
+            needed[purchase.investor] += purchase.wei + self.startgas * self.chain.gas_price
+        for (key, address), wei in zip(self.investors, needed):
+            self.chain.set_balance(address, wei)
+
+    def run(self, purchases: List[Purchase]) -> Iterable[BlockStats]:
+        """Mine blocks until all purchases are in.
+
+        :param purchases: In time order, see :py:func:`plan_purchases`
+        :return: Iterable of stats for every block with purchases
+        """
+        self.fund(purchases)
+        upcoming = deque(purchases)
+        pending = deque()
+        timestamp = upcoming[0].time if upcoming else 0
+        self.chain.mine(timestamp=timestamp)
+
+        while upcoming or pending:
+            if not pending and upcoming[0].time > timestamp:
+                # Nothing to do until the next purchase
+                timestamp = upcoming[0].time
+                self.chain.block.timestamp = timestamp
+
+            while upcoming and upcoming[0].time <= timestamp:
+                pending.append(upcoming.popleft())
+
+            included = failures = 0
+            while pending:
+                purchase = pending[0]
+                key, address = self.investors[purchase.investor]
+                try:
+                    result = self.chain.send(key, self.crowdsale, purchase.wei, startgas=self.startgas)
+                except BlockGasLimitReached:
+                    break
+                pending.popleft()
+                included += 1
+                if result.success:
+                    self.purchase_gas += result.gas_used
+                else:
+                    failures += 1
+                    self.failure_gas += result.gas_used
+
+            if pending and not included:
+                raise ValueError("Start gas {} does not fit in an empty block".format(self.startgas))
+
+            yield BlockStats(
+                self.chain.block.number, timestamp, included, failures, self.chain.block.gas_used, len(pending),
+                self.call("getPrice"), self.call("tokensSold"), self.call("amountRaised"))
+
+            timestamp += self.block_time
+            self.chain.mine(timestamp=timestamp)
+
+
+def summarise(blocks: List[BlockStats], boundaries: List[int], block_gas_limit: int) -> dict:
+    """Totals over a run, for the report."""
+    purchases = sum(b.purchases for b in blocks)
+    failures = sum(b.failures for b in blocks)
+    tier_purchases = [0] * (len(boundaries) - 1)
+    for block in blocks:
+        for i, deadline in enumerate(boundaries[1:]):
+            if block.timestamp < deadline or i == len(tier_purchases) - 1:
+                tier_purchases[i] += block.purchases - block.failures
+                break
+
+    return {
+        "blocks": len(blocks),
+        "purchases": purchases,
+        "failures": failures,
+        "failure_rate": failures / purchases if purchases else 0.0,
+        "purchases_per_block": purchases / len(blocks) if blocks else 0.0,
+        "max_purchases_per_block": max((b.purchases for b in blocks), default=0),
+        "full_blocks": sum(1 for b in blocks if b.pending),
+        "max_pending": max((b.pending for b in blocks), default=0),
+        "gas_used": sum(b.gas_used for b in blocks),
+        "block_gas_limit": block_gas_limit,
+        "tier_purchases": tier_purchases,
+        "tokens_sold": blocks[-1].tokens_sold if blocks else 0,
+        "amount_raised": blocks[-1].amount_raised if blocks else 0,
+    }
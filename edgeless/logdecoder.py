@@ -0,0 +1,91 @@
+"""Fast decoders for the raw logs of our own events.
+
+web3's ``get_event_data`` works for any ABI: it normalises the types, runs
+every topic and data word through eth-abi stream decoders and builds the
+result with several layers of formatting decorators. For the handful of
+fixed layouts we export by the million, slicing the hex strings directly is
+an order of magnitude faster. The output is the same dict that
+``get_event_data`` gives.
+"""
+
+from typing import Callable, Dict, Iterable, List
+
+from eth_utils import encode_hex, keccak
+
+
+def event_topic(signature: str) -> str:
+    """Get the topic[0] hex for a canonical event signature."""
+    return encode_hex(keccak(signature.encode("ascii")))
+
+
+#: event FundTransfer(address backer, uint amount, bool isContribution, uint amountRaised) in Crowdsale
+FUND_TRANSFER_TOPIC = event_topic("FundTransfer(address,uint256,bool,uint256)")
+
+#: event Transfer(address indexed from, address indexed to, uint256 value) in EdgelessToken
+TRANSFER_TOPIC = event_topic("Transfer(address,address,uint256)")
+
+#: event Burned(uint amount) in EdgelessToken
+BURNED_TOPIC = event_topic("Burned(uint256)")
+
+
+def _envelope(log: dict, name: str, args: dict) -> dict:
+    return {
+        'args': args,
+        'event': name,
+        'logIndex': log['logIndex'],
+        'transactionIndex': log['transactionIndex'],
+        'transactionHash': log['transactionHash'],
+        'address': log['address'],
+        'blockHash': log['blockHash'],
+        'blockNumber': log['blockNumber'],
+    }
+
+
+def decode_fund_transfer(log: dict) -> dict:
+    """Decode FundTransfer, all arguments are in the data as four 32 byte words."""
+    data = log["data"]
+    # 0x + 4 * 64 hex characters, addresses are the last 40 characters of their word
+    return _envelope(log, "FundTransfer", {
+        "backer": "0x" + data[26:66].lower(),
+        "amount": int(data[66:130], 16),
+        "isContribution": int(data[130:194], 16) != 0,
+        "amountRaised": int(data[194:258], 16),
+    })
+
+
+def decode_transfer(log: dict) -> dict:
+    """Decode Transfer, addresses are indexed topics and the value is the data."""
+    topics = log["topics"]
+    return _envelope(log, "Transfer", {
+        "from": "0x" + topics[1][26:66].lower(),
+        "to": "0x" + topics[2][26:66].lower(),
+        "value": int(log["data"][2:66], 16),
+    })
+
+
+def decode_burned(log: dict) -> dict:
+    """Decode Burned, the amount is the only data word."""
+    return _envelope(log, "Burned", {
+        "amount": int(log["data"][2:66], 16),
+    })
+
+
+#: topic[0] -> decoder function
+DECODERS = {
+    FUND_TRANSFER_TOPIC: decode_fund_transfer,
+    TRANSFER_TOPIC: decode_transfer,
+    BURNED_TOPIC: decode_burned,
+}  # type: Dict[str, Callable[[dict], dict]]
+
+
+def decode_logs(logs: Iterable[dict], decoders: Dict[str, Callable[[dict], dict]] = DECODERS) -> List[dict]:
+    """Decode a batch of raw ``eth_getLogs`` entries.
+
+    Logs of events we do not know are skipped.
+    """
+    decoded = []
+    for log in logs:
+        decoder = decoders.get(log["topics"][0].lower()) if log["topics"] else None
+        if decoder:
+            decoded.append(decoder(log))
+    return decoded
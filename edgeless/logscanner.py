@@ -0,0 +1,147 @@
+"""Scan contract logs from the chain in adaptive block windows.
+
+A single ``eth_getLogs`` over the whole chain history either times out or hits
+the result cap of the node. Instead we walk from the contract deployment block
+to the chain head in windows. The window grows while the results are sparse
+and shrinks when the node chokes, so every request stays cheap.
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+from requests.exceptions import Timeout
+from web3 import Web3
+from web3.formatters import log_array_formatter
+
+
+#: How many blocks we ask for on the first request
+DEFAULT_INITIAL_WINDOW = 2000
+
+#: Never ask for fewer blocks than this
+DEFAULT_MIN_WINDOW = 1
+
+#: Never ask for more blocks than this
+DEFAULT_MAX_WINDOW = 200000
+
+#: Aim for this many log entries per request
+DEFAULT_TARGET_LOGS = 2000
+
+
+class LogScanError(Exception):
+    """The node cannot serve even the smallest allowed block window."""
+
+
+def get_logs(web3: Web3, address: str, topics: list, from_block: int, to_block: int) -> List[dict]:
+    """Do one raw ``eth_getLogs`` call.
+
+    web3 only exposes logs through installed filters, which some nodes expire
+    and which cannot be bounded by block range after creation.
+
+    :return: Log entries with block numbers and indexes converted to ints
+    """
+    params = {
+        "address": address,
+        "topics": topics,
+        "fromBlock": hex(from_block),
+        "toBlock": hex(to_block),
+    }
+    logs = web3._requestManager.request_blocking("eth_getLogs", [params])
+    return log_array_formatter(logs) or []
+
+
+def find_deployment_block(web3: Web3, address: str, high: Optional[int] = None) -> int:
+    """Binary search the block where the contract code appeared.
+
+    Needs a node that can answer ``eth_getCode`` for historical blocks.
+
+    :return: Block number of the contract creation
+    """
+    low = 0
+    if high is None:
+        high = web3.eth.blockNumber
+
+    if web3.eth.getCode(address, high) in ("0x", "0x0", ""):
+        raise LogScanError("No contract code at {} on block {}".format(address, high))
+
+    while low < high:
+        middle = (low + high) // 2
+        if web3.eth.getCode(address, middle) in ("0x", "0x0", ""):
+            low = middle + 1
+        else:
+            high = middle
+
+    return low
+
+
+class LogScanner:
+    """Walk the chain in adaptive block windows and yield logs of one contract.
+
+    Example:
+
+    .. code-block:: python
+
+        scanner = LogScanner(web3, crowdsale.address, [fund_transfer_topic])
+        for start, end, logs in scanner.scan_windows(deployment_block, web3.eth.blockNumber):
+            print("Blocks {}-{} gave {} events".format(start, end, len(logs)))
+    """
+
+    def __init__(self, web3: Web3, address: str, topics: list = None,
+                 initial_window=DEFAULT_INITIAL_WINDOW,
+                 min_window=DEFAULT_MIN_WINDOW,
+                 max_window=DEFAULT_MAX_WINDOW,
+                 target_logs=DEFAULT_TARGET_LOGS):
+        self.web3 = web3
+        self.address = address
+        self.topics = topics or []
+        self.window = initial_window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.target_logs = target_logs
+
+        # Book keeping for progress output
+        self.requests = 0
+        self.retries = 0
+
+    def fetch(self, from_block: int, to_block: int) -> List[dict]:
+        """Get logs for one block range, no retries."""
+        self.requests += 1
+        return get_logs(self.web3, self.address, self.topics, from_block, to_block)
+
+    def shrink(self):
+        """Node refused the last window."""
+        if self.window <= self.min_window:
+            raise LogScanError("Node cannot serve logs even for {} blocks".format(self.window))
+        self.window = max(self.min_window, self.window // 2)
+
+    def adjust(self, log_count: int):
+        """Pick the next window size based on how many logs the last one had."""
+        if log_count > self.target_logs:
+            self.window = max(self.min_window, self.window // 2)
+        elif log_count < self.target_logs // 2:
+            self.window = min(self.max_window, self.window * 2)
+
+    def scan_windows(self, start_block: int, end_block: int) -> Iterable[Tuple[int, int, List[dict]]]:
+        """Scan the inclusive block range.
+
+        Windows are yielded in chain order as soon as each one is fetched.
+
+        :return: Iterable of (first block, last block, log entries) tuples
+        """
+        current = start_block
+        while current <= end_block:
+            window_end = min(end_block, current + self.window - 1)
+            try:
+                logs = self.fetch(current, window_end)
+            except (Timeout, ValueError):
+                # Node timed out or said the result set is too large
+                self.retries += 1
+                self.shrink()
+                continue
+
+            yield current, window_end, logs
+            self.adjust(len(logs))
+            current = window_end + 1
+
+    def scan(self, start_block: int, end_block: int) -> Iterable[dict]:
+        """Scan the inclusive block range and yield individual log entries."""
+        for start, end, logs in self.scan_windows(start_block, end_block):
+            yield from logs
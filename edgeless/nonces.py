@@ -0,0 +1,55 @@
+"""Local nonce assignment for sending many transactions at once."""
+
+import heapq
+import threading
+
+from web3 import Web3
+
+
+class NonceManager:
+    """Hand out consecutive nonces for one sending account without asking the node each time.
+
+    The node assigns nonces only to transactions it has seen, so sending
+    several before any is mined is racy unless the nonces are explicit.
+    """
+
+    def __init__(self, web3: Web3, address: str):
+        self.web3 = web3
+        self.address = address
+        self.lock = threading.Lock()
+        self.nonce = None
+
+        # Handed out but never used, given out again before new ones
+        self.released = []
+
+    def next(self) -> int:
+        """Get the nonce for the next transaction."""
+        with self.lock:
+            if self.released:
+                return heapq.heappop(self.released)
+            if self.nonce is None:
+                # Counts transactions in the node's pool too
+                self.nonce = self.web3.eth.getTransactionCount(self.address, "pending")
+            nonce = self.nonce
+            self.nonce += 1
+            return nonce
+
+    def release(self, nonce: int):
+        """Take back a nonce whose transaction never reached the node.
+
+        Later nonces would wait for it forever, so the next transaction gets it.
+        """
+        with self.lock:
+            if self.nonce is not None and nonce < self.nonce:
+                heapq.heappush(self.released, nonce)
+
+    def reset(self):
+        """Ask the node again, after a transaction was dropped or sent by someone else."""
+        with self.lock:
+            self.nonce = None
+            self.released = []
+
+    def transaction(self, **kwargs) -> dict:
+        """Build transaction parameters from this account with the next nonce."""
+        kwargs.update({"from": self.address, "nonce": self.next()})
+        return kwargs
@@ -0,0 +1,48 @@
+"""Assemble the fetch stages of the crowdsale export.
+
+Shared by ``export-transactions.py`` and the benchmarks, so both run the
+same code against a real node or the replay server.
+"""
+
+from typing import Sequence, Tuple
+
+from web3 import Web3
+
+from .asyncexport import ConcurrentExporter
+from .batchrpc import BatchRPC
+from .export import Windows, add_timestamps, decode_events, sort_events
+from .logdecoder import FUND_TRANSFER_TOPIC, decode_fund_transfer
+from .logscanner import DEFAULT_INITIAL_WINDOW, LogScanner
+from .sharded import ShardedExporter
+from .timestamps import BlockTimestampCache
+
+
+def fund_transfer_windows(web3: Web3, batch: BatchRPC, timestamps: BlockTimestampCache, address: str,
+                          start_block: int, end_block: int, window=DEFAULT_INITIAL_WINDOW,
+                          concurrency=1, processes=1, endpoints: Sequence[str] = None) -> Tuple[object, Windows]:
+    """Stream decoded and timestamped FundTransfer events in chain order.
+
+    :param concurrency: More than 1 uses :py:class:`edgeless.asyncexport.ConcurrentExporter`
+    :param processes: More than 1 uses :py:class:`edgeless.sharded.ShardedExporter`
+    :param endpoints: Nodes to spread shards over, defaults to the one ``web3`` talks to
+    :return: Tuple (scanner with ``requests`` and ``retries`` statistics, windows)
+    """
+    topics = [FUND_TRANSFER_TOPIC]
+
+    if processes > 1:
+        provider = web3.currentProvider
+        scanner = ShardedExporter(endpoints or [provider.endpoint_uri], provider.get_request_kwargs(), address, topics,
+                                  processes=processes, window=window, batch_size=batch.batch_size)
+        windows = scanner.windows(start_block, end_block)
+    elif concurrency > 1:
+        scanner = ConcurrentExporter(web3, batch, timestamps, address, decode_fund_transfer, topics,
+                                     window=window, concurrency=concurrency)
+        windows = scanner.windows(start_block, end_block)
+    else:
+        scanner = LogScanner(web3, address, topics, initial_window=window)
+        windows = scanner.scan_windows(start_block, end_block)
+        windows = decode_events(windows, decode_fund_transfer)
+        windows = add_timestamps(windows, timestamps)
+
+    # Same event order for every fetch strategy, so outputs are byte-identical
+    return scanner, sort_events(windows)
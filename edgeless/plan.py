@@ -0,0 +1,356 @@
+"""Declarative deployment plans that can be resumed.
+
+A plan is a list of steps: deploy a contract, call a contract function or
+send ether. Steps name the steps they depend on, either explicitly or by
+referring to a deployed contract with :py:class:`Ref`. The executor sorts the
+steps to dependency groups with ``toposort``. All steps of a group are sent
+back-to-back and their receipts waited for together, so a group costs about
+one block time.
+
+Each step's transaction hash is written to a JSON state file as soon as it
+is sent, and its result once it is mined. Running the same plan again skips
+finished steps and waits for sent ones instead of sending them twice, so a
+crashed or timed out deployment continues where it stopped.
+
+With a :py:class:`edgeless.gasprice.GasPriceStrategy` every transaction is
+priced from recent blocks, and steps still pending after ``replace_after``
+seconds are sent again with the same nonce and a higher price. All hashes
+of a step are kept in the state file, as any of them may get mined.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from toposort import toposort
+from web3 import Web3
+from web3.contract import Contract
+
+from .gasprice import GasPriceStrategy, ReplacingSender
+from .nonces import NonceManager
+from .receipts import ReceiptTracker
+
+
+logger = logging.getLogger(__name__)
+
+
+class PlanError(Exception):
+    """The plan is malformed or does not match the state file."""
+
+
+class Ref:
+    """Address of a contract deployed by an earlier step."""
+
+    def __init__(self, step: str):
+        self.step = step
+
+    def __repr__(self):
+        return "Ref({!r})".format(self.step)
+
+
+def resolve(value, results: Dict[str, dict]):
+    """Replace references with deployed addresses, also inside lists."""
+    if isinstance(value, Ref):
+        return results[value.step]["address"]
+    if isinstance(value, (list, tuple)):
+        return [resolve(v, results) for v in value]
+    return value
+
+
+def find_refs(value) -> List[str]:
+    if isinstance(value, Ref):
+        return [value.step]
+    if isinstance(value, (list, tuple)):
+        return [step for v in value for step in find_refs(v)]
+    return []
+
+
+def describe(value):
+    """JSON friendly form of step arguments, for the plan fingerprint."""
+    if isinstance(value, Ref):
+        return "@" + value.step
+    if isinstance(value, (list, tuple)):
+        return [describe(v) for v in value]
+    return value
+
+
+class Step:
+    """One transaction of a plan."""
+
+    def __init__(self, name: str, depends: List[str] = None, sender: str = None, transaction: dict = None):
+        self.name = name
+        self.explicit_depends = list(depends or [])
+        self.sender = sender
+        self.transaction = dict(transaction or {})
+
+    @property
+    def depends(self) -> List[str]:
+        return self.explicit_depends + find_refs(self.references())
+
+    def references(self) -> list:
+        """Values that may hold :py:class:`Ref` objects."""
+        return []
+
+    def describe(self) -> list:
+        return [type(self).__name__, self.name, self.sender, self.transaction]
+
+    def send(self, executor: "PlanExecutor", transaction: dict) -> str:
+        """Send the transaction.
+
+        :return: Transaction hash
+        """
+        raise NotImplementedError()
+
+    def result(self, executor: "PlanExecutor", receipt: dict) -> dict:
+        """Pick what later steps and the caller need from the receipt."""
+        return {}
+
+
+class Deploy(Step):
+    """Deploy a contract from the project."""
+
+    def __init__(self, name: str, contract: str, args: list = None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.contract = contract
+        self.args = list(args or [])
+
+    def references(self):
+        return self.args
+
+    def describe(self):
+        return super().describe() + [self.contract, describe(self.args)]
+
+    def send(self, executor, transaction):
+        factory = executor.get_factory(self.contract)
+        return factory.deploy(transaction=transaction, args=resolve(self.args, executor.results))
+
+    def result(self, executor, receipt):
+        return {"address": receipt["contractAddress"]}
+
+
+class Transact(Step):
+    """Call a function of a contract deployed by another step."""
+
+    def __init__(self, name: str, target: Ref, function: str, args: list = None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.target = target
+        self.function = function
+        self.args = list(args or [])
+
+    def references(self):
+        return [self.target] + self.args
+
+    def describe(self):
+        return super().describe() + [describe(self.target), self.function, describe(self.args)]
+
+    def send(self, executor, transaction):
+        contract = executor.contract(self.target.step)
+        return getattr(contract.transact(transaction), self.function)(*resolve(self.args, executor.results))
+
+
+class Send(Step):
+    """Send ether, to an address or a contract deployed by another step."""
+
+    def __init__(self, name: str, to, value: int, **kwargs):
+        super().__init__(name, **kwargs)
+        self.to = to
+        self.value = value
+
+    def references(self):
+        return [self.to]
+
+    def describe(self):
+        return super().describe() + [describe(self.to), self.value]
+
+    def send(self, executor, transaction):
+        transaction.update({"to": resolve(self.to, executor.results), "value": self.value})
+        return executor.web3.eth.sendTransaction(transaction)
+
+
+class Plan:
+    """Named steps and their dependencies."""
+
+    def __init__(self, steps: List[Step]):
+        self.steps = OrderedDict()  # type: Dict[str, Step]
+        for step in steps:
+            if step.name in self.steps:
+                raise PlanError("Step {} is declared twice".format(step.name))
+            self.steps[step.name] = step
+
+        for step in self.steps.values():
+            for dependency in step.depends:
+                if dependency not in self.steps:
+                    raise PlanError("Step {} depends on unknown step {}".format(step.name, dependency))
+
+    def groups(self) -> List[List[str]]:
+        """Steps in dependency order, each group can be run at once."""
+        graph = {name: set(step.depends) for name, step in self.steps.items()}
+        order = list(self.steps.keys())
+        return [sorted(group, key=order.index) for group in toposort(graph)]
+
+    def fingerprint(self) -> str:
+        """Hash of the step definitions, so that a state file is not applied to a different plan."""
+        data = json.dumps([step.describe() for step in self.steps.values()], sort_keys=True)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class PlanExecutor:
+    """Run a plan, recording progress in a state file.
+
+    Example:
+
+    .. code-block:: python
+
+        plan = Plan([
+            Deploy("crowdsale", "Crowdsale", [beneficiary, multisig, 1]),
+            Deploy("token", "EdgelessToken", [beneficiary]),
+            Transact("set_token", Ref("crowdsale"), "setToken", [Ref("token")]),
+        ])
+        executor = PlanExecutor(web3, chain.get_contract_factory, beneficiary, "deploy-state.json")
+        results = executor.run(plan)
+        print("Token is at", results["token"]["address"])
+    """
+
+    def __init__(self, web3: Web3, get_factory: Callable[[str], type], default_sender: str,
+                 state_path: Optional[str] = None, timeout=180, assign_nonces=True,
+                 gas_price: GasPriceStrategy = None, replace_after=120):
+        self.web3 = web3
+        self.assign_nonces = assign_nonces
+        self.get_factory = get_factory
+        self.default_sender = default_sender
+        self.state_path = state_path
+        self.timeout = timeout
+        self.gas_price = gas_price
+        self.replace_after = replace_after
+        self.nonces = {}  # type: Dict[str, NonceManager]
+        self.plan = None
+        self.results = {}  # type: Dict[str, dict]
+        self.sent = {}  # type: Dict[str, List[str]]
+
+    def contract(self, step: str) -> Contract:
+        """Get a contract deployed by a step."""
+        factory = self.get_factory(self.plan.steps[step].contract)
+        return factory(address=self.results[step]["address"])
+
+    def load(self, plan: Plan):
+        """Read the progress of an earlier run of the same plan."""
+        self.plan = plan
+        self.results = {}
+        self.sent = {}
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+
+        with open(self.state_path, "rt") as inp:
+            state = json.load(inp)
+
+        if state["plan"] != plan.fingerprint():
+            raise PlanError("State file {} is for a different plan, remove it to start over".format(self.state_path))
+
+        for name, data in state["steps"].items():
+            if "result" in data:
+                self.results[name] = data["result"]
+            else:
+                # Files written before replacement support have a single hash
+                self.sent[name] = data.get("txids") or [data["txid"]]
+
+    def save(self):
+        """Write progress atomically, so a crash never leaves a half written file."""
+        if not self.state_path:
+            return
+
+        steps = OrderedDict()
+        for name in self.plan.steps:
+            if name in self.results:
+                steps[name] = {"txid": self.results[name]["txid"], "result": self.results[name]}
+            elif name in self.sent:
+                steps[name] = {"txids": self.sent[name]}
+
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "wt") as out:
+            json.dump({"plan": self.plan.fingerprint(), "steps": steps}, out, indent=2)
+        os.replace(temp_path, self.state_path)
+
+    def transaction(self, step: Step, new=True) -> dict:
+        """Transaction parameters for a step.
+
+        :param new: Assign a nonce, not done for steps sent by an earlier run
+        """
+        sender = step.sender or self.default_sender
+        if not self.assign_nonces or not new:
+            # The node picks nonces, fine when each transaction is mined on the spot.
+            # Resumed steps get theirs from the transaction sent earlier.
+            transaction = dict(step.transaction)
+            transaction["from"] = sender
+            return transaction
+
+        nonces = self.nonces.get(sender)
+        if nonces is None:
+            nonces = self.nonces[sender] = NonceManager(self.web3, sender)
+        return nonces.transaction(**step.transaction)
+
+    def release_nonce(self, step: Step, transaction: dict):
+        """Give back the nonce of a transaction that could not be sent, so the next one fills the gap."""
+        nonces = self.nonces.get(step.sender or self.default_sender)
+        if nonces and "nonce" in transaction:
+            nonces.release(transaction["nonce"])
+
+    def sent_callback(self, name: str, txids: List[str]):
+        logger.info("Step %s sent, tx hash is %s", name, txids[-1])
+        self.sent[name] = txids
+        self.save()
+
+    def run(self, plan: Plan) -> Dict[str, dict]:
+        """Run all steps that have not finished yet.
+
+        :return: Map of step name to result, deployed contracts have ``address``
+        :raise edgeless.receipts.TransactionFailed: If a step's transaction threw
+        """
+        self.load(plan)
+        tracker = ReceiptTracker(self.web3)
+        sender = ReplacingSender(self.web3, tracker, self.gas_price, deadline=self.replace_after, on_send=self.sent_callback)
+        try:
+            for group in plan.groups():
+                todo = [name for name in group if name not in self.results]
+                if not todo:
+                    continue
+
+                for name in todo:
+                    step = plan.steps[name]
+                    send_func = lambda transaction, step=step: step.send(self, dict(transaction))
+                    if name in self.sent:
+                        logger.info("Step %s was sent earlier as %s, waiting for it", name, ", ".join(self.sent[name]))
+                        sender.resume(name, send_func, self.transaction(step, new=False), self.sent[name])
+                    else:
+                        transaction = self.transaction(step)
+                        try:
+                            sender.send(name, send_func, transaction)
+                        except Exception:
+                            self.release_nonce(step, transaction)
+                            raise
+
+                outcomes = sender.wait(todo, timeout=self.timeout, poll_interval=tracker.poll_interval)
+
+                failure = None
+                for name in todo:
+                    future = outcomes[name]
+                    if future.exception():
+                        # Send it again on the next run
+                        del self.sent[name]
+                        failure = failure or future.exception()
+                        continue
+                    receipt = future.result()
+                    result = plan.steps[name].result(self, receipt)
+                    self.sent.pop(name)
+                    result.update({"txid": receipt["transactionHash"], "block_number": receipt["blockNumber"], "gas_used": receipt["gasUsed"]})
+                    self.results[name] = result
+                self.save()
+
+                if failure:
+                    raise failure
+        finally:
+            tracker.close()
+
+        return self.results
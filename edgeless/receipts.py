@@ -0,0 +1,238 @@
+"""Track many pending transactions with one poll per block.
+
+Waiting for each transaction in its own polling loop costs a receipt request
+per transaction per poll interval, and another request for the transaction
+gas once it is mined. The tracker instead watches a new block filter and,
+only when blocks arrive, checks every pending transaction in one pass,
+batched into a single round trip when a :py:class:`edgeless.batchrpc.BatchRPC`
+client is given.
+
+Each tracked transaction gets a :py:class:`concurrent.futures.Future` that
+resolves to the receipt, or fails with :py:class:`TransactionFailed`.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from populus.utils.compat import Timeout
+from web3 import Web3
+from web3.formatters import output_transaction_receipt_formatter
+
+from .batchrpc import BatchRPC
+
+
+#: Seconds between new block filter polls
+DEFAULT_POLL_INTERVAL = 1.0
+
+#: Background polls failing in a row before the pending transactions are failed with the error
+DEFAULT_MAX_ERRORS = 5
+
+
+class TransactionFailed(Exception):
+    """Transaction was mined, but the Solidity code threw."""
+
+    def __init__(self, txid: str, receipt: dict, gas: int):
+        super().__init__("Transaction {} failed, it used all of its {} gas".format(txid, gas))
+        self.txid = txid
+        self.receipt = receipt
+
+
+class ReceiptTracker:
+    """Resolve pending transactions as new blocks come in.
+
+    Example:
+
+    .. code-block:: python
+
+        tracker = ReceiptTracker(web3, batch=BatchRPC.from_web3(web3))
+        futures = [tracker.track(token.transact({"from": owner}).transfer(to, 1)) for to in receivers]
+        receipts = tracker.wait(futures, timeout=600)
+        tracker.close()
+    """
+
+    def __init__(self, web3: Web3, batch: BatchRPC = None, poll_interval=DEFAULT_POLL_INTERVAL, max_errors=DEFAULT_MAX_ERRORS):
+        self.web3 = web3
+        self.batch = batch
+        self.poll_interval = poll_interval
+        self.max_errors = max_errors
+        self.pending = OrderedDict()  # type: Dict[str, Future]
+
+        # Pending transactions left out of the checks on new blocks
+        self.paused = set()  # type: Set[str]
+
+        self.lock = threading.RLock()
+        self.block_filter = web3.eth.filter("latest")
+
+        # Transactions added since the last check may already be mined
+        self.dirty = False
+
+        # Statistics
+        self.checks = 0
+        self.errors = 0
+
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def track(self, txid: str) -> Future:
+        """Start following a sent transaction.
+
+        :return: Future that gets the receipt, call ``add_done_callback`` on it for a callback
+        """
+        with self.lock:
+            self.paused.discard(txid)
+            future = self.pending.get(txid)
+            if future is None:
+                future = self.pending[txid] = Future()
+                future.set_running_or_notify_cancel()
+                self.dirty = True
+            return future
+
+    def pause(self, txid: str):
+        """Leave a pending transaction out of the checks on new blocks, e.g. one that was replaced.
+
+        Its future stays and resolves once :py:meth:`check` is given the hash and finds it mined.
+        """
+        with self.lock:
+            if txid in self.pending:
+                self.paused.add(txid)
+
+    def fetch(self, txids: List[str]) -> List[Tuple[Optional[dict], Optional[int]]]:
+        """Get receipts and, for mined transactions, the gas they were given.
+
+        :return: (receipt or None, gas or None) for each transaction
+        """
+        if self.batch:
+            receipts = [
+                output_transaction_receipt_formatter(r) if r else None
+                for r in self.batch.call_many(("eth_getTransactionReceipt", [txid]) for txid in txids)
+            ]
+            mined = [txid for txid, r in zip(txids, receipts) if r and r["blockHash"]]
+            transactions = self.batch.call_many(("eth_getTransactionByHash", [txid]) for txid in mined)
+            gas = {txid: int(tx["gas"], 16) for txid, tx in zip(mined, transactions)}
+        else:
+            receipts = [self.web3.eth.getTransactionReceipt(txid) for txid in txids]
+            gas = {
+                txid: self.web3.eth.getTransaction(txid)["gas"]
+                for txid, r in zip(txids, receipts) if r and r["blockHash"]
+            }
+        return [(receipt, gas.get(txid)) for txid, receipt in zip(txids, receipts)]
+
+    def check(self, txids: Iterable[str] = None):
+        """Check pending transactions once and resolve the mined ones.
+
+        :param txids: Check these, paused or not, instead of all that are not paused
+        """
+        with self.lock:
+            if txids is None:
+                self.dirty = False
+                txids = [txid for txid in self.pending if txid not in self.paused]
+            else:
+                txids = [txid for txid in txids if txid in self.pending]
+        if not txids:
+            return
+
+        self.checks += 1
+        for txid, (receipt, gas) in zip(txids, self.fetch(txids)):
+            if gas is None:
+                continue
+
+            with self.lock:
+                future = self.pending.pop(txid, None)
+                self.paused.discard(txid)
+            if future is None:
+                # Resolved by a concurrent check
+                continue
+
+            # http://ethereum.stackexchange.com/q/6007/620
+            # EVM has only one error mode and it's consume all gas
+            if gas == receipt["gasUsed"]:
+                future.set_exception(TransactionFailed(txid, receipt, gas))
+            else:
+                future.set_result(receipt)
+
+    def poll(self) -> bool:
+        """Check pending transactions if there are new blocks or new transactions.
+
+        :return: True if anything is still pending
+        """
+        new_blocks = self.web3.eth.getFilterChanges(self.block_filter.filter_id)
+        if new_blocks or self.dirty:
+            self.check()
+        return bool(self.pending)
+
+    def wait(self, futures: Iterable[Future], timeout=180) -> List[dict]:
+        """Drive polling until the given transactions are mined.
+
+        :return: Receipts in the order of futures
+        :raise TransactionFailed: If any of the transactions threw
+        """
+        futures = list(futures)
+        if self.thread:
+            return [future.result(timeout=timeout) for future in futures]
+
+        with Timeout(timeout) as _timeout:
+            while not all(future.done() for future in futures):
+                self.poll()
+                if not all(future.done() for future in futures):
+                    _timeout.sleep(self.poll_interval)
+        return [future.result() for future in futures]
+
+    def start(self):
+        """Poll in a background thread, so futures resolve and callbacks fire without calling :py:meth:`wait`.
+
+        A failing poll is tried again on the next interval. After ``max_errors`` failures
+        in a row, the pending futures get the error.
+        """
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        failures = 0
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+                failures = 0
+            except Exception as e:
+                # A timed out request or a dropped connection, try again on the next interval
+                self.errors += 1
+                failures += 1
+                if failures >= self.max_errors:
+                    # The node is gone, do not leave callers waiting for their timeouts
+                    self.fail_pending(e)
+                    failures = 0
+            self.stopped.wait(self.poll_interval)
+
+    def fail_pending(self, error: Exception):
+        """Resolve all pending transactions with an error."""
+        with self.lock:
+            futures = list(self.pending.values())
+            self.pending.clear()
+            self.paused.clear()
+        for future in futures:
+            future.set_exception(error)
+
+    def close(self):
+        """Stop the background thread and remove the filter from the node."""
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        self.web3.eth.uninstallFilter(self.block_filter.filter_id)
+
+
+def wait_for_transactions(web3: Web3, txids: Iterable[str], timeout=180, batch: BatchRPC = None) -> Dict[str, dict]:
+    """Wait until all transactions are mined and check they went through.
+
+    :return: Map of transaction hash to receipt
+    :raise TransactionFailed: If any of the transactions threw
+    """
+    txids = list(txids)
+    tracker = ReceiptTracker(web3, batch=batch)
+    try:
+        receipts = tracker.wait([tracker.track(txid) for txid in txids], timeout=timeout)
+    finally:
+        tracker.close()
+    return dict(zip(txids, receipts))
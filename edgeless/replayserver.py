@@ -0,0 +1,384 @@
+"""Stand-in JSON-RPC node for benchmarks and offline runs.
+
+Serves just enough of the Ethereum JSON-RPC API for the crowdsale export:
+``eth_blockNumber``, ``eth_getLogs``, ``eth_getBlockByNumber``, ``eth_getCode``
+and ``eth_call``, single or batched. The chain is either synthetic, generated
+on the fly so that millions of events cost no memory, or recorded from a real
+node to a JSON file with :py:func:`record`.
+
+Latency is added to every HTTP round trip and ``eth_getLogs`` refuses result
+sets over a cap the way Infura and Parity do, so the adaptive window and
+batching code paths get exercised.
+
+.. code-block:: shell
+
+    python -m edgeless.replayserver --events 100000 --port 8545
+    python -m edgeless.replayserver --record crowdsale.json --node http://localhost:8545 --address 0x362bb67f7fdbdd0dbba4bce16da6a284cf484ed6
+    python -m edgeless.replayserver --recording crowdsale.json
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import List
+
+from web3 import HTTPProvider, Web3
+
+from .batchrpc import BatchRPC, get_block_timestamps
+from .logdecoder import FUND_TRANSFER_TOPIC
+from .logscanner import DEFAULT_INITIAL_WINDOW, LogScanner, find_deployment_block
+
+
+#: Where the synthetic crowdsale lives
+SYNTHETIC_ADDRESS = "0x362bb67f7fdbdd0dbba4bce16da6a284cf484ed6"
+
+#: First block of the synthetic crowdsale
+SYNTHETIC_START_BLOCK = 3000000
+
+#: UNIX time of block 0, blocks are 15 seconds apart
+SYNTHETIC_GENESIS_TIME = 1438269973
+
+#: Default eth_getLogs result cap
+DEFAULT_MAX_RESULTS = 10000
+
+
+def word(value: int) -> str:
+    """Encode an uint256 as 64 hex characters."""
+    return "{:064x}".format(value)
+
+
+def topics_match(log_topics: List[str], criteria: list) -> bool:
+    """Match log topics against ``eth_getLogs`` topic criteria.
+
+    Each position is ``None`` for any topic, a topic, or a list of topics any of which will do.
+    """
+    for position, wanted in enumerate(criteria):
+        if wanted is None:
+            continue
+        if position >= len(log_topics):
+            return False
+        if log_topics[position] not in (wanted if isinstance(wanted, list) else [wanted]):
+            return False
+    return True
+
+
+class SyntheticChain:
+    """Crowdsale chain with ``events`` FundTransfer events, built on demand.
+
+    Event ``i`` is in block ``start_block + i // events_per_block``. Backers
+    and amounts are derived from the event index, so every run, and every
+    process, sees the same chain.
+    """
+
+    def __init__(self, events: int, events_per_block=3, backers: int = None,
+                 address=SYNTHETIC_ADDRESS, start_block=SYNTHETIC_START_BLOCK):
+        self.events = events
+        self.events_per_block = events_per_block
+        self.backers = backers or max(1, events // 3)
+        self.address = address
+        self.start_block = start_block
+        self.head = start_block + (events - 1) // events_per_block + 100
+
+    def backer(self, i: int) -> str:
+        return hashlib.sha256(str(i % self.backers).encode("ascii")).hexdigest()[:40]
+
+    def amount(self, i: int) -> int:
+        return (i % 97 + 1) * 10 ** 17
+
+    def raised(self, i: int) -> int:
+        """Sum of amounts of events 0...i."""
+        cycles, rest = divmod(i + 1, 97)
+        return (cycles * 97 * 98 // 2 + rest * (rest + 1) // 2) * 10 ** 17
+
+    def block_number(self) -> int:
+        return self.head
+
+    def block_timestamp(self, block: int) -> int:
+        return SYNTHETIC_GENESIS_TIME + block * 15
+
+    def block_hash(self, block: int) -> str:
+        return "0x" + hashlib.sha256(b"block" + str(block).encode("ascii")).hexdigest()
+
+    def code(self, address: str, block: int) -> str:
+        if address.lower() == self.address and block >= self.start_block:
+            return "0x6060"
+        return "0x"
+
+    def call(self, transaction: dict, block: int) -> str:
+        # Every constant function reports zero, enough for sanity prints
+        return "0x" + word(0)
+
+    def logs(self, address: str, topics: list, from_block: int, to_block: int) -> List[dict]:
+        if address.lower() != self.address or not topics_match([FUND_TRANSFER_TOPIC], topics):
+            return []
+
+        first = max(0, (from_block - self.start_block) * self.events_per_block)
+        last = min(self.events, (to_block - self.start_block + 1) * self.events_per_block)
+        logs = []
+        raised = self.raised(first - 1)
+        for i in range(first, last):
+            block = self.start_block + i // self.events_per_block
+            amount = self.amount(i)
+            raised += amount
+            logs.append({
+                "address": self.address,
+                "blockHash": self.block_hash(block),
+                "blockNumber": hex(block),
+                "data": "0x" + word(int(self.backer(i), 16)) + word(amount) + word(1) + word(raised),
+                "logIndex": hex(i % self.events_per_block),
+                "topics": [FUND_TRANSFER_TOPIC],
+                "transactionHash": "0x" + hashlib.sha256(b"tx" + str(i).encode("ascii")).hexdigest(),
+                "transactionIndex": hex(i % self.events_per_block),
+            })
+        return logs
+
+
+class RecordedChain:
+    """Chain served from a JSON recording.
+
+    The recording has ``head``, ``logs`` as returned by ``eth_getLogs``,
+    ``timestamps`` by block number, ``code`` by address with the deployment
+    block, and ``calls`` by ``"<to> <data>"`` key.
+    """
+
+    def __init__(self, data: dict):
+        self.head = data["head"]
+        self.recorded_logs = data["logs"]
+        self.timestamps = {int(block): timestamp for block, timestamp in data["timestamps"].items()}
+        self.deployments = {address.lower(): block for address, block in data.get("code", {}).items()}
+        self.calls = data.get("calls", {})
+
+    @classmethod
+    def load(cls, path: str) -> "RecordedChain":
+        with open(path, "rt") as inp:
+            return cls(json.load(inp))
+
+    def block_number(self) -> int:
+        return self.head
+
+    def block_timestamp(self, block: int) -> int:
+        return self.timestamps[block]
+
+    def block_hash(self, block: int) -> str:
+        return "0x" + hashlib.sha256(b"block" + str(block).encode("ascii")).hexdigest()
+
+    def code(self, address: str, block: int) -> str:
+        deployment = self.deployments.get(address.lower())
+        return "0x6060" if deployment is not None and block >= deployment else "0x"
+
+    def call(self, transaction: dict, block: int) -> str:
+        return self.calls.get("{} {}".format(transaction["to"].lower(), transaction["data"]), "0x" + word(0))
+
+    def logs(self, address: str, topics: list, from_block: int, to_block: int) -> List[dict]:
+        return [
+            log for log in self.recorded_logs
+            if log["address"].lower() == address.lower()
+            and from_block <= int(log["blockNumber"], 16) <= to_block
+            and topics_match(log["topics"], topics)
+        ]
+
+
+class RPCError(Exception):
+    """Sent back as a JSON-RPC error object."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class ReplayServer(ThreadingMixIn, HTTPServer):
+    """Threaded HTTP JSON-RPC server over a synthetic or recorded chain.
+
+    Example:
+
+    .. code-block:: python
+
+        server = ReplayServer(("127.0.0.1", 0), SyntheticChain(100000), latency=0.02)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        web3 = Web3(HTTPProvider(server.endpoint_uri))
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, chain, latency=0.0, max_results=DEFAULT_MAX_RESULTS):
+        super().__init__(address, ReplayHandler)
+        self.chain = chain
+        self.latency = latency
+        self.max_results = max_results
+
+        # Statistics, replay_stats RPC call gives them out
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.round_trips = 0
+
+    @property
+    def endpoint_uri(self) -> str:
+        return "http://{}:{}".format(*self.server_address[:2])
+
+    def count(self, methods: List[str]):
+        with self.lock:
+            self.round_trips += 1
+            self.calls.update(methods)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"round_trips": self.round_trips, "calls": dict(self.calls)}
+
+    def reset(self):
+        with self.lock:
+            self.round_trips = 0
+            self.calls.clear()
+
+    def dispatch(self, method: str, params: list):
+        chain = self.chain
+
+        if method == "eth_blockNumber":
+            return hex(chain.block_number())
+
+        if method == "eth_getBlockByNumber":
+            block = parse_block(params[0], chain)
+            if block > chain.block_number():
+                return None
+            return {"number": hex(block), "hash": chain.block_hash(block), "timestamp": hex(chain.block_timestamp(block)), "transactions": []}
+
+        if method == "eth_getCode":
+            return chain.code(params[0], parse_block(params[1] if len(params) > 1 else "latest", chain))
+
+        if method == "eth_call":
+            return chain.call(params[0], parse_block(params[1] if len(params) > 1 else "latest", chain))
+
+        if method == "eth_getLogs":
+            criteria = params[0]
+            logs = chain.logs(
+                criteria["address"], criteria.get("topics") or [],
+                parse_block(criteria.get("fromBlock", "latest"), chain),
+                parse_block(criteria.get("toBlock", "latest"), chain))
+            if len(logs) > self.max_results:
+                raise RPCError(-32005, "query returned more than {} results".format(self.max_results))
+            return logs
+
+        if method == "replay_stats":
+            return self.stats()
+
+        if method == "replay_reset":
+            self.reset()
+            return True
+
+        raise RPCError(-32601, "Method {} not found".format(method))
+
+    def respond(self, request: dict) -> dict:
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            response["result"] = self.dispatch(request["method"], request.get("params", []))
+        except RPCError as e:
+            response["error"] = {"code": e.code, "message": e.message}
+        return response
+
+
+def parse_block(identifier, chain) -> int:
+    if identifier in ("latest", "pending"):
+        return chain.block_number()
+    if identifier == "earliest":
+        return 0
+    if isinstance(identifier, int):
+        return identifier
+    return int(identifier, 16)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+
+        if isinstance(payload, list):
+            server.count([request["method"] for request in payload])
+            result = [server.respond(request) for request in payload]
+        else:
+            server.count([payload["method"]])
+            result = server.respond(payload)
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Thousands of requests per second, keep the console quiet
+        pass
+
+
+def record(web3: Web3, batch: BatchRPC, address: str, start_block: int, end_block: int, path: str,
+           topics: list = None, window=DEFAULT_INITIAL_WINDOW):
+    """Save the logs of a contract and their block timestamps for :py:class:`RecordedChain`.
+
+    Logs are fetched with :py:class:`edgeless.logscanner.LogScanner`, so recording works on nodes that cap
+    ``eth_getLogs``. The recording itself is held in memory.
+
+    :return: Number of recorded logs
+    """
+    scanner = LogScanner(web3, address, topics, initial_window=window)
+    logs = []
+    for start, end, window_logs in scanner.scan_windows(start_block, end_block):
+        # Back to the hex quantities eth_getLogs gives, the scanner converts them to ints
+        for log in window_logs:
+            log.update({key: hex(log[key]) for key in ("blockNumber", "transactionIndex", "logIndex")})
+        logs.extend(window_logs)
+        print("Blocks {}-{}, got {} logs".format(start, end, len(window_logs)))
+
+    blocks = sorted(set(int(log["blockNumber"], 16) for log in logs))
+    data = {
+        "head": end_block,
+        "logs": logs,
+        "timestamps": get_block_timestamps(batch, blocks),
+        "code": {address: start_block},
+    }
+    with open(path, "wt") as out:
+        json.dump(data, out)
+    return len(logs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic or recorded chain over JSON-RPC, or record one from a node")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--events", type=int, default=100000, help="Synthetic chain: number of FundTransfer events")
+    parser.add_argument("--recording", default=None, help="Serve this JSON recording instead of a synthetic chain")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every HTTP round trip")
+    parser.add_argument("--max-results", type=int, default=DEFAULT_MAX_RESULTS, help="Refuse eth_getLogs with more results than this")
+    parser.add_argument("--record", default=None, help="Record the logs of --address from --node to this JSON file instead of serving")
+    parser.add_argument("--node", default="http://localhost:8545", help="Recording: JSON-RPC endpoint of the node")
+    parser.add_argument("--address", default=None, help="Recording: contract address")
+    parser.add_argument("--start-block", type=int, default=None, help="Recording: first block, defaults to the contract deployment block")
+    parser.add_argument("--end-block", type=int, default=None, help="Recording: last block, defaults to the chain head")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.address:
+            parser.error("--record needs --address")
+        web3 = Web3(HTTPProvider(args.node))
+        batch = BatchRPC.from_web3(web3)
+        end_block = web3.eth.blockNumber if args.end_block is None else args.end_block
+        start_block = find_deployment_block(web3, args.address, end_block) if args.start_block is None else args.start_block
+        count = record(web3, batch, args.address, start_block, end_block, args.record)
+        print("Recorded {} logs of blocks {}-{} to {}".format(count, start_block, end_block, args.record))
+        return
+
+    chain = RecordedChain.load(args.recording) if args.recording else SyntheticChain(args.events)
+    server = ReplayServer(("127.0.0.1", args.port), chain, latency=args.latency, max_results=args.max_results)
+    print("Serving on http://127.0.0.1:{}, head is at block {}".format(args.port, chain.block_number()))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
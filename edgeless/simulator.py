@@ -0,0 +1,283 @@
+"""Crowdsale and token state machines in plain Python.
+
+Follows ``TestableCrowdsale.sol`` and ``TestableToken.sol`` rule for rule,
+without an EVM: a transaction is a method call that returns ``False`` where
+the contract would throw, leaving the state untouched, like a failed
+transaction. State is a few integers per contract and one dictionary entry
+per holder, addresses can be anything hashable, small integers are fastest.
+
+Checks that cannot fail with real ether and token amounts, like the
+``safeAdd`` overflow checks, are left out. Both contracts read the time
+from their own ``current``, set with ``set_current`` like ``setCurrent()``,
+and there is no fallback to the block time.
+
+.. code-block:: python
+
+    sale = Simulation()
+    sale.set_current(START + 1)
+    assert sale.invest(2, 2, 10 ** 18)
+    assert sale.token.balance_of(2) == 1200
+
+Transactions can also be given as :py:class:`Operation` tuples to
+:py:func:`apply`, which is what :py:mod:`edgeless.crosscheck` uses to
+compare against the contracts.
+"""
+
+import random
+from bisect import bisect_right
+from collections import namedtuple
+from typing import Hashable, List
+
+#: Crowdsale start, deadlines and prices, match in TestableCrowdsale
+START = 1488294000
+DEADLINES = (1488297600, 1488902400, 1489507200, 1490112000)
+PRICES = (833333333333333, 909090909090909, 952380952380952, 1000000000000000)
+FUNDING_GOAL = 50000000
+MAX_GOAL = 440000000
+
+#: Token rules, match in TestableToken
+TOTAL_SUPPLY = 500000000
+TOKEN_START = 1490112000
+OWNER_LOCK_END = TOKEN_START + 365 * 24 * 3600
+OWNER_LOCKED = 50000000
+OWNER_KEPT = 60000000
+
+#: Addresses of the simulation
+OWNER = 0
+MULTISIG = 1
+CROWDSALE = -1
+
+#: What the owner lets the crowdsale sell
+CROWDSALE_ALLOWANCE = 440000000
+
+#: Owner, multisig and seven investors for random operations
+PARTICIPANTS = list(range(9))
+
+#: A transaction: function name, sender, arguments and ether value.
+#: ``setCurrent`` moves both contracts, ``send`` is plain ether to the crowdsale.
+Operation = namedtuple("Operation", ["function", "sender", "args", "value"])
+
+#: Moments the contracts behave differently at
+TIMES = [START - 1, START + 1] + [deadline - 1 for deadline in DEADLINES] + [TOKEN_START + 1, OWNER_LOCK_END + 1]
+
+#: From below the token price to a good part of the max goal
+INVESTMENTS = [10 ** 14, 10 ** 18, 100 * 10 ** 18, 20000 * 10 ** 18, 200000 * 10 ** 18]
+
+#: Token amounts
+AMOUNTS = [0, 1, 100, 10 ** 6, 10 ** 8]
+
+
+class Token:
+    """EdgelessToken."""
+
+    __slots__ = ("owner", "total_supply", "burned", "current", "balances", "allowances")
+
+    def __init__(self, owner: Hashable):
+        self.owner = owner
+        self.total_supply = TOTAL_SUPPLY
+        self.burned = False
+        self.current = 0
+        self.balances = {owner: TOTAL_SUPPLY}
+        self.allowances = {}  # (owner, spender) -> amount
+
+    def balance_of(self, holder: Hashable) -> int:
+        return self.balances.get(holder, 0)
+
+    def allowance(self, holder: Hashable, spender: Hashable) -> int:
+        return self.allowances.get((holder, spender), 0)
+
+    def owner_locked(self, holder: Hashable, left: int) -> bool:
+        """Would the owner go under the locked share during the lock year."""
+        return holder == self.owner and self.current < OWNER_LOCK_END and left < OWNER_LOCKED
+
+    def transfer(self, sender: Hashable, to: Hashable, value: int) -> bool:
+        balances = self.balances
+        left = balances.get(sender, 0) - value
+        if self.current < TOKEN_START or left < 0 or self.owner_locked(sender, left):
+            return False
+        balances[sender] = left
+        balances[to] = balances.get(to, 0) + value
+        return True
+
+    def batch_transfer(self, sender: Hashable, recipients: List[Hashable], values: List[int]) -> bool:
+        if len(recipients) != len(values) or self.current < TOKEN_START or sender in recipients:
+            return False
+        left = self.balances.get(sender, 0) - sum(values)
+        if left < 0 or min(values, default=0) < 0 or self.owner_locked(sender, left):
+            return False
+        balances = self.balances
+        for to, value in zip(recipients, values):
+            balances[to] = balances.get(to, 0) + value
+        balances[sender] = left
+        return True
+
+    def approve(self, sender: Hashable, spender: Hashable, value: int) -> bool:
+        self.allowances[sender, spender] = value
+        return True
+
+    def transfer_from(self, sender: Hashable, holder: Hashable, to: Hashable, value: int) -> bool:
+        balances = self.balances
+        left = balances.get(holder, 0) - value
+        allowance = self.allowances.get((holder, sender), 0)
+        if (self.current < TOKEN_START and holder != self.owner) or left < 0 or allowance < value or self.owner_locked(holder, left):
+            return False
+        balances[holder] = left
+        balances[to] = balances.get(to, 0) + value
+        self.allowances[holder, sender] = allowance - value
+        return True
+
+    def burn(self, sender: Hashable = None) -> bool:
+        """Does nothing when burned already or too early, throws if the owner has less than what is kept."""
+        if not self.burned and self.current > TOKEN_START:
+            difference = self.balances.get(self.owner, 0) - OWNER_KEPT
+            if difference < 0:
+                return False
+            self.balances[self.owner] = OWNER_KEPT
+            self.total_supply -= difference
+            self.burned = True
+        return True
+
+
+class Crowdsale:
+    """Crowdsale selling ``token`` on behalf of the beneficiary.
+
+    ``ether`` is what the contract holds, the multisig returns funds there for refunds.
+    """
+
+    __slots__ = ("token", "address", "beneficiary", "multisig", "start", "current", "amount_raised", "tokens_sold",
+                 "funding_goal_reached", "closed", "ether", "balances")
+
+    def __init__(self, token: Token, beneficiary: Hashable, multisig: Hashable, address: Hashable = CROWDSALE, start=START):
+        self.token = token
+        self.address = address
+        self.beneficiary = beneficiary
+        self.multisig = multisig
+        self.start = start
+        self.current = 0
+        self.amount_raised = 0
+        self.tokens_sold = 0
+        self.funding_goal_reached = False
+        self.closed = False
+        self.ether = 0
+        self.balances = {}
+
+    def price(self) -> int:
+        """Price of the first tier whose deadline is still ahead, the last price after all of them."""
+        return PRICES[min(bisect_right(DEADLINES, self.current), len(PRICES) - 1)]
+
+    def receive(self, sender: Hashable, value: int) -> bool:
+        """Plain ether sent to the crowdsale."""
+        if sender == self.multisig:
+            self.ether += value
+            return True
+        return self.invest(sender, sender, value)
+
+    def invest(self, sender: Hashable, receiver: Hashable, value: int) -> bool:
+        price = self.price()
+        if price > value:
+            return False
+        tokens = value // price
+        sold = self.tokens_sold + tokens
+        if self.closed or self.current < self.start or sold > MAX_GOAL:
+            return False
+        if not self.token.transfer_from(self.address, self.beneficiary, receiver, tokens):
+            return False
+        self.balances[receiver] = self.balances.get(receiver, 0) + value
+        self.amount_raised += value
+        self.tokens_sold = sold
+        return True
+
+    def check_goal_reached(self, sender: Hashable = None) -> bool:
+        """Does nothing before the last deadline, throws only if the burn does."""
+        if self.current >= DEADLINES[-1]:
+            if self.tokens_sold >= FUNDING_GOAL:
+                if not self.token.burn(self.address):
+                    return False
+                self.funding_goal_reached = True
+            self.closed = True
+        return True
+
+    def safe_withdrawal(self, sender: Hashable) -> bool:
+        """Never throws, refunds only what the contract holds."""
+        if self.current >= DEADLINES[-1]:
+            amount = self.balances.get(sender, 0)
+            if self.ether >= amount:
+                self.balances[sender] = 0
+                self.ether -= amount
+        return True
+
+
+class Simulation:
+    """Token and crowdsale wired up like :py:func:`edgeless.deploy.crowdsale_steps` does.
+
+    Methods take the sender first, like transactions, and return ``False`` where the contract throws.
+    """
+
+    __slots__ = ("token", "crowdsale")
+
+    def __init__(self, owner: Hashable = OWNER, multisig: Hashable = MULTISIG, start=START):
+        self.token = Token(owner)
+        self.crowdsale = Crowdsale(self.token, owner, multisig, start=start)
+        self.token.approve(owner, CROWDSALE, CROWDSALE_ALLOWANCE)
+
+    def set_current(self, current: int):
+        self.token.current = self.crowdsale.current = current
+
+    def invest(self, sender: Hashable, receiver: Hashable, value: int) -> bool:
+        return self.crowdsale.invest(sender, receiver, value)
+
+
+def apply(simulation: Simulation, operation: Operation) -> bool:
+    """Run an operation on the simulator.
+
+    :return: False if the transaction would throw
+    """
+    function, sender, args, value = operation
+    crowdsale, token = simulation.crowdsale, simulation.token
+    if function == "setCurrent":
+        simulation.set_current(args[0])
+        return True
+    elif function == "send":
+        return crowdsale.receive(sender, value)
+    elif function == "invest":
+        return crowdsale.invest(sender, args[0], value)
+    elif function == "checkGoalReached":
+        return crowdsale.check_goal_reached(sender)
+    elif function == "safeWithdrawal":
+        return crowdsale.safe_withdrawal(sender)
+    elif function == "transfer":
+        return token.transfer(sender, *args)
+    elif function == "batchTransfer":
+        return token.batch_transfer(sender, *args)
+    elif function == "approve":
+        return token.approve(sender, *args)
+    elif function == "transferFrom":
+        return token.transfer_from(sender, *args)
+    elif function == "burn":
+        return token.burn(sender)
+    raise ValueError("Unknown operation {}".format(function))
+
+
+def random_operations(rnd: random.Random, count: int, participants: List[int] = PARTICIPANTS) -> List[Operation]:
+    """Draw operations, starting with a time so that block timestamps play no part."""
+    investors = [p for p in participants if p not in (OWNER, MULTISIG)]
+    operations = [Operation("setCurrent", OWNER, (rnd.choice(TIMES),), 0)]
+    while len(operations) < count:
+        sender, other, third = rnd.choice(investors), rnd.choice(investors), rnd.choice(investors)
+        holder = rnd.choice([sender, OWNER])
+        amount = rnd.choice(AMOUNTS)
+        operations.append(rnd.choice([
+            Operation("setCurrent", OWNER, (rnd.choice(TIMES),), 0),
+            Operation("send", sender, (), rnd.choice(INVESTMENTS)),
+            Operation("invest", sender, (other,), rnd.choice(INVESTMENTS)),
+            Operation("send", MULTISIG, (), rnd.choice(INVESTMENTS[:3])),
+            Operation("checkGoalReached", sender, (), 0),
+            Operation("safeWithdrawal", sender, (), 0),
+            Operation("transfer", sender, (other, amount), 0),
+            Operation("transfer", OWNER, (other, rnd.choice([amount, 400000000])), 0),
+            Operation("batchTransfer", rnd.choice([sender, OWNER]), ([other, third], [amount, amount]), 0),
+            Operation("approve", rnd.choice([sender, OWNER]), (other, amount), 0),
+            Operation("transferFrom", other, (holder, third, amount), 0),
+            Operation("burn", sender, (), 0),
+        ]))
+    return operations
@@ -0,0 +1,178 @@
+"""EDG holder balances at any block height.
+
+Asking the node ``balanceOf`` for every holder at a historical block needs an
+archive node and one call per address. Instead we replay the ``Transfer``
+and ``Burned`` events of the token into an in-memory ledger.
+
+The token constructor gives the whole supply to the owner without a
+``Transfer`` event, so the ledger is seeded with that. ``burn()`` emits
+``Burned`` and takes the tokens from the owner.
+
+Every ``checkpoint_interval`` blocks a copy of the balance map is kept. The
+balances at block N are the nearest checkpoint at or below N plus a replay of
+the few events between them.
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from web3 import Web3
+
+from .export import Windows
+
+
+#: Keep a balance map copy every this many blocks
+DEFAULT_CHECKPOINT_INTERVAL = 10000
+
+#: EdgelessToken constructor mints this much to the owner
+INITIAL_SUPPLY = 500000000
+
+
+#: Balances and total supply after all events of a block
+BalanceSnapshot = namedtuple("BalanceSnapshot", ["block", "balances", "total_supply"])
+
+
+class SnapshotError(Exception):
+    """Replayed events do not add up, some are missing or out of order."""
+
+
+def get_total_supply(web3: Web3, token_address: str, block) -> int:
+    """Read ``totalSupply()`` at a block number or ``"latest"``, needs an archive node for old blocks."""
+    return_data = web3.eth.call({"to": token_address, "data": "0x18160ddd"}, block)
+    return int(return_data, 16)
+
+
+class BalanceSnapshots:
+    """Token ledger that can answer for any block it has seen.
+
+    Events must come in chain order, as they come from
+    :py:class:`edgeless.logscanner.LogScanner`.
+
+    Example:
+
+    .. code-block:: python
+
+        scanner = LogScanner(web3, token.address, [[TRANSFER_TOPIC, BURNED_TOPIC]])
+        snapshots = BalanceSnapshots(owner, deployment_block)
+        windows = scanner.scan_windows(deployment_block, end_block)
+        windows = ((start, end, decode_logs(logs)) for start, end, logs in windows)
+        for start, end, events in snapshots.replay(windows):
+            pass
+
+        snapshots.verify(end_block, get_total_supply(web3, token.address, end_block))
+        balances = snapshots.balances_at(4000000)
+    """
+
+    def __init__(self, owner: str, deployment_block: int, initial_supply=INITIAL_SUPPLY,
+                 checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.owner = owner.lower()
+        self.deployment_block = deployment_block
+        self.checkpoint_interval = checkpoint_interval
+
+        # Live ledger, covers events up to and including last_block
+        self.balances = {self.owner: initial_supply}  # type: Dict[str, int]
+        self.total_supply = initial_supply
+        self.last_block = deployment_block - 1
+
+        # (block, sender, receiver, value), receiver is None for burns
+        self.events = []  # type: List[Tuple[int, str, Optional[str], int]]
+        self.event_blocks = []  # type: List[int]
+
+        self.checkpoints = []  # type: List[BalanceSnapshot]
+        self.checkpoint_blocks = []  # type: List[int]
+        self.checkpoint(self.last_block)
+
+    def checkpoint(self, block: int):
+        """Keep a copy of the live ledger as the state after ``block``."""
+        self.checkpoints.append(BalanceSnapshot(block, dict(self.balances), self.total_supply))
+        self.checkpoint_blocks.append(block)
+
+    def maybe_checkpoint(self, block: int):
+        if block - self.checkpoint_blocks[-1] >= self.checkpoint_interval:
+            self.checkpoint(block)
+
+    def add(self, event: dict):
+        """Apply one decoded Transfer or Burned event."""
+        block = event["blockNumber"]
+        if block < self.last_block:
+            raise SnapshotError("Got event for block {} after block {}".format(block, self.last_block))
+
+        # The checkpoint must not include events of this block
+        if block > self.last_block:
+            self.maybe_checkpoint(block - 1)
+
+        args = event["args"]
+        if event["event"] == "Transfer":
+            entry = (block, args["from"], args["to"], args["value"])
+        elif event["event"] == "Burned":
+            entry = (block, self.owner, None, args["amount"])
+        else:
+            return
+
+        apply(self.balances, entry)
+        if entry[2] is None:
+            self.total_supply -= entry[3]
+
+        self.events.append(entry)
+        self.event_blocks.append(block)
+        self.last_block = block
+
+    def replay(self, windows: Windows) -> Windows:
+        """Pipeline stage that applies decoded events, passing windows through."""
+        for start, end, events in windows:
+            for e in events:
+                self.add(e)
+            self.last_block = end
+            self.maybe_checkpoint(end)
+            yield start, end, events
+
+    def snapshot_at(self, block: int) -> BalanceSnapshot:
+        """Get balances after all events of ``block``."""
+        if not self.deployment_block <= block <= self.last_block:
+            raise ValueError("Block {} is outside of the replayed range {}-{}".format(block, self.deployment_block, self.last_block))
+
+        base = self.checkpoints[bisect_right(self.checkpoint_blocks, block) - 1]
+        balances = dict(base.balances)
+        total_supply = base.total_supply
+
+        first = bisect_right(self.event_blocks, base.block)
+        last = bisect_right(self.event_blocks, block)
+        for entry in self.events[first:last]:
+            apply(balances, entry)
+            if entry[2] is None:
+                total_supply -= entry[3]
+
+        return BalanceSnapshot(block, balances, total_supply)
+
+    def balances_at(self, block: int) -> Dict[str, int]:
+        """Get non-zero balances after all events of ``block``."""
+        return self.snapshot_at(block).balances
+
+    def verify(self, block: int, total_supply: int):
+        """Check that balances add up to the total supply reported by the token.
+
+        :param total_supply: ``totalSupply()`` at ``block``, see :py:func:`get_total_supply`
+        :raise SnapshotError: If the ledger is off
+        """
+        snapshot = self.snapshot_at(block)
+        held = sum(snapshot.balances.values())
+        if held != snapshot.total_supply:
+            raise SnapshotError("Balances add up to {} at block {}, but the replayed supply is {}".format(held, block, snapshot.total_supply))
+        if snapshot.total_supply != total_supply:
+            raise SnapshotError("Replayed supply is {} at block {}, but the token says {}".format(snapshot.total_supply, block, total_supply))
+
+
+def apply(balances: Dict[str, int], entry: Tuple[int, str, Optional[str], int]):
+    """Move tokens in a balance map, zero balances are dropped to keep the map small."""
+    block, sender, receiver, value = entry
+    remaining = balances.get(sender, 0) - value
+    if remaining < 0:
+        raise SnapshotError("Balance of {} goes negative on block {}".format(sender, block))
+    if remaining:
+        balances[sender] = remaining
+    else:
+        balances.pop(sender, None)
+
+    if receiver is not None and value:
+        balances[receiver] = balances.get(receiver, 0) + value
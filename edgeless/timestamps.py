@@ -0,0 +1,127 @@
+"""Block timestamp lookups with an on-disk cache.
+
+Block timestamps never change once a block is buried deep enough, so we keep
+them in a local SQLite file. Re-running an export against the same node then
+needs header RPCs only for blocks it has never seen before.
+"""
+
+import sqlite3
+from typing import Dict, Iterable, List, Tuple
+
+from web3 import Web3
+
+from .batchrpc import BatchRPC, get_block_timestamps
+
+
+#: Blocks closer than this to the head may still be reorganised and are not persisted
+DEFAULT_CONFIRMATIONS = 12
+
+#: SQLite allows 999 host parameters per statement
+QUERY_CHUNK = 500
+
+#: Forget in-memory timestamps after this many, the disk copy stays
+MEMORY_LIMIT = 100000
+
+
+class BlockTimestampCache:
+    """Resolve block numbers to timestamps, de-duplicated and cached on disk.
+
+    Example:
+
+    .. code-block:: python
+
+        cache = BlockTimestampCache(web3, "block-timestamps.sqlite")
+        timestamps = cache.resolve(e["blockNumber"] for e in events)
+        cache.close()
+    """
+
+    def __init__(self, web3: Web3, path: str, confirmations=DEFAULT_CONFIRMATIONS, batch: BatchRPC = None):
+        self.web3 = web3
+        self.batch = batch
+        self.confirmations = confirmations
+        self.memory = {}
+        self.safe_block = None
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS block_timestamp ("
+            "block_number INTEGER PRIMARY KEY, "
+            "timestamp INTEGER NOT NULL)")
+        self.conn.commit()
+
+        # Cache statistics for the progress output
+        self.hits = 0
+        self.fetches = 0
+
+    def load(self, block_numbers: list) -> Dict[int, int]:
+        """Read stored timestamps for the given blocks."""
+        found = {}
+        for i in range(0, len(block_numbers), QUERY_CHUNK):
+            chunk = block_numbers[i:i + QUERY_CHUNK]
+            query = "SELECT block_number, timestamp FROM block_timestamp WHERE block_number IN ({})".format(
+                ",".join("?" * len(chunk)))
+            found.update(self.conn.execute(query, chunk).fetchall())
+        return found
+
+    def store(self, timestamps: Dict[int, int]):
+        """Persist timestamps of blocks that are safe from reorganisations."""
+        if self.safe_block is None:
+            self.safe_block = self.web3.eth.blockNumber - self.confirmations
+        rows = [(n, ts) for n, ts in timestamps.items() if n <= self.safe_block]
+        if rows:
+            self.conn.executemany("INSERT OR REPLACE INTO block_timestamp VALUES (?, ?)", rows)
+            self.conn.commit()
+
+    def fetch(self, block_numbers: list) -> Dict[int, int]:
+        """Ask the node for block headers, batched if we have a batch client."""
+        if self.batch:
+            return get_block_timestamps(self.batch, block_numbers)
+        return {n: self.web3.eth.getBlock(n)["timestamp"] for n in block_numbers}
+
+    def lookup(self, block_numbers: Iterable[int]) -> Tuple[Dict[int, int], List[int]]:
+        """Check memory and disk for timestamps.
+
+        :return: Tuple (known timestamps, block numbers that need to be fetched)
+        """
+        wanted = set(block_numbers)
+        found = {n: self.memory[n] for n in wanted if n in self.memory}
+
+        missing = sorted(wanted - found.keys())
+        if missing:
+            stored = self.load(missing)
+            found.update(stored)
+            self.remember(stored)
+            missing = [n for n in missing if n not in stored]
+
+        self.hits += len(wanted) - len(missing)
+        return found, missing
+
+    def remember(self, timestamps: Dict[int, int]):
+        """Keep timestamps in memory, bounded so that long exports run in flat memory."""
+        if len(self.memory) + len(timestamps) > MEMORY_LIMIT:
+            self.memory.clear()
+        self.memory.update(timestamps)
+
+    def add(self, fetched: Dict[int, int]):
+        """Remember timestamps fetched from the node."""
+        self.fetches += len(fetched)
+        self.store(fetched)
+        self.remember(fetched)
+
+    def resolve(self, block_numbers: Iterable[int]) -> Dict[int, int]:
+        """Get timestamps for many blocks, each distinct block looked up only once.
+
+        :return: Map of block number to UNIX timestamp
+        """
+        result, missing = self.lookup(block_numbers)
+        if missing:
+            fetched = self.fetch(missing)
+            self.add(fetched)
+            result.update(fetched)
+        return result
+
+    def get(self, block_number: int) -> int:
+        """Get the timestamp of a single block."""
+        return self.resolve([block_number])[block_number]
+
+    def close(self):
+        self.conn.close()
@@ -1,56 +1,129 @@
 """Export transactions from crowdsale."""
 
-import csv
-import datetime
-from collections import OrderedDict
+import argparse
+import time
 
-from eth_utils import from_wei
+from edgeless.batchrpc import BatchRPC
+from edgeless.columnar import EVENT_DTYPE, ColumnarWriter, write_backers, write_events
+from edgeless.compilecache import cached_project
+from edgeless.export import EventWriter, ExportState, aggregate, write_csv
+from edgeless.logscanner import find_deployment_block
+from edgeless.pipeline import fund_transfer_windows
+from edgeless.timestamps import BlockTimestampCache
 
-from populus import Project
 
+CROWDSALE_ADDRESS = "0x362bb67f7fdbdd0dbba4bce16da6a284cf484ed6"
+
+#: Write the checkpoint at most this often, seconds
+CHECKPOINT_INTERVAL = 30
 
-def main():
 
-    address_data = OrderedDict()
+def main():
 
-    project = Project()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--start-block", type=int, default=None, help="First block to scan, defaults to the crowdsale deployment block")
+    parser.add_argument("--window", type=int, default=2000, help="Initial block window for eth_getLogs")
+    parser.add_argument("--timestamp-cache", default="block-timestamps.sqlite", help="SQLite file where block timestamps are kept between runs")
+    parser.add_argument("--batch-size", type=int, default=100, help="How many block header requests to pack into one JSON-RPC batch")
+    parser.add_argument("--state", default=None, help="Incremental mode: checkpoint file to resume from and update")
+    parser.add_argument("--confirmations", type=int, default=12, help="Incremental mode: do not checkpoint blocks this close to the head")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of RPC requests in flight, more than 1 uses the asyncio exporter")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes, more than 1 shards the block range over a process pool, holding whole shards in memory and bypassing the timestamp cache")
+    parser.add_argument("--endpoint", action="append", default=None, help="Multi-process mode: JSON-RPC endpoint to spread shards over, can be given many times")
+    parser.add_argument("--mode", choices=["aggregate", "events"], default="aggregate", help="One row per backer, or one row per investment streamed as it is found")
+    parser.add_argument("--output", default="transactions.csv", help="CSV file to write")
+    parser.add_argument("--columnar", default=None, help="Also write a memory-mappable NumPy .npy file with binary addresses, wei and int64 timestamps")
+    args = parser.parse_args()
+
+    if args.state and args.mode != "aggregate":
+        parser.error("--state is supported only in aggregate mode")
+
+    if args.processes > 1 and args.concurrency > 1:
+        parser.error("Use either --processes or --concurrency")
+
+    project = cached_project()
     with project.get_chain("mainnet") as chain:
         Crowdsale = chain.get_contract_factory('OriginalCrowdsale')
-        crowdsale = Crowdsale(address="0x362bb67f7fdbdd0dbba4bce16da6a284cf484ed6")
+        crowdsale = Crowdsale(address=CROWDSALE_ADDRESS)
 
-        # We have configured non-default timeout as pastEvents() takes long
         web3 = chain.web3
 
         # Sanity check
-        print("Block number is", web3.eth.blockNumber)
+        end_block = web3.eth.blockNumber
+        print("Block number is", end_block)
         print("Amount raised is", crowdsale.call().amountRaised())
 
-        print("Getting events")
-        events = crowdsale.pastEvents("FundTransfer").get(only_changes=False)
-
-        # Merge several transactions from the same address to one
-        print("Analysing results")
-        for e in events:
-            address = e["args"]["backer"]
-            data = address_data.get(address, {})
-
-            # TODO: Not sure if we get events in block order
-            timestamp = web3.eth.getBlock(e["blockNumber"])["timestamp"]
-            current_first = data.get("first_payment", 99999999999999999)
-            if timestamp < current_first:
-                data["first_payment"] = timestamp
-
-            data["raised"] = data.get("raised", 0) + from_wei(e["args"]["amount"], "ether")
-            address_data[address] = data
-
-        print("Writing results")
-        with open('transactions.csv', 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-
-            for address, data in address_data.items():
-                timestamp = data["first_payment"]
-                dt = datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
-                writer.writerow([address, dt.isoformat(), str(data["raised"])])
+        if args.state:
+            # Blocks near the head may still be reorganised away
+            end_block -= args.confirmations
+            state = ExportState.load(args.state, crowdsale.address)
+        else:
+            state = ExportState(crowdsale.address)
+
+        if state.last_block is not None:
+            start_block = state.last_block + 1
+            print("Resuming from checkpoint, {} backers known".format(len(state.backers)))
+        elif args.start_block is not None:
+            start_block = args.start_block
+        else:
+            print("Looking up the crowdsale deployment block")
+            start_block = find_deployment_block(web3, crowdsale.address, end_block)
+
+        batch = BatchRPC.from_web3(web3, batch_size=args.batch_size)
+        timestamps = BlockTimestampCache(web3, args.timestamp_cache, batch=batch)
+
+        last_checkpoint = time.time()
+
+        def on_window(window_start, window_end, event_count):
+            nonlocal last_checkpoint
+            print("Blocks {}-{}, got {} events".format(window_start, window_end, event_count))
+            if args.state and time.time() - last_checkpoint > CHECKPOINT_INTERVAL:
+                state.save(args.state)
+                last_checkpoint = time.time()
+
+        # Fetch, decode and add timestamps
+        print("Scanning events from block", start_block)
+        scanner, windows = fund_transfer_windows(
+            web3, batch, timestamps, crowdsale.address, start_block, end_block, window=args.window,
+            concurrency=args.concurrency, processes=args.processes, endpoints=args.endpoint)
+
+        # Merge several transactions from the same address to one,
+        # or write each transaction out as it comes
+        writers = []
+        try:
+            if args.mode == "aggregate":
+                windows = aggregate(windows, state)
+            else:
+                event_writer = EventWriter(args.output)
+                writers.append(event_writer)
+                windows = event_writer.write(windows)
+                if args.columnar:
+                    columnar_writer = ColumnarWriter(args.columnar, EVENT_DTYPE)
+                    writers.append(columnar_writer)
+                    windows = write_events(windows, columnar_writer)
+
+            for window_start, window_end, events in windows:
+                on_window(window_start, window_end, len(events))
+        finally:
+            # Keep what was written so far, and do not leave the columnar spool file behind
+            for writer in writers:
+                writer.close()
+
+        if args.state and state.last_block is not None:
+            state.save(args.state)
+
+        print("Did {} eth_getLogs requests, {} retries".format(scanner.requests, scanner.retries))
+        if args.processes > 1:
+            print("Fetched {} block headers in {} batches".format(scanner.fetches, scanner.round_trips))
+        else:
+            print("Fetched {} block headers in {} batches, {} timestamps came from cache".format(timestamps.fetches, batch.round_trips, timestamps.hits))
+        timestamps.close()
+
+        if args.mode == "aggregate":
+            print("Writing results")
+            write_csv(state, args.output)
+            if args.columnar:
+                write_backers(state, args.columnar)
 
         print("OK")
 
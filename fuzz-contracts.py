@@ -0,0 +1,52 @@
+"""Fuzz the crowdsale and token with random transaction sequences.
+
+Runs random sequences of investments, transfers, approvals, burns, refunds
+and time jumps on an in-process EVM, many transactions per block, checking
+invariants after each block and comparing with the reference simulator.
+A failing sequence is shrunk and printed::
+
+    python fuzz-contracts.py --runs 1000
+
+The random mix closes the sale within a couple of hundred operations, after
+which investments only fail, so more runs find more than longer sequences.
+"""
+
+import argparse
+import sys
+
+from edgeless.compilecache import cached_project
+from edgeless.evmchain import CONTRACTS, OPTIMISED_CONTRACTS
+from edgeless.fuzz import DEFAULT_BLOCK_SIZE, Fuzzer
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100, help="Number of random sequences")
+    parser.add_argument("--length", type=int, default=200, help="Operations in a sequence, longer ones mostly run on a closed sale")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="Operations in a block, invariants are checked after each block")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first sequence, the others follow")
+    parser.add_argument("--optimised", action="store_true", help="Fuzz the gas optimised contracts")
+    parser.add_argument("--no-model", action="store_true", help="Do not compare with the reference simulator")
+    args = parser.parse_args()
+
+    project = cached_project()
+    fuzzer = Fuzzer(project.compiled_contracts, OPTIMISED_CONTRACTS if args.optimised else CONTRACTS,
+                    block_size=args.block_size, model=not args.no_model)
+    failure = fuzzer.fuzz(args.runs, args.length, seed=args.seed)
+
+    print("Ran {} operations in {} blocks, {:.0f} operations/s".format(
+        fuzzer.operations, fuzzer.blocks, fuzzer.operations / fuzzer.seconds if fuzzer.seconds else 0))
+
+    if failure:
+        print("Sequence with seed {} broke {}: {}".format(failure.seed, failure.violation.invariant, failure.violation.message))
+        print("Shrunk from {} to {} operations:".format(failure.violation.index + 1, len(failure.shrunk)))
+        for operation in failure.shrunk:
+            print("   ", operation)
+        sys.exit(1)
+
+    print("All invariants held")
+
+
+if __name__ == "__main__":
+    main()
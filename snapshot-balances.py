@@ -0,0 +1,62 @@
+"""Export EDG holder balances at given block heights."""
+
+import argparse
+import csv
+
+from edgeless.compilecache import cached_project
+from edgeless.logdecoder import BURNED_TOPIC, TRANSFER_TOPIC, decode_logs
+from edgeless.logscanner import LogScanner, find_deployment_block
+from edgeless.snapshot import BalanceSnapshots, get_total_supply
+
+
+TOKEN_ADDRESS = "0x08711d3b02c8758f2fb3ab4e80228418a7f8e39c"
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("blocks", type=int, nargs="+", help="Block heights to export balances for")
+    parser.add_argument("--window", type=int, default=2000, help="Initial block window for eth_getLogs")
+    parser.add_argument("--checkpoint-interval", type=int, default=10000, help="Keep a copy of all balances every this many blocks")
+    parser.add_argument("--output", default="balances-{block}.csv", help="CSV file to write per block")
+    args = parser.parse_args()
+
+    project = cached_project()
+    with project.get_chain("mainnet") as chain:
+        Token = chain.get_contract_factory('EdgelessToken')
+        token = Token(address=TOKEN_ADDRESS)
+
+        web3 = chain.web3
+        end_block = max(args.blocks)
+        if end_block > web3.eth.blockNumber:
+            parser.error("Chain head is only at {}".format(web3.eth.blockNumber))
+
+        print("Looking up the token deployment block")
+        deployment_block = find_deployment_block(web3, token.address, end_block)
+        snapshots = BalanceSnapshots(token.call().owner(), deployment_block, checkpoint_interval=args.checkpoint_interval)
+
+        print("Replaying token events from block", deployment_block)
+        scanner = LogScanner(web3, token.address, [[TRANSFER_TOPIC, BURNED_TOPIC]], initial_window=args.window)
+        windows = scanner.scan_windows(deployment_block, end_block)
+        windows = ((start, end, decode_logs(logs)) for start, end, logs in windows)
+        for window_start, window_end, events in snapshots.replay(windows):
+            print("Blocks {}-{}, got {} events".format(window_start, window_end, len(events)))
+
+        print("Did {} eth_getLogs requests, {} retries".format(scanner.requests, scanner.retries))
+
+        for block in args.blocks:
+            snapshot = snapshots.snapshot_at(block)
+            snapshots.verify(block, get_total_supply(web3, token.address, block))
+
+            path = args.output.format(block=block)
+            print("Writing {} holders at block {} to {}".format(len(snapshot.balances), block, path))
+            with open(path, 'w', newline='') as csvfile:
+                writer = csv.writer(csvfile)
+                for address, balance in sorted(snapshot.balances.items(), key=lambda item: item[1], reverse=True):
+                    writer.writerow([address, balance])
+
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,30 +2,28 @@
 
 A simple Python script to deploy contracts and then do a smoke test for them.
 """
-from populus import Project
+import logging
+
 from populus.utils.cli import get_unlocked_default_account_address
-from populus.utils.wait import wait_for_transaction_receipt
 from web3 import Web3
 
+from edgeless.compilecache import cached_project
+from edgeless.deploy import deploy_crowdsale
+from edgeless.gasprice import GasPriceStrategy
 
-def check_succesful_tx(web3: Web3, txid: str, timeout=180) -> dict:
-    """See if transaction went through (Solidity code did not throw).
-
-    :return: Transaction receipt
-    """
-
-    # http://ethereum.stackexchange.com/q/6007/620
-    receipt = wait_for_transaction_receipt(web3, txid, timeout=timeout)
-    txinfo = web3.eth.getTransaction(txid)
 
-    # EVM has only one error mode and it's consume all gas
-    assert txinfo["gas"] != receipt["gasUsed"]
-    return receipt
+#: Deployment progress, remove to deploy a fresh set of contracts
+STATE_FILE = "deploy-state-ropsten.json"
 
+#: Resend with a higher gas price if not mined in this many seconds
+REPLACE_AFTER = 120
 
 def main():
 
-    project = Project()
+    # Progress is logged by edgeless.plan and edgeless.gasprice
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    project = cached_project()
 
     # This is configured in populus.json
     # We are working on a testnet
@@ -34,10 +32,6 @@ def main():
 
     with project.get_chain(chain_name) as chain:
 
-        # Load Populus contract proxy classes
-        Crowdsale = chain.get_contract_factory('Crowdsale')
-        Token = chain.get_contract_factory('EdgelessToken')
-
         web3 = chain.web3
         print("Web3 provider is", web3.currentProvider)
 
@@ -51,26 +45,16 @@ def main():
         # Goes through coinbase account unlock process if needed
         get_unlocked_default_account_address(chain)
 
-        # Deploy crowdsale, open since 1970
-        txhash = Crowdsale.deploy(transaction={"from": beneficiary}, args=[beneficiary, multisig_address, 1])
-        print("Deploying crowdsale, tx hash is", txhash)
-        receipt = check_succesful_tx(web3, txhash)
-        crowdsale_address = receipt["contractAddress"]
-        print("Crowdsale contract address is", crowdsale_address)
-
-        # Deploy token
-        txhash = Token.deploy(transaction={"from": beneficiary}, args=[beneficiary])
-        print("Deploying token, tx hash is", txhash)
-        receipt = check_succesful_tx(web3, txhash)
-        token_address = receipt["contractAddress"]
-        print("Token contract address is", token_address)
-
-        # Make contracts aware of each other
-        print("Initializing contracts")
-        crowdsale = Crowdsale(address=crowdsale_address)
-        token = Token(address=token_address)
-        txhash = crowdsale.transact({"from": beneficiary}).setToken(token_address)
-        check_succesful_tx(web3, txhash)
+        # Pay what got in within 3 blocks 90% of the time lately
+        gas_price = GasPriceStrategy(web3, probability=0.9, target_blocks=3)
+        print("Gas price is", gas_price.suggest())
+
+        # Deploy crowdsale, open since 1970, and token in the same block,
+        # then make contracts aware of each other in the next one.
+        # Rerun to continue if the deployment is interrupted.
+        crowdsale, token = deploy_crowdsale(web3, chain.get_contract_factory, beneficiary, multisig_address, 1,
+                                            allowance=None, state_path=STATE_FILE, timeout=900,
+                                            gas_price=gas_price, replace_after=REPLACE_AFTER)
 
         # Do some contract reads to see everything looks ok
         print("Token total supply is", token.call().totalSupply())
@@ -1,9 +1,69 @@
-"""Test fixtures."""
+"""Test fixtures.
 
+Crowdsale and token are deployed once per session. Tests revert the tester
+chain to an EVM snapshot instead of deploying again.
+
+The suite runs in parallel with pytest-xdist, ``py.test -n auto tests``.
+Every worker is its own process with its own tester chain, and contracts are
+compiled once by the master process and read by workers from the compile
+cache, see :py:mod:`edgeless.compilecache`.
+"""
+import threading
+from typing import Callable, Dict, List
 
 import pytest
+from populus.project import Project
+from web3 import Web3
 from web3.contract import Contract
 
+from edgeless.compilecache import cached_project
+from edgeless.replayserver import ReplayServer
+
+
+def is_worker(config) -> bool:
+    """Are we an xdist worker process. Older xdist calls them slaves."""
+    return hasattr(config, "workerinput") or hasattr(config, "slaveinput")
+
+
+def pytest_addoption(parser):
+    parser.addoption("--update-gas-baseline", action="store_true", default=False,
+                     help="Record gas used by contract functions as the new budgets, see test_gas.py")
+
+
+def pytest_configure(config):
+    config.seen_nodeids = set()
+
+
+def pytest_sessionstart(session):
+    """Compile contracts before workers start, so that they do not all compile at once."""
+    config = session.config
+    if is_worker(config) or not getattr(config.option, "numprocesses", None):
+        return
+    cached_project()
+
+
+@pytest.fixture
+def replay_server() -> Callable[..., ReplayServer]:
+    """Start replay JSON-RPC servers, ``replay_server(chain, **kwargs)``, they are shut down after the test."""
+    servers = []
+
+    def start(chain, **kwargs) -> ReplayServer:
+        server = ReplayServer(("127.0.0.1", 0), chain, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(scope="session")
+def project() -> Project:
+    """Populus project with contracts from the compile cache."""
+    return cached_project()
 
 
 # http://stackoverflow.com/q/28898919/315168
@@ -13,91 +73,189 @@ def pytest_itemcollected(item):
     pref = par.__doc__.strip() if par.__doc__ else par.__class__.__name__
     suf = node.__doc__.strip() if node.__doc__ else node.__name__
     if pref or suf:
-        item._nodeid = ' '.join((pref, suf))
+        nodeid = ' '.join((pref, suf))
+        if hasattr(item, "callspec"):
+            nodeid += "[{}]".format(item.callspec.id)
+
+        # xdist tells tests apart by node id, and every worker must come up with the same ones
+        if nodeid in item.config.seen_nodeids:
+            nodeid += " ({})".format(item.name)
+        item.config.seen_nodeids.add(nodeid)
+
+        item._nodeid = nodeid
         item._nodeid.rstrip(".")
 
 
+class ChainSnapshots:
+    """Named EVM snapshots that can be reverted to any number of times.
+
+    testrpc forgets a snapshot once it is reverted to and shifts the later
+    ones down, so we take it again right after each revert and keep track of
+    the indexes. It also only cuts the block list at the snapshot height,
+    which is wrong when jumping between branches, so we keep our own copy of
+    the mined blocks for logs and historical state.
+    """
+
+    def __init__(self, chain):
+        self.chain = chain
+        self.indexes = {}
+        self.blocks = {}
+
+    @property
+    def evm(self):
+        return self.chain.rpc_methods.client.evm
+
+    def take(self, name: str):
+        self.indexes[name] = self.chain.snapshot()
+        self.blocks[name] = self.evm.blocks[:-1]
+
+    def revert(self, name: str):
+        index = self.indexes.pop(name)
+        self.chain.revert(index)
+        for other, other_index in self.indexes.items():
+            if other_index > index:
+                self.indexes[other] = other_index - 1
+
+        # The last block is the pending one from the snapshot
+        self.evm.blocks[:-1] = self.blocks[name]
+        self.take(name)
+
+
+@pytest.fixture(scope="session")
+def session_chain(project):
+    """One tester chain for the whole test session, tests revert it to snapshots."""
+    with project.get_chain("tester") as chain:
+        # Deploy the registrar now, so that chain.get_contract() works in every snapshot
+        chain.registrar
+        yield chain
+
+
+@pytest.fixture(scope="session")
+def snapshots(session_chain) -> ChainSnapshots:
+    snapshots = ChainSnapshots(session_chain)
+    snapshots.take("clean")
+    return snapshots
+
+
 @pytest.fixture
-def crowdsale(chain, beneficiary, multisig) -> Contract:
-    """Create crowdsale contract."""
-    args = [beneficiary, multisig, 0]
-    contract = chain.get_contract('Crowdsale', deploy_args=args)
-    return contract
+def chain(session_chain, snapshots):
+    """Tester chain as it was before any test ran."""
+    snapshots.revert("clean")
+    return session_chain
 
 
 @pytest.fixture
-def token(chain, crowdsale, beneficiary) -> Contract:
-    """Create ICO contract."""
-    #owner = crowdsale.address
-    args = [beneficiary]  # Owner set
-    contract = chain.get_contract('EdgelessToken', deploy_args=args)
+def web3(chain) -> Web3:
+    return chain.web3
+
+
+@pytest.fixture(scope="session")
+def accounts(session_chain) -> List[str]:
+    return session_chain.web3.eth.accounts
+
+
+@pytest.fixture(scope="session")
+def deployment(session_chain, snapshots, beneficiary, multisig, start, end) -> Dict[str, Contract]:
+    """Deploy crowdsale and token once and snapshot them at different points of time."""
+
+    chain = session_chain
+    snapshots.revert("clean")
+
+    def deploy(name, args):
+        txid = chain.get_contract_factory(name).deploy(args=args)
+        return chain.get_contract_factory(name)(address=chain.wait.for_contract_address(txid))
+
+    crowdsale = deploy("Crowdsale", [beneficiary, multisig, 0])
+    token = deploy("EdgelessToken", [beneficiary])  # Owner set
     assert crowdsale.call().tokenReward() == '0x0000000000000000000000000000000000000000'
-    crowdsale.transact({"from": beneficiary}).setToken(contract.address)
+    chain.wait.for_receipt(crowdsale.transact({"from": beneficiary}).setToken(token.address))
     assert crowdsale.call().tokenReward() != '0x0000000000000000000000000000000000000000'
 
     # Allow crowdsale contract to issue out tokens
     # All (500.000.000) tokens initially belong to the edgeless team. Before ICO starts, the Edgeless Team approves the ICO contract to spend up to 440.000.000 tokens. Remaining tokens get burned as soon as the ICO is closed. There will be 60.000.000 tokens left for the edgeless team to hold and for the bounty program to be paid (10.000.000).
-    contract.transact({"from": beneficiary}).approve(crowdsale.address, 440000000)
+    chain.wait.for_receipt(token.transact({"from": beneficiary}).approve(crowdsale.address, 440000000))
+    snapshots.take("deployed")
+
+    def set_current(name, timestamp, contracts):
+        snapshots.revert("deployed")
+        for contract in contracts:
+            contract.transact().setCurrent(timestamp)
+        snapshots.take(name)
 
-    return contract
+    set_current("open", start + 1, [crowdsale, token])
+    set_current("early", start - 1, [crowdsale, token])
+    set_current("finished", end + 1, [crowdsale, token])
+    set_current("erc20", end + 1, [token])
+
+    return {"crowdsale": crowdsale, "token": token}
 
 
 @pytest.fixture
+def crowdsale(chain, snapshots, deployment) -> Contract:
+    """Create crowdsale contract."""
+    snapshots.revert("deployed")
+    return deployment["crowdsale"]
+
+
+@pytest.fixture
+def token(crowdsale, deployment) -> Contract:
+    """Create ICO contract."""
+    return deployment["token"]
+
+
+@pytest.fixture(scope="session")
 def customer(accounts) -> str:
     """Get a customer address."""
     return accounts[1]
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def customer_2(accounts) -> str:
     """Get another customer address."""
     return accounts[2]
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def beneficiary(accounts) -> str:
     """The team control address."""
     return accounts[3]
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def multisig(accounts) -> str:
     """The team multisig address."""
     return accounts[4]
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def start():
     """Match in TestableCrowdsale."""
     return 1488294000
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def end():
     """Match in TestableCrowdsale."""
     return 1490112000
 
 
 @pytest.fixture
-def open_crowdsale(crowdsale, token, start):
+def open_crowdsale(crowdsale, token, snapshots):
     """We live in time when crowdsale is open"""
-    crowdsale.transact().setCurrent(start + 1)
-    token.transact().setCurrent(start + 1)
+    snapshots.revert("open")
     return crowdsale
 
 
 @pytest.fixture
-def early_crowdsale(crowdsale, token, start):
+def early_crowdsale(crowdsale, token, snapshots):
     """We live in time when crowdsale is not yet open"""
-    crowdsale.transact().setCurrent(start-1)
-    token.transact().setCurrent(start-1)
+    snapshots.revert("early")
     return crowdsale
 
 
 @pytest.fixture
-def finished_crowdsale(crowdsale, token, end):
+def finished_crowdsale(crowdsale, token, snapshots):
     """We live in time when crowdsale is done."""
-    crowdsale.transact().setCurrent(end+1)
-    token.transact().setCurrent(end+1)
+    snapshots.revert("finished")
     return crowdsale
 
 #
@@ -110,9 +268,9 @@ def token_owner(beneficiary):
 
 
 @pytest.fixture
-def erc20_token(token, end):
+def erc20_token(token, snapshots):
     """Token behaves like ERC-20 after the crowdsale is over and liquidation limitation is lifted."""
-    token.transact().setCurrent(end+1)
+    snapshots.revert("erc20")
     return token
 
 
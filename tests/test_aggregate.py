@@ -0,0 +1,64 @@
+"""Array backed per-backer aggregation."""
+import pytest
+
+from edgeless.aggregate import BackerTable
+
+
+def test_merge_batches():
+    """Totals and first payments match plain Python arithmetic, also past 64 bits."""
+
+    alice = "0x00000000000000000000000000000000000000ff"
+    bob = "0xff00000000000000000000000000000000000000"
+
+    table = BackerTable(capacity=1)
+    table.add([alice, bob, alice], [2 ** 64 - 1, 5, 1], [300, 200, 100])
+    table.add([bob, bob], [2 ** 100, 2 ** 32], [400, 150])
+
+    assert list(table.items()) == [
+        (alice, 2 ** 64, 100),
+        (bob, 5 + 2 ** 100 + 2 ** 32, 150),
+    ]
+
+    high, low = table.words()
+    assert [int(h) * 2 ** 64 + int(l) for h, l in zip(high, low)] == table.raised()
+
+
+def test_amount_out_of_range():
+    """Amounts over 128 bits are refused without adding a row for the backer."""
+    table = BackerTable()
+    with pytest.raises(ValueError):
+        table.add(["0x" + "11" * 20], [2 ** 128], [1])
+    assert len(table) == 0
+    assert list(table.items()) == []
+
+
+def test_bad_batch_leaves_table_unchanged():
+    """A batch with a bad address or mismatched columns changes nothing."""
+    alice = "0x" + "11" * 20
+    table = BackerTable(capacity=1)
+    table.add([alice], [5], [100])
+
+    with pytest.raises(ValueError):
+        table.add(["0x" + "22" * 20, alice, "0xnothex"], [1, 1, 1], [1, 1, 1])
+    with pytest.raises(ValueError):
+        table.add(["0x" + "22" * 20, alice], [1, 1], [1])
+
+    assert list(table.items()) == [(alice, 5, 100)]
+    assert len(table.index) == 1
+
+
+def test_overflow_leaves_table_unchanged():
+    """A total that no longer fits raises before any row is updated."""
+    alice = "0x" + "11" * 20
+    bob = "0x" + "22" * 20
+    table = BackerTable(capacity=1)
+    table.add([alice], [2 ** 128 - 1], [100])
+
+    with pytest.raises(OverflowError):
+        table.add([bob, alice, "0x" + "33" * 20], [7, 1, 1], [50, 50, 50])
+
+    assert list(table.items()) == [(alice, 2 ** 128 - 1, 100)]
+    assert table.row_decimals() == [18]
+
+    table.add([bob], [7], [50])
+    assert list(table.items()) == [(alice, 2 ** 128 - 1, 100), (bob, 7, 50)]
@@ -0,0 +1,66 @@
+"""Concurrent asyncio export against the replay server."""
+import pytest
+from web3 import HTTPProvider, Web3
+
+from edgeless.asyncexport import ConcurrentExporter
+from edgeless.batchrpc import BatchRPC
+from edgeless.export import ExportState, aggregate, write_csv
+from edgeless.logdecoder import FUND_TRANSFER_TOPIC, decode_fund_transfer
+from edgeless.logscanner import LogScanError
+from edgeless.pipeline import fund_transfer_windows
+from edgeless.replayserver import SYNTHETIC_ADDRESS, SYNTHETIC_START_BLOCK, SyntheticChain
+from edgeless.timestamps import BlockTimestampCache
+
+
+def export_csv(web3: Web3, tmpdir, name: str, concurrency: int) -> bytes:
+    """Run the aggregate export and give the CSV it wrote."""
+    batch = BatchRPC.from_web3(web3)
+    timestamps = BlockTimestampCache(web3, str(tmpdir.join(name + ".sqlite")), batch=batch)
+    state = ExportState(SYNTHETIC_ADDRESS)
+    scanner, windows = fund_transfer_windows(web3, batch, timestamps, SYNTHETIC_ADDRESS,
+                                             SYNTHETIC_START_BLOCK, web3.eth.blockNumber, window=40, concurrency=concurrency)
+    for window in aggregate(windows, state):
+        pass
+    timestamps.close()
+    write_csv(state, str(tmpdir.join(name + ".csv")))
+    return tmpdir.join(name + ".csv").read_binary()
+
+
+def test_same_output_as_serial(replay_server, tmpdir):
+    """Concurrent fetching, with windows split on the result cap, gives the serial CSV byte for byte."""
+    web3 = Web3(HTTPProvider(replay_server(SyntheticChain(900, backers=200), max_results=50, latency=0.001).endpoint_uri))
+    assert export_csv(web3, tmpdir, "concurrent", 8) == export_csv(web3, tmpdir, "serial", 1)
+
+
+def test_windows_in_chain_order(replay_server, tmpdir):
+    """Windows come out contiguous and in order, each with its events timestamped."""
+    chain = SyntheticChain(300)
+    web3 = Web3(HTTPProvider(replay_server(chain, max_results=20).endpoint_uri))
+    batch = BatchRPC.from_web3(web3)
+    timestamps = BlockTimestampCache(web3, str(tmpdir.join("timestamps.sqlite")), batch=batch)
+    exporter = ConcurrentExporter(web3, batch, timestamps, SYNTHETIC_ADDRESS, decode_fund_transfer, [FUND_TRANSFER_TOPIC],
+                                  window=30, concurrency=4)
+
+    windows = list(exporter.windows(SYNTHETIC_START_BLOCK, chain.block_number()))
+    assert windows[0][0] == SYNTHETIC_START_BLOCK
+    assert windows[-1][1] == chain.block_number()
+    assert all(a[1] + 1 == b[0] for a, b in zip(windows, windows[1:]))
+
+    events = [e for start, end, window_events in windows for e in window_events]
+    assert len(events) == 300
+    assert all(e["timestamp"] == chain.block_timestamp(e["blockNumber"]) for e in events)
+    assert exporter.retries > 0
+    timestamps.close()
+
+
+def test_scan_error_when_one_block_is_too_much(replay_server, tmpdir):
+    """A single block the node refuses fails the export."""
+    web3 = Web3(HTTPProvider(replay_server(SyntheticChain(30), max_results=2).endpoint_uri))
+    batch = BatchRPC.from_web3(web3)
+    timestamps = BlockTimestampCache(web3, str(tmpdir.join("timestamps.sqlite")), batch=batch)
+    exporter = ConcurrentExporter(web3, batch, timestamps, SYNTHETIC_ADDRESS, decode_fund_transfer, [FUND_TRANSFER_TOPIC],
+                                  window=4, concurrency=2)
+
+    with pytest.raises(LogScanError):
+        list(exporter.windows(SYNTHETIC_START_BLOCK, SYNTHETIC_START_BLOCK + 9))
+    timestamps.close()
@@ -0,0 +1,63 @@
+"""JSON-RPC batching."""
+import json
+
+import pytest
+
+from edgeless.batchrpc import BatchRPC, BatchRPCError, get_block_timestamps
+from edgeless.replayserver import SYNTHETIC_GENESIS_TIME, SYNTHETIC_START_BLOCK, SyntheticChain
+
+
+class ShuffledResponse:
+
+    def __init__(self, responses: list):
+        self.responses = responses
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.responses
+
+
+class ShufflingSession:
+    """Answers a batch with the request ids echoed back, in reverse order."""
+
+    def post(self, url, data, **kwargs):
+        return ShuffledResponse([{"jsonrpc": "2.0", "id": r["id"], "result": r["params"][0]} for r in reversed(json.loads(data))])
+
+
+def test_responses_matched_by_id():
+    """Results come back in call order even when the node answers out of order."""
+    batch = BatchRPC("http://localhost:8545", batch_size=3)
+    batch.session = ShufflingSession()
+
+    assert batch.call_many(("echo", [i]) for i in range(7)) == list(range(7))
+    assert batch.round_trips == 3
+    assert batch.calls == 7
+
+
+def test_batches_against_node(replay_server):
+    """Calls are packed into HTTP requests of batch_size."""
+    server = replay_server(SyntheticChain(30))
+    batch = BatchRPC(server.endpoint_uri, batch_size=4)
+
+    blocks = list(range(SYNTHETIC_START_BLOCK, SYNTHETIC_START_BLOCK + 10))
+    assert get_block_timestamps(batch, blocks) == {n: SYNTHETIC_GENESIS_TIME + n * 15 for n in blocks}
+    assert server.stats()["round_trips"] == 3
+
+
+def test_per_call_errors(replay_server):
+    """A failed call raises, or takes its own result slot when asked to."""
+    server = replay_server(SyntheticChain(30))
+    batch = BatchRPC(server.endpoint_uri)
+    calls = [("eth_blockNumber", []), ("eth_noSuchMethod", [1]), ("eth_blockNumber", [])]
+
+    with pytest.raises(BatchRPCError) as excinfo:
+        batch.call_many(calls)
+    assert excinfo.value.method == "eth_noSuchMethod"
+    assert excinfo.value.params == [1]
+    assert excinfo.value.error["code"] == -32601
+
+    head, error, again = batch.call_many(calls, raise_errors=False)
+    assert head == again == hex(SyntheticChain(30).block_number())
+    assert isinstance(error, BatchRPCError)
@@ -0,0 +1,74 @@
+"""NumPy columnar export against the replay server."""
+import os
+
+import pytest
+from web3 import HTTPProvider, Web3
+
+from edgeless.batchrpc import BatchRPC
+from edgeless.columnar import (
+    BACKER_DTYPE, EVENT_DTYPE, ColumnarWriter, event_records, hex_addresses, load_columnar, wei_values, write_backers,
+    write_events)
+from edgeless.export import ExportState
+from edgeless.pipeline import fund_transfer_windows
+from edgeless.replayserver import SYNTHETIC_ADDRESS, SYNTHETIC_START_BLOCK, SyntheticChain
+from edgeless.timestamps import BlockTimestampCache
+
+
+def test_events_and_backers(replay_server, tmpdir):
+    """Streamed event records and backer records read back to the exported values."""
+    chain = SyntheticChain(300, backers=40)
+    web3 = Web3(HTTPProvider(replay_server(chain).endpoint_uri))
+    batch = BatchRPC.from_web3(web3)
+    timestamps = BlockTimestampCache(web3, str(tmpdir.join("timestamps.sqlite")), batch=batch)
+    scanner, windows = fund_transfer_windows(web3, batch, timestamps, SYNTHETIC_ADDRESS, SYNTHETIC_START_BLOCK, chain.block_number(), window=20)
+
+    path = str(tmpdir.join("events.npy"))
+    writer = ColumnarWriter(path, EVENT_DTYPE)
+    events = [e for start, end, window_events in write_events(windows, writer) for e in window_events]
+    writer.close()
+    timestamps.close()
+    assert not os.path.exists(path + ".rows")
+
+    records = load_columnar(path)
+    assert len(records) == 300
+    assert list(records["block_number"]) == [e["blockNumber"] for e in events]
+    assert list(records["timestamp"]) == [e["timestamp"] for e in events]
+    assert hex_addresses(records, "backer") == [e["args"]["backer"] for e in events]
+    assert wei_values(records, "amount_wei") == [e["args"]["amount"] for e in events]
+
+    state = ExportState(SYNTHETIC_ADDRESS)
+    state.add_events(events)
+
+    # No .npy suffix gets added to the name we asked for
+    backers_path = str(tmpdir.join("backers.bin"))
+    write_backers(state, backers_path)
+    assert not os.path.exists(backers_path + ".npy")
+
+    backers = load_columnar(backers_path)
+    assert backers.dtype == BACKER_DTYPE
+    assert hex_addresses(backers) == [address for address, raised, first_payment in state.backers.items()]
+    assert wei_values(backers) == state.backers.raised()
+    assert list(backers["first_payment"]) == [first_payment for address, raised, first_payment in state.backers.items()]
+
+
+def test_amounts_past_64_bits(tmpdir):
+    """Amounts are split to two words without losing precision."""
+    event = {"transactionHash": "0x" + "01" * 32, "blockNumber": 1, "logIndex": 0,
+             "args": {"backer": "0x" + "00" * 19 + "ff", "amount": 2 ** 100 + 7}, "timestamp": 2}
+    path = str(tmpdir.join("events.npy"))
+    writer = ColumnarWriter(path, EVENT_DTYPE)
+    writer.append(event_records([event, event]))
+    writer.close()
+
+    records = load_columnar(path)
+    assert wei_values(records, "amount_wei") == [2 ** 100 + 7] * 2
+    assert hex_addresses(records, "backer") == ["0x" + "00" * 19 + "ff"] * 2
+
+
+def test_spool_removed_on_failure(tmpdir):
+    """The side file does not outlive a failed close."""
+    writer = ColumnarWriter(str(tmpdir.join("events.npy")), EVENT_DTYPE)
+    writer.path = str(tmpdir.join("missing", "events.npy"))
+    with pytest.raises(FileNotFoundError):
+        writer.close()
+    assert tmpdir.listdir() == []
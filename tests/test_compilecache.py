@@ -0,0 +1,61 @@
+"""Compiled contract cache."""
+import os
+
+from edgeless import compilecache
+from edgeless.compilecache import CompileCache, cache_key, find_sources, load_compiled_contracts
+
+
+COMPILER = {"binary": "/usr/bin/solc", "size": 1, "mtime": 1}
+
+SETTINGS = {"optimize": True, "output_values": ["bin", "bin-runtime", "abi"]}
+
+
+def write_sources(tmpdir):
+    contracts = tmpdir.mkdir("contracts")
+    contracts.join("Token.sol").write('pragma solidity ^0.4.8;\nimport "./Now.sol";\ncontract Token is Now {}\n')
+    contracts.join("Now.sol").write('pragma solidity ^0.4.8;\ncontract Now {}\n')
+    return contracts
+
+
+def test_imports_are_followed(tmpdir):
+    """Imported files count as sources, even when not listed."""
+    contracts = write_sources(tmpdir)
+    assert find_sources([str(contracts.join("Token.sol"))]) == [str(contracts.join("Now.sol")), str(contracts.join("Token.sol"))]
+
+
+def test_key_changes(tmpdir):
+    """Changing an import, the settings or the compiler gives a new key."""
+    contracts = write_sources(tmpdir)
+    paths = [str(contracts.join("Token.sol"))]
+    key = cache_key(paths, SETTINGS, COMPILER, root=str(tmpdir))
+    assert cache_key(paths, SETTINGS, COMPILER, root=str(tmpdir)) == key
+
+    assert cache_key(paths, dict(SETTINGS, optimize=False), COMPILER, root=str(tmpdir)) != key
+    assert cache_key(paths, SETTINGS, dict(COMPILER, size=2), root=str(tmpdir)) != key
+
+    contracts.join("Now.sol").write('pragma solidity ^0.4.8;\ncontract Now { uint public now; }\n')
+    assert cache_key(paths, SETTINGS, COMPILER, root=str(tmpdir)) != key
+
+
+def test_hit_skips_compiler(tmpdir, monkeypatch):
+    """Compiler runs only when the sources change."""
+    write_sources(tmpdir)
+    compiled = []
+
+    def compile_project_contracts(project_dir, contracts_dir, compiler_settings):
+        compiled.append(contracts_dir)
+        return [], {"Token": {"abi": [], "code": "0x{}".format(len(compiled))}}
+
+    monkeypatch.setattr(compilecache, "compile_project_contracts", compile_project_contracts)
+    monkeypatch.setattr(compilecache, "compiler_identity", lambda: COMPILER)
+    cache = CompileCache(str(tmpdir.join("cache")))
+
+    first = load_compiled_contracts(str(tmpdir), "contracts", SETTINGS, cache)
+    assert load_compiled_contracts(str(tmpdir), "contracts", SETTINGS, cache) == first
+    assert len(compiled) == 1
+    assert cache.hits == 1
+
+    tmpdir.join("contracts", "Now.sol").write('pragma solidity ^0.4.8;\ncontract Now { uint public now; }\n')
+    assert load_compiled_contracts(str(tmpdir), "contracts", SETTINGS, cache) != first
+    assert len(compiled) == 2
+    assert len(os.listdir(cache.cache_dir)) == 2
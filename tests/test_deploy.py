@@ -0,0 +1,16 @@
+"""Pipelined deployment helpers."""
+from web3 import Web3
+
+from edgeless.nonces import NonceManager
+
+
+def test_nonces_are_consecutive(web3: Web3, customer: str, empty_address: str):
+    """Nonces continue from what the node knows about."""
+
+    web3.eth.sendTransaction({"from": customer, "to": empty_address, "value": 1})
+    nonces = NonceManager(web3, customer)
+    assert [nonces.next() for i in range(3)] == [1, 2, 3]
+
+    nonces.reset()
+    assert nonces.next() == 1
+
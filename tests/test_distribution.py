@@ -0,0 +1,106 @@
+"""Batched token distribution."""
+import pytest
+from ethereum.tester import TransactionFailed
+import populus.chain
+from web3 import Web3
+from web3.contract import Contract
+
+from edgeless.distribution import batch_gas, chunk_recipients, distribute, estimate_individual_time, read_recipients
+
+
+def addresses(count: int, first=0x1000):
+    """Addresses nobody has used."""
+    return ["0x{:040x}".format(first + i) for i in range(count)]
+
+
+def test_read_recipients(tmpdir):
+    """CSV with a header row is read in order."""
+    path = tmpdir.join("bounties.csv")
+    a, b = addresses(2)
+    path.write("address,amount\n{},100\n{},2000\n".format(a, b))
+    assert read_recipients(str(path)) == [(a, 100), (b, 2000)]
+
+
+def test_read_recipients_errors(tmpdir):
+    """Bad addresses and duplicates are refused."""
+    path = tmpdir.join("bounties.csv")
+    a, = addresses(1)
+    path.write("{},100\n0x1234,100\n".format(a))
+    with pytest.raises(ValueError):
+        read_recipients(str(path))
+
+    path.write("{},100\n{},100\n".format(a, a))
+    with pytest.raises(ValueError):
+        read_recipients(str(path))
+
+
+def test_chunks_fit():
+    """Chunks keep the order and stay under the gas limit."""
+    recipients = [(address, 1) for address in addresses(250)]
+    chunks = chunk_recipients(recipients, max_gas=1000000)
+    assert [r for chunk in chunks for r in chunk] == recipients
+    assert all(batch_gas(len(chunk)) <= 1000000 for chunk in chunks)
+    assert batch_gas(len(chunks[0]) + 1) > 1000000
+
+
+def test_estimate_individual_time():
+    """Transfers take a receipt round per window, or longer if they need more block space than the chunks got."""
+    # 2 chunks in one round of 10 seconds, 95 transfers need 10 rounds
+    assert estimate_individual_time(10, 2, 95, 10, 3000000, 4000000) == 100
+    # Gas bound: 3 times the gas in the same block space per second
+    assert estimate_individual_time(10, 2, 95, 100, 1000000, 3000000) == 30
+
+
+def test_batch_transfer(erc20_token: Contract, token_owner: str):
+    """Tokens go to every recipient with an event each."""
+    token = erc20_token
+    recipients = addresses(3)
+    initial_balance = token.call().balanceOf(token_owner)
+
+    token.transact({"from": token_owner}).batchTransfer(recipients, [100, 200, 300])
+
+    assert [token.call().balanceOf(r) for r in recipients] == [100, 200, 300]
+    assert token.call().balanceOf(token_owner) == initial_balance - 600
+    events = token.pastEvents("Transfer").get()
+    assert [e["args"]["value"] for e in events] == [100, 200, 300]
+
+
+def test_batch_transfer_refused(erc20_token: Contract, token_owner: str):
+    """Mismatched lists, sending to oneself and breaking the owner lock throw."""
+    token = erc20_token
+    with pytest.raises(TransactionFailed):
+        token.transact({"from": token_owner}).batchTransfer(addresses(2), [100])
+    with pytest.raises(TransactionFailed):
+        token.transact({"from": token_owner}).batchTransfer([token_owner], [100])
+    with pytest.raises(TransactionFailed):
+        token.transact({"from": token_owner}).batchTransfer(addresses(2), [200000000, 250000001])
+
+
+def test_batch_cheaper(web3: Web3, erc20_token: Contract, token_owner: str):
+    """One batch costs less than a transfer to each recipient."""
+    token = erc20_token
+    batch = web3.eth.getTransactionReceipt(token.transact({"from": token_owner}).batchTransfer(addresses(10), [100] * 10))
+    individual = [web3.eth.getTransactionReceipt(token.transact({"from": token_owner}).transfer(address, 100))
+                  for address in addresses(10, first=0x2000)]
+    assert batch["gasUsed"] < sum(receipt["gasUsed"] for receipt in individual)
+
+
+def test_distribute_and_resume(chain: populus.chain.TesterChain, web3: Web3, erc20_token: Contract, token_owner: str, end: int, tmpdir):
+    """A failed chunk is sent again on the next run, chunks that went through are not."""
+    token = erc20_token
+    state_path = str(tmpdir.join("distribution-state.json"))
+
+    # Two recipients per chunk, the last one breaks the owner lock
+    recipients = [(address, 100) for address in addresses(5)] + [(addresses(1, first=0x3000)[0], 450000000)]
+    kwargs = dict(state_path=state_path, max_gas=batch_gas(2), window=1, timeout=10, assign_nonces=False)
+
+    with pytest.raises(TransactionFailed):
+        distribute(web3, chain.get_contract_factory, token_owner, token.address, recipients, **kwargs)
+    assert [token.call().balanceOf(address) for address, amount in recipients] == [100] * 4 + [0, 0]
+
+    # Lock is over
+    token.transact().setCurrent(end + 366 * 24 * 3600)
+    results = distribute(web3, chain.get_contract_factory, token_owner, token.address, recipients, **kwargs)
+
+    assert sorted(results) == ["batch-00000", "batch-00001", "batch-00002"]
+    assert [token.call().balanceOf(address) for address, amount in recipients] == [amount for address, amount in recipients]
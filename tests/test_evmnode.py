@@ -0,0 +1,50 @@
+"""In-process node with a transaction pool."""
+import pytest
+from web3 import Web3
+
+from edgeless.evmchain import EVMChain
+from edgeless.evmnode import EVMNode
+
+
+GWEI = 1000000000
+
+RECEIVER = "0x" + "42" * 20
+
+
+@pytest.fixture
+def web3() -> Web3:
+    return Web3(EVMNode(EVMChain({})))
+
+
+def transfer(web3: Web3, price: int, **kwargs) -> str:
+    return web3.eth.sendTransaction(dict({"from": web3.eth.accounts[0], "to": RECEIVER, "value": 1, "gas": 21000, "gasPrice": price}, **kwargs))
+
+
+def test_replacement_needs_higher_price(web3: Web3):
+    """A pooled transaction is replaced only by one paying at least 10% more, and then never mined."""
+    first = transfer(web3, 10 * GWEI, nonce=0)
+    with pytest.raises(ValueError):
+        transfer(web3, 10 * GWEI, nonce=0)
+
+    second = transfer(web3, 11 * GWEI, nonce=0)
+    assert web3.eth.getTransaction(first) is None
+    assert web3.eth.getTransactionCount(web3.eth.accounts[0], "pending") == 1
+
+    web3.currentProvider.mine()
+    assert web3.eth.getTransactionReceipt(second)["blockNumber"] == web3.eth.blockNumber
+    with pytest.raises(ValueError):
+        transfer(web3, 20 * GWEI, nonce=0)
+
+
+def test_nonce_gap_waits(web3: Web3):
+    """A transaction with a future nonce is mined once the gap is filled."""
+    node = web3.currentProvider
+    later = transfer(web3, GWEI, nonce=1)
+    node.mine()
+    assert web3.eth.getTransactionReceipt(later) is None
+    assert web3.eth.getTransactionCount(web3.eth.accounts[0], "pending") == 0
+
+    earlier = transfer(web3, GWEI, nonce=0)
+    node.mine()
+    assert web3.eth.getTransactionReceipt(earlier)["transactionIndex"] == 0
+    assert web3.eth.getTransactionReceipt(later)["transactionIndex"] == 1
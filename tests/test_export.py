@@ -0,0 +1,162 @@
+"""Crowdsale export pipeline and checkpoints against the replay server."""
+import csv
+import datetime
+from collections import OrderedDict
+from typing import List
+
+import pytest
+from eth_utils import from_wei
+from web3 import HTTPProvider, Web3
+
+from edgeless.batchrpc import BatchRPC
+from edgeless.export import EventWriter, ExportState, aggregate, format_ether, write_csv
+from edgeless.pipeline import fund_transfer_windows
+from edgeless.replayserver import SYNTHETIC_ADDRESS, SYNTHETIC_START_BLOCK, SyntheticChain
+from edgeless.timestamps import BlockTimestampCache
+
+
+@pytest.fixture
+def chain() -> SyntheticChain:
+    return SyntheticChain(600, backers=70)
+
+
+@pytest.fixture
+def web3(replay_server, chain) -> Web3:
+    return Web3(HTTPProvider(replay_server(chain, max_results=100).endpoint_uri))
+
+
+def export(web3: Web3, tmpdir, state: ExportState, start_block: int, end_block: int, **kwargs):
+    """Run the aggregate export over a block range."""
+    batch = BatchRPC.from_web3(web3)
+    timestamps = BlockTimestampCache(web3, str(tmpdir.join("timestamps.sqlite")), batch=batch)
+    scanner, windows = fund_transfer_windows(web3, batch, timestamps, SYNTHETIC_ADDRESS, start_block, end_block, window=50, **kwargs)
+    for window in aggregate(windows, state):
+        pass
+    timestamps.close()
+
+
+def test_aggregate_totals(web3, chain, tmpdir):
+    """Every backer gets the sum of their investments and the time of the first one."""
+    state = ExportState(SYNTHETIC_ADDRESS)
+    export(web3, tmpdir, state, SYNTHETIC_START_BLOCK, chain.block_number())
+
+    assert len(state.backers) == 70
+    assert state.last_block == chain.block_number()
+
+    backer = "0x" + chain.backer(5)
+    events = [i for i in range(chain.events) if chain.backer(i) == chain.backer(5)]
+    totals = {address: (raised, first_payment) for address, raised, first_payment in state.backers.items()}
+    assert totals[backer] == (
+        sum(chain.amount(i) for i in events),
+        chain.block_timestamp(SYNTHETIC_START_BLOCK + events[0] // chain.events_per_block))
+
+
+def test_incremental_resume(web3, chain, tmpdir):
+    """Exporting in two runs with a checkpoint in between gives the same result as one run."""
+    full = ExportState(SYNTHETIC_ADDRESS)
+    export(web3, tmpdir, full, SYNTHETIC_START_BLOCK, chain.block_number())
+    write_csv(full, str(tmpdir.join("full.csv")))
+
+    checkpoint = str(tmpdir.join("state.json"))
+    first = ExportState.load(checkpoint, SYNTHETIC_ADDRESS)
+    assert first.last_block is None
+    export(web3, tmpdir, first, SYNTHETIC_START_BLOCK, SYNTHETIC_START_BLOCK + 77)
+    first.save(checkpoint)
+
+    resumed = ExportState.load(checkpoint, SYNTHETIC_ADDRESS)
+    assert resumed.last_block == SYNTHETIC_START_BLOCK + 77
+    assert list(resumed.backers.items()) == list(first.backers.items())
+    export(web3, tmpdir, resumed, resumed.last_block + 1, chain.block_number())
+    write_csv(resumed, str(tmpdir.join("resumed.csv")))
+
+    assert list(resumed.backers.items()) == list(full.backers.items())
+    assert tmpdir.join("resumed.csv").read_binary() == tmpdir.join("full.csv").read_binary()
+
+
+def test_checkpoint_for_other_contract(tmpdir):
+    """A checkpoint is never merged into the export of another contract."""
+    checkpoint = str(tmpdir.join("state.json"))
+    ExportState(SYNTHETIC_ADDRESS, last_block=1).save(checkpoint)
+    with pytest.raises(ValueError):
+        ExportState.load(checkpoint, "0x" + "11" * 20)
+
+
+def baseline_csv(events: List[dict], path: str):
+    """The aggregation and CSV writing of the original export-transactions.py main()."""
+    address_data = OrderedDict()
+    for e in events:
+        address = e["args"]["backer"]
+        data = address_data.get(address, {})
+        current_first = data.get("first_payment", 99999999999999999)
+        if e["timestamp"] < current_first:
+            data["first_payment"] = e["timestamp"]
+        data["raised"] = data.get("raised", 0) + from_wei(e["args"]["amount"], "ether")
+        address_data[address] = data
+
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        for address, data in address_data.items():
+            dt = datetime.datetime.fromtimestamp(data["first_payment"], tz=datetime.timezone.utc)
+            writer.writerow([address, dt.isoformat(), str(data["raised"])])
+
+
+def test_csv_matches_baseline(web3, chain, tmpdir):
+    """The aggregate CSV is byte-identical to what the original Decimal based export wrote."""
+    batch = BatchRPC.from_web3(web3)
+    timestamps = BlockTimestampCache(web3, str(tmpdir.join("timestamps.sqlite")), batch=batch)
+    scanner, windows = fund_transfer_windows(web3, batch, timestamps, SYNTHETIC_ADDRESS, SYNTHETIC_START_BLOCK, chain.block_number())
+    events = [e for start, end, window_events in windows for e in window_events]
+    timestamps.close()
+
+    # Amounts with up to 18 decimals, including totals like 20.5 + 0.5 that end in .0
+    extra = [2 * 10 ** 19 + 5 * 10 ** 17, 5 * 10 ** 17, 1, 0, 10 ** 18, 123456789012345678]
+    for i, amount in enumerate(extra):
+        events.append({"args": {"backer": "0x" + "ab" * 20 if i < 2 else "0x{:040x}".format(i), "amount": amount},
+                       "timestamp": events[-1]["timestamp"] + 1})
+
+    state = ExportState(SYNTHETIC_ADDRESS)
+    state.add_events(events)
+    write_csv(state, str(tmpdir.join("export.csv")))
+    baseline_csv(events, str(tmpdir.join("baseline.csv")))
+
+    row, = [line for line in tmpdir.join("export.csv").read().splitlines() if line.startswith("0x" + "ab" * 20)]
+    assert row.endswith(",21.0")
+    assert tmpdir.join("export.csv").read_binary() == tmpdir.join("baseline.csv").read_binary()
+
+
+def test_format_ether():
+    """Ether keeps the decimals of the investments, and totals past Decimal precision stay exact."""
+    assert format_ether(21 * 10 ** 18, 1) == "21.0"
+    assert format_ether(21 * 10 ** 18, 0) == "21"
+    assert format_ether(0, 0) == "0"
+    assert format_ether(2 ** 128 - 1, 18) == "340282366920938463463.374607431768211455"
+
+
+def read_rows(path: str) -> List[list]:
+    with open(path, "rt", newline="") as inp:
+        return list(csv.reader(inp))
+
+
+def test_event_writer(web3, chain, tmpdir):
+    """One row per investment in chain order, flushed as each window passes."""
+    batch = BatchRPC.from_web3(web3)
+    timestamps = BlockTimestampCache(web3, str(tmpdir.join("timestamps.sqlite")), batch=batch)
+    scanner, windows = fund_transfer_windows(web3, batch, timestamps, SYNTHETIC_ADDRESS, SYNTHETIC_START_BLOCK, chain.block_number(), window=50)
+
+    path = str(tmpdir.join("events.csv"))
+    writer = EventWriter(path)
+    seen = 0
+    for start, end, events in writer.write(windows):
+        seen += len(events)
+        assert len(read_rows(path)) == seen + 1
+    writer.close()
+    timestamps.close()
+
+    header, *rows = read_rows(path)
+    assert header == EventWriter.header
+    assert len(rows) == chain.events
+
+    i = 100
+    block = SYNTHETIC_START_BLOCK + i // chain.events_per_block
+    dt = datetime.datetime.fromtimestamp(chain.block_timestamp(block), tz=datetime.timezone.utc)
+    assert rows[i][1:] == [str(block), str(i % chain.events_per_block), "0x" + chain.backer(i), dt.isoformat(), str(chain.amount(i))]
@@ -0,0 +1,56 @@
+"""Stateful fuzzing harness."""
+import random
+
+import pytest
+from populus.project import Project
+
+from edgeless.crosscheck import STARTGAS, EVMDeployment
+from edgeless.evmchain import OPTIMISED_CONTRACTS, BlockGasLimitReached
+from edgeless.fuzz import Fuzzer, shrink
+from edgeless.simulator import OWNER, START, Operation, random_operations
+
+
+def test_shrink():
+    """Only the operations needed for the failure are kept."""
+    assert shrink(list(range(50)), lambda operations: 3 in operations and 7 in operations) == [3, 7]
+
+
+def test_transaction_too_big_for_a_block(project: Project):
+    """A transaction that does not fit in an empty block raises instead of counting as failed."""
+    evm = EVMDeployment(project.compiled_contracts, block_gas_limit=STARTGAS // 2)
+    with pytest.raises(BlockGasLimitReached):
+        evm.apply(Operation("send", 2, (), 10 ** 18))
+
+
+def test_invariants_hold(project: Project):
+    """Random sequences break no invariant, with many transactions per block."""
+    fuzzer = Fuzzer(project.compiled_contracts, block_size=25)
+    assert fuzzer.fuzz(runs=5, length=100) is None
+    assert fuzzer.operations == 500
+    assert fuzzer.blocks == 20
+
+
+def test_invariants_hold_optimised(project: Project):
+    """The gas optimised contracts keep the invariants too."""
+    fuzzer = Fuzzer(project.compiled_contracts, OPTIMISED_CONTRACTS)
+    assert fuzzer.fuzz(runs=2, length=100, seed=100) is None
+
+
+def test_violation_is_shrunk(project: Project):
+    """A broken invariant is reported with the fewest operations that break it."""
+
+    def nothing_sold(state, returned):
+        if state["tokens_sold"]:
+            return "sold"
+
+    operations = [operation for operation in random_operations(random.Random(0), 40) if operation.function != "checkGoalReached"]
+    operations += [Operation("setCurrent", OWNER, (START + 1,), 0), Operation("send", 2, (), 10 ** 18)]
+
+    fuzzer = Fuzzer(project.compiled_contracts, block_size=10, invariants={"nothing sold": nothing_sold})
+    violation = fuzzer.run(operations)
+    assert violation.invariant == "nothing sold"
+
+    shrunk = fuzzer.shrink(operations, violation)
+    assert len(shrunk) == 2
+    assert shrunk[0].function == "setCurrent"
+    assert shrunk[1].function in ("send", "invest")
@@ -0,0 +1,56 @@
+"""Gas budgets of crowdsale and token functions.
+
+Every scenario in :py:mod:`edgeless.gasprofile` must not use more gas than
+recorded in ``gas-baseline.json``. Record the figures, the first time and
+after an intended change, with::
+
+    py.test tests/test_gas.py --update-gas-baseline
+
+Until the file is recorded the budget checks are skipped. Once it exists,
+a scenario missing from it fails.
+"""
+import os
+from typing import Dict
+
+import pytest
+from populus.project import Project
+
+from edgeless.gasprofile import SCENARIOS, load_baseline, profile, save_baseline
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), "gas-baseline.json")
+
+
+@pytest.fixture(scope="module")
+def gas_used(project: Project) -> Dict[str, int]:
+    """Gas of all scenarios, measured once per module."""
+    return profile(project.compiled_contracts)
+
+
+@pytest.fixture(scope="module")
+def baseline(request, gas_used) -> Dict[str, int]:
+    if request.config.getoption("update_gas_baseline"):
+        save_baseline(BASELINE, gas_used)
+    if not os.path.exists(BASELINE):
+        pytest.skip("No gas budgets recorded, run with --update-gas-baseline and commit {}".format(BASELINE))
+    return load_baseline(BASELINE)
+
+
+@pytest.mark.parametrize("name", list(SCENARIOS))
+def test_gas_budget(name: str, gas_used: Dict[str, int], baseline: Dict[str, int]):
+    """Gas used stays within budget."""
+    assert name in baseline, "No gas budget recorded for {}, run with --update-gas-baseline".format(name)
+    assert gas_used[name] <= baseline[name], "{} uses {} gas, budget is {}".format(name, gas_used[name], baseline[name])
+
+
+def test_first_buy_costs_more(gas_used: Dict[str, int]):
+    """A repeat buy writes to existing storage slots, which is cheaper."""
+    for tier in range(1, 5):
+        assert gas_used["Crowdsale.invest tier {} repeat buy".format(tier)] < gas_used["Crowdsale.invest tier {} first buy".format(tier)]
+
+
+def test_later_tiers_cost_more(gas_used: Dict[str, int]):
+    """getPrice walks the tiers, later ones are further."""
+    prices = [gas_used["Crowdsale.getPrice tier {}".format(tier)] for tier in range(1, 5)]
+    assert prices == sorted(prices)
+    assert prices[0] < prices[-1]
@@ -0,0 +1,147 @@
+"""Gas price strategy and stuck transaction replacement."""
+import pytest
+from web3 import Web3
+
+from edgeless.evmchain import EVMChain
+from edgeless.evmnode import EVMNode, from_hex
+from edgeless.gasprice import GasPriceStrategy, ReplacingSender, bump_price, price_for
+from edgeless.receipts import ReceiptTracker
+
+
+GWEI = 1000000000
+
+TRANSFER_GAS = 21000
+
+RECEIVER = "0x" + "42" * 20
+
+
+def block(prices, full=True):
+    return {"gasLimit": 100, "gasUsed": 100 if full else 10, "transactions": [{"gasPrice": p} for p in prices]}
+
+
+def test_price_for_percentile():
+    """Price is the percentile of the cheapest prices that got in to full blocks."""
+    blocks = [block([p * GWEI, 50 * GWEI]) for p in range(1, 11)]
+    assert price_for(blocks, 0.9, 1, GWEI) == 9 * GWEI
+    assert price_for(blocks, 0.5, 1, GWEI) == 5 * GWEI
+    assert price_for(blocks, 1.0, 1, GWEI) == 10 * GWEI
+
+
+def test_price_for_target_blocks():
+    """Waiting longer lets a cheaper price through."""
+    blocks = [block([p * GWEI]) for p in [10, 2, 10, 3, 10, 4]]
+    assert price_for(blocks, 1.0, 1, GWEI) == 10 * GWEI
+    assert price_for(blocks, 1.0, 2, GWEI) == 4 * GWEI
+
+
+def test_price_for_empty_blocks():
+    """Blocks with room to spare take the minimum price."""
+    blocks = [block([20 * GWEI], full=False)] * 5
+    assert price_for(blocks, 0.9, 1, GWEI) == GWEI
+    assert price_for([], 0.9, 1, GWEI) == GWEI
+
+
+def test_bump_price():
+    """Replacement is enough above the old price for the node to accept it, but under the cap."""
+    assert bump_price(8 * GWEI, GWEI) == 9 * GWEI
+    assert bump_price(8 * GWEI, 20 * GWEI) == 20 * GWEI
+    assert bump_price(8 * GWEI, 20 * GWEI, max_price=10 * GWEI) == 10 * GWEI
+
+
+@pytest.fixture
+def node() -> EVMNode:
+    """Blocks with room for three ether transfers."""
+    return EVMNode(EVMChain({}, block_gas_limit=3 * TRANSFER_GAS))
+
+
+def transfer(web3: Web3, sender: str, price: int, **kwargs) -> str:
+    return web3.eth.sendTransaction(dict({"from": sender, "to": RECEIVER, "value": 1, "gas": TRANSFER_GAS, "gasPrice": price}, **kwargs))
+
+
+def test_suggest_filled_blocks(node: EVMNode):
+    """Prices come from blocks that the best paying transactions filled."""
+    web3 = Web3(node)
+    accounts = web3.eth.accounts
+
+    # Each sender fills a block of its own, the best paying first
+    for i, sender in enumerate(accounts):
+        for nonce in range(3):
+            transfer(web3, sender, (i + 1) * GWEI)
+    blocks = [web3.eth.getBlock(node.mine(), True) for i in range(len(accounts))]
+    assert [[tx["gasPrice"] for tx in block["transactions"]] for block in blocks] == [[p * GWEI] * 3 for p in range(10, 0, -1)]
+    assert all(block["gasUsed"] == block["gasLimit"] for block in blocks)
+
+    # A block with room to spare takes anything
+    transfer(web3, accounts[0], 20 * GWEI)
+    node.mine()
+
+    strategy = GasPriceStrategy(web3, probability=0.9, target_blocks=1, sample_blocks=11, min_price=1)
+    assert strategy.suggest() == 9 * GWEI
+
+    strategy = GasPriceStrategy(web3, probability=0.9, target_blocks=2, sample_blocks=11, min_price=1)
+    assert strategy.suggest() == 8 * GWEI
+
+
+def test_replace_stuck(node: EVMNode):
+    """A transaction outbid by others is sent again with the same nonce until it gets in."""
+    node.mine_on_poll = True
+    web3 = Web3(node)
+    customer, *competitors = web3.eth.accounts
+
+    # Enough better paying transactions to fill the next blocks
+    for sender in competitors[:4]:
+        for nonce in range(3):
+            transfer(web3, sender, 50 * GWEI)
+
+    sent = []
+
+    def send(transaction):
+        sent.append(transaction)
+        return web3.eth.sendTransaction(transaction)
+
+    strategy = GasPriceStrategy(web3, min_price=GWEI, target_blocks=1, cache_seconds=0)
+    tracker = ReceiptTracker(web3, poll_interval=0.01)
+    sender = ReplacingSender(web3, tracker, strategy, deadline=0)
+    nonce = web3.eth.getTransactionCount(customer)
+    # Spare gas, the tracker takes a transaction that used all of its gas for failed
+    payment = {"from": customer, "to": RECEIVER, "value": 1, "gas": TRANSFER_GAS + 1000, "gasPrice": GWEI, "nonce": nonce}
+    sender.send("payment", send, payment)
+
+    outcomes = sender.wait(["payment"], timeout=10, poll_interval=0.01)
+    tracker.close()
+
+    receipt = outcomes["payment"].result()
+    assert sender.replacements == len(sent) - 1 >= 1
+    assert sender.txids("payment")[-1] == receipt["transactionHash"]
+    assert all(transaction["nonce"] == nonce for transaction in sent)
+    assert all(b["gasPrice"] >= a["gasPrice"] * 1.1 for a, b in zip(sent, sent[1:]))
+    assert web3.eth.getTransaction(receipt["transactionHash"])["gasPrice"] == sent[-1]["gasPrice"]
+
+    # Replaced attempts are gone from the node
+    assert all(web3.eth.getTransaction(txid) is None for txid in sender.txids("payment")[:-1])
+
+
+def test_replaced_attempt_mined(node: EVMNode):
+    """An attempt mined after it was replaced, by a miner that never got the replacement, is the outcome."""
+    web3 = Web3(node)
+    customer = web3.eth.accounts[0]
+    strategy = GasPriceStrategy(web3, min_price=GWEI, target_blocks=1, cache_seconds=0)
+    tracker = ReceiptTracker(web3, poll_interval=0.01)
+    sender = ReplacingSender(web3, tracker, strategy, deadline=0)
+    payment = {"from": customer, "to": RECEIVER, "value": 1, "gas": TRANSFER_GAS + 1000, "gasPrice": GWEI, "nonce": 0}
+    sender.send("payment", web3.eth.sendTransaction, payment)
+    first = sender.txids("payment")[0]
+    stale = node.transactions[from_hex(first)]
+
+    sender.replace("payment")
+    assert len(sender.txids("payment")) == 2
+
+    # The miner still has the first attempt
+    node.pool[(stale.sender, stale.nonce)] = stale
+    node.transactions[stale.hash] = stale
+    node.mine()
+
+    outcomes = sender.wait(["payment"], timeout=5, poll_interval=0.01)
+    tracker.close()
+    assert outcomes["payment"].result()["transactionHash"] == first
+    assert sender.replacements == 1
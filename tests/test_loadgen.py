@@ -0,0 +1,47 @@
+"""Crowdsale load generator."""
+import pytest
+from populus.project import Project
+
+from edgeless.evmchain import EVMChain
+from edgeless.loadgen import LoadGenerator, fixed_size, plan_purchases, rush_time, summarise, tier_time
+
+
+@pytest.fixture
+def generator(project: Project) -> LoadGenerator:
+    # Room for a few purchases per block
+    chain = EVMChain(project.compiled_contracts, block_gas_limit=600000)
+    return LoadGenerator(chain, investors=20)
+
+
+def test_rush(generator: LoadGenerator):
+    """Purchases that do not fit in a block wait for the next ones."""
+
+    boundaries = generator.boundaries()
+    purchases = plan_purchases(40, 20, fixed_size(1), rush_time(boundaries[0], boundaries[-1], 1))
+    blocks = list(generator.run(purchases))
+    summary = summarise(blocks, boundaries, 600000)
+
+    assert summary["purchases"] == 40
+    assert summary["failures"] == 0
+    assert 1 < summary["max_purchases_per_block"] < 40
+    assert summary["full_blocks"] > 0
+    assert all(block.gas_used <= 600000 for block in blocks)
+    assert summary["amount_raised"] == 40 * 10 ** 18
+    assert summary["tokens_sold"] == 40 * (10 ** 18 // 833333333333333)
+    assert [block.tokens_sold for block in blocks] == sorted(block.tokens_sold for block in blocks)
+
+
+def test_max_goal(generator: LoadGenerator):
+    """Purchases over the max goal fail and burn their gas."""
+
+    boundaries = generator.boundaries()
+
+    # 120M tokens each in the first tier, the fourth one goes over 440M
+    purchases = plan_purchases(6, 6, fixed_size(100000), tier_time(boundaries, [1, 0, 0, 0]))
+    blocks = list(generator.run(purchases))
+    summary = summarise(blocks, boundaries, 600000)
+
+    assert summary["failures"] == 3
+    assert summary["tokens_sold"] == 360000000
+    assert summary["tier_purchases"] == [3, 0, 0, 0]
+    assert generator.failure_gas == 3 * generator.startgas
@@ -0,0 +1,85 @@
+"""Fast raw log decoder."""
+from eth_abi import encode_abi
+from eth_utils import encode_hex
+from web3 import Web3
+from web3.contract import Contract
+from web3.utils.currency import to_wei
+from web3.utils.events import get_event_data
+
+from edgeless.logdecoder import FUND_TRANSFER_TOPIC, TRANSFER_TOPIC, decode_fund_transfer, decode_logs, decode_transfer
+
+
+def get_raw_logs(web3: Web3, contract: Contract) -> list:
+    """Get all logs of a contract as eth_getLogs would give them."""
+    log_filter = web3.eth.filter({"address": contract.address, "fromBlock": 0, "toBlock": "latest"})
+    return web3.eth.getFilterLogs(log_filter.filter_id)
+
+
+def make_log(topics: list, data: bytes) -> dict:
+    """Synthesise a formatted log entry."""
+    return {
+        "logIndex": 3,
+        "transactionIndex": 1,
+        "transactionHash": "0x" + "ab" * 32,
+        "address": "0x" + "cd" * 20,
+        "blockHash": "0x" + "ef" * 32,
+        "blockNumber": 3300000,
+        "data": encode_hex(data),
+        "topics": topics,
+    }
+
+
+def test_decode_fund_transfer(open_crowdsale: Contract, token: Contract, customer: str, customer_2: str, web3: Web3):
+    """FundTransfer decodes the same as with web3."""
+
+    for buyer, amount in ((customer, 20), (customer_2, 1), (customer, 3)):
+        web3.eth.sendTransaction({"from": buyer, "to": open_crowdsale.address, "value": to_wei(amount, "ether"), "gas": 250000})
+
+    event_abi = open_crowdsale._find_matching_event_abi("FundTransfer")
+    logs = [log for log in get_raw_logs(web3, open_crowdsale) if log["topics"][0] == FUND_TRANSFER_TOPIC]
+    assert len(logs) == 3
+
+    for log in logs:
+        assert decode_fund_transfer(log) == get_event_data(event_abi, log)
+
+
+def test_decode_transfer(open_crowdsale: Contract, token: Contract, customer: str, empty_address: str, web3: Web3, end: int):
+    """Transfer decodes the same as with web3."""
+
+    web3.eth.sendTransaction({"from": customer, "to": open_crowdsale.address, "value": to_wei(20, "ether"), "gas": 250000})
+    token.transact().setCurrent(end + 1)
+    token.transact({"from": customer}).transfer(empty_address, 1)
+
+    event_abi = token._find_matching_event_abi("Transfer")
+    logs = [log for log in get_raw_logs(web3, token) if log["topics"][0] == TRANSFER_TOPIC]
+    assert len(logs) == 2
+
+    for log in logs:
+        assert decode_transfer(log) == get_event_data(event_abi, log)
+
+
+def test_decode_edge_values(crowdsale: Contract, token: Contract):
+    """Addresses with zero bytes at either end and amounts over 64 bits survive."""
+
+    backer = "0x00000000000000000000000000000000000000ff"
+    receiver = "0xff00000000000000000000000000000000000000"
+    big = 2 ** 255 + 1
+
+    fund_abi = crowdsale._find_matching_event_abi("FundTransfer")
+    log = make_log([FUND_TRANSFER_TOPIC], encode_abi(["address", "uint256", "bool", "uint256"], [backer, big, False, 2 ** 70]))
+    assert decode_fund_transfer(log) == get_event_data(fund_abi, log)
+    assert decode_fund_transfer(log)["args"]["backer"] == backer
+
+    transfer_abi = token._find_matching_event_abi("Transfer")
+    topics = [TRANSFER_TOPIC, encode_hex(encode_abi(["address"], [receiver])), encode_hex(encode_abi(["address"], [backer]))]
+    log = make_log(topics, encode_abi(["uint256"], [big]))
+    assert decode_transfer(log) == get_event_data(transfer_abi, log)
+
+
+def test_decode_logs_skips_unknown():
+    """Logs of other events are left out."""
+    fund = make_log([FUND_TRANSFER_TOPIC], encode_abi(["address", "uint256", "bool", "uint256"], ["0x" + "11" * 20, 1, True, 1]))
+    other = make_log(["0x" + "00" * 32], b"")
+    anonymous = make_log([], b"")
+    decoded = decode_logs([other, fund, anonymous])
+    assert [e["event"] for e in decoded] == ["FundTransfer"]
@@ -0,0 +1,62 @@
+"""Adaptive block window log scanning against the replay server."""
+import pytest
+from web3 import HTTPProvider, Web3
+
+from edgeless.logscanner import LogScanError, LogScanner, find_deployment_block
+from edgeless.replayserver import SYNTHETIC_ADDRESS, SYNTHETIC_START_BLOCK, SyntheticChain
+
+
+def scanner_web3(replay_server, events: int, **kwargs) -> Web3:
+    return Web3(HTTPProvider(replay_server(SyntheticChain(events), **kwargs).endpoint_uri))
+
+
+def test_window_grows_on_sparse_results(replay_server):
+    """Windows double while they hold less than half of the target log count."""
+    web3 = scanner_web3(replay_server, 300)
+    scanner = LogScanner(web3, SYNTHETIC_ADDRESS, initial_window=2, target_logs=100)
+
+    windows = list(scanner.scan_windows(SYNTHETIC_START_BLOCK, SYNTHETIC_START_BLOCK + 99))
+    sizes = [end - start + 1 for start, end, logs in windows]
+    assert sizes[:4] == [2, 4, 8, 16]
+    assert sum(len(logs) for start, end, logs in windows) == 300
+    assert scanner.retries == 0
+
+
+def test_window_shrinks_on_result_cap(replay_server):
+    """A window the node refuses is halved and retried, no logs are lost or repeated."""
+    web3 = scanner_web3(replay_server, 300, max_results=20)
+    scanner = LogScanner(web3, SYNTHETIC_ADDRESS, initial_window=100)
+
+    logs = list(scanner.scan(SYNTHETIC_START_BLOCK, SYNTHETIC_START_BLOCK + 99))
+    assert scanner.retries >= 4
+    assert len(logs) == 300
+    assert len(set(log["transactionHash"] for log in logs)) == 300
+    assert [log["blockNumber"] for log in logs] == sorted(log["blockNumber"] for log in logs)
+
+
+def test_window_shrinks_on_dense_results(replay_server):
+    """A window with more logs than the target makes the next one smaller."""
+    web3 = scanner_web3(replay_server, 300)
+    scanner = LogScanner(web3, SYNTHETIC_ADDRESS, initial_window=40, target_logs=60)
+
+    (start, end, logs), = list(scanner.scan_windows(SYNTHETIC_START_BLOCK, SYNTHETIC_START_BLOCK + 39))
+    assert len(logs) == 120
+    assert scanner.window == 20
+
+
+def test_scan_error_when_one_block_is_too_much(replay_server):
+    """The scan gives up once even the minimum window is refused."""
+    web3 = scanner_web3(replay_server, 30, max_results=2)
+    scanner = LogScanner(web3, SYNTHETIC_ADDRESS, initial_window=8)
+
+    with pytest.raises(LogScanError):
+        list(scanner.scan(SYNTHETIC_START_BLOCK, SYNTHETIC_START_BLOCK + 9))
+
+
+def test_find_deployment_block(replay_server):
+    """Binary search lands on the first block with contract code."""
+    web3 = scanner_web3(replay_server, 30)
+    assert find_deployment_block(web3, SYNTHETIC_ADDRESS) == SYNTHETIC_START_BLOCK
+
+    with pytest.raises(LogScanError):
+        find_deployment_block(web3, "0x" + "11" * 20)
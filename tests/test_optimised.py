@@ -0,0 +1,240 @@
+"""Gas optimised crowdsale and token behave exactly like the originals.
+
+The same transactions go to both pairs of contracts, each on its own fresh
+in-process EVM. Deployed from the same account, the contracts get the same
+addresses, so results, events and state must match byte for byte.
+"""
+import random
+from typing import List, Tuple
+
+import pytest
+from ethereum import tester
+from populus.project import Project
+
+from edgeless.evmchain import CONTRACTS, OPTIMISED_CONTRACTS, BlockGasLimitReached, EVMChain
+from edgeless.gasprofile import (
+    DEADLINES, ETHER, MULTISIG, MULTISIG_KEY, OWNER, OWNER_KEY, OWNER_UNLOCKED, START, TOKEN_START, Deployment, profile)
+
+
+#: Transaction start gas, plenty so that the cheaper contracts never run out where the originals do not
+STARTGAS = 500000
+
+#: Buyers and token holders
+ACTORS = [(tester.keys[i], tester.accounts[i]) for i in range(2, 7)]
+
+#: Everybody whose balances are compared
+ADDRESSES = [OWNER, MULTISIG] + [address for key, address in ACTORS]
+
+#: Moments the contracts behave differently at
+TIMES = [START - 1, START + 1] + [deadline - 1 for deadline in DEADLINES] + [TOKEN_START + 1, OWNER_UNLOCKED + 1]
+
+#: Investment sizes from below the token price to enough for the max goal in a few buys
+INVESTMENTS = [10 ** 14, ETHER, 100 * ETHER, 20000 * ETHER, 200000 * ETHER]
+
+#: Widths the optimised contracts narrow time and totals to
+TIME_BITS = 64
+TOTAL_BITS = 128
+
+#: Times around and past the width of the optimised time override
+WIDE_TIMES = [2 ** TIME_BITS - 1, 2 ** TIME_BITS, 2 ** TIME_BITS + START + 1, 2 ** 256 - 1]
+
+#: A step is sender key, contract ("crowdsale", "token", "both" or None for plain ether), function, arguments and value
+Step = Tuple[bytes, str, str, tuple, int]
+
+
+def random_steps(rnd: random.Random, count: int) -> List[Step]:
+    """Draw a transaction sequence, starting with a time so that no block timestamps are involved."""
+    steps = [(OWNER_KEY, "both", "setCurrent", (rnd.choice(TIMES),), 0)]
+    while len(steps) < count:
+        (key, address), (other_key, other), (_, third) = rnd.choice(ACTORS), rnd.choice(ACTORS), rnd.choice(ACTORS)
+        amount = rnd.choice([0, 1, 100, 10 ** 6, 10 ** 8])
+        steps.append(rnd.choice([
+            (OWNER_KEY, "both", "setCurrent", (rnd.choice(TIMES),), 0),
+            (key, None, None, (), rnd.choice(INVESTMENTS)),
+            (key, "crowdsale", "invest", (other,), rnd.choice(INVESTMENTS)),
+            (MULTISIG_KEY, None, None, (), rnd.choice(INVESTMENTS[:3])),
+            (key, "crowdsale", "checkGoalReached", (), 0),
+            (key, "crowdsale", "safeWithdrawal", (), 0),
+            (key, "token", "transfer", (other, amount), 0),
+            (key, "token", "batchTransfer", ([other, third], [amount, amount]), 0),
+            (OWNER_KEY, "token", "transfer", (other, rnd.choice([amount, 400000000])), 0),
+            (key, "token", "approve", (other, amount), 0),
+            (OWNER_KEY, "token", "approve", (other, amount), 0),
+            (other_key, "token", "transferFrom", (rnd.choice([address, OWNER]), third, amount), 0),
+            (key, "token", "burn", (), 0),
+        ]))
+    return steps
+
+
+def apply(deployment: Deployment, step: Step) -> list:
+    """Run a step, mining when the block is full.
+
+    :return: What must match: success, return data and events of every transaction
+    """
+    key, contract, function, args, value = step
+    chain = deployment.chain
+    targets = {
+        "crowdsale": [(deployment.crowdsale_contract, deployment.crowdsale)],
+        "token": [(deployment.token_contract, deployment.token)],
+        "both": [(deployment.crowdsale_contract, deployment.crowdsale), (deployment.token_contract, deployment.token)],
+        None: [(None, deployment.crowdsale)],
+    }[contract]
+
+    outcomes = []
+    for name, address in targets:
+        for attempt in range(2):
+            try:
+                if name is None:
+                    result = chain.send(key, address, value, startgas=STARTGAS)
+                else:
+                    result = chain.transact(key, name, address, function, list(args), value=value, startgas=STARTGAS)
+                break
+            except BlockGasLimitReached:
+                chain.mine()
+        outcomes.append((result.success, result.output, [(log.address, log.topics, log.data) for log in result.logs]))
+    return outcomes
+
+
+def state(deployment: Deployment) -> dict:
+    """Everything the contracts expose, and ether balances."""
+    crowdsale, token = deployment.crowdsale_call, deployment.token_call
+    block = deployment.chain.block
+    return {
+        "crowdsale": [crowdsale(name) for name in ["amountRaised", "tokensSold", "fundingGoalReached", "crowdsaleClosed", "getPrice", "current", "start", "beneficiary", "tokenReward"]],
+        "token": [token(name) for name in ["totalSupply", "owner", "burned", "current"]],
+        "investments": [crowdsale("balanceOf", address) for address in ADDRESSES],
+        "balances": [token("balanceOf", address) for address in ADDRESSES],
+        "allowances": [token("allowance", owner, spender) for owner in ADDRESSES for spender in ADDRESSES + [deployment.crowdsale]],
+        "ether": [block.get_balance(address) for address in ADDRESSES + [deployment.crowdsale]],
+    }
+
+
+@pytest.fixture
+def deployments(project: Project) -> Tuple[Deployment, Deployment]:
+    """Original and optimised contracts, gas is free so that ether balances can be compared."""
+    deployments = (Deployment(project.compiled_contracts, CONTRACTS, gas_price=0),
+                   Deployment(project.compiled_contracts, OPTIMISED_CONTRACTS, gas_price=0))
+    for deployment in deployments:
+        for key, address in ACTORS:
+            deployment.chain.set_balance(address, 10 ** 30)
+    return deployments
+
+
+def test_same_addresses(deployments):
+    """Deterministic deployment makes logs and balances comparable."""
+    original, optimised = deployments
+    assert (original.crowdsale, original.token) == (optimised.crowdsale, optimised.token)
+
+
+def test_same_constants(deployments):
+    """Constants that moved out of storage read the same."""
+    original, optimised = deployments
+    for deployment in deployments:
+        deployment.set_current(START + 1)
+
+    for name in ["fundingGoal", "maxGoal"]:
+        assert original.crowdsale_call(name) == optimised.crowdsale_call(name)
+    for name in ["deadlines", "prices"]:
+        assert [original.crowdsale_call(name, i) for i in range(4)] == [optimised.crowdsale_call(name, i) for i in range(4)]
+    for name in ["standard", "name", "symbol", "decimals", "startTime"]:
+        assert original.token_call(name) == optimised.token_call(name)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_sequences(deployments, seed: int):
+    """Random transaction sequences give the same results, events and state."""
+    original, optimised = deployments
+    steps = random_steps(random.Random(seed), 80)
+    for i, step in enumerate(steps):
+        assert apply(original, step) == apply(optimised, step), "Step {} {} differs".format(i, step)
+        if i % 10 == 9:
+            assert state(original) == state(optimised), "State after step {} {} differs".format(i, step)
+    assert state(original) == state(optimised)
+
+
+def test_full_crowdsale(deployments):
+    """Sell out, close, burn and trade, checking state after every step."""
+    original, optimised = deployments
+    (key, address), (key_2, address_2) = ACTORS[:2]
+    steps = [
+        (OWNER_KEY, "both", "setCurrent", (DEADLINES[0] - 1,), 0),
+        (key, None, None, (), 150000 * ETHER),
+        (key_2, "crowdsale", "invest", (address,), 150000 * ETHER),
+        (key_2, None, None, (), 150000 * ETHER),  # Over the max goal
+        (OWNER_KEY, "both", "setCurrent", (DEADLINES[-1] + 1,), 0),
+        (key, "crowdsale", "checkGoalReached", (), 0),
+        (key, "token", "burn", (), 0),  # Burned already
+        (key, "token", "transfer", (address_2, 1000), 0),
+        (OWNER_KEY, "token", "transfer", (address_2, 1000), 0),  # Locked
+        (OWNER_KEY, "both", "setCurrent", (OWNER_UNLOCKED + 1,), 0),
+        (OWNER_KEY, "token", "transfer", (address_2, 1000), 0),
+    ]
+    for step in steps:
+        assert apply(original, step) == apply(optimised, step)
+        assert state(original) == state(optimised)
+    assert original.crowdsale_call("fundingGoalReached")
+
+
+@pytest.mark.parametrize("time", WIDE_TIMES)
+def test_time_override_width(deployments, time: int):
+    """The optimised contracts at a time behave like the originals at its low 64 bits, see the contract headers."""
+    original, optimised = deployments
+    key, address = ACTORS[0]
+    other_key, other = ACTORS[1]
+
+    original.set_current(time)
+    assert original.crowdsale_call("current") == original.token_call("current") == time
+
+    # A narrowed time of 0 falls back to now, the same block time on both chains
+    for deployment in deployments:
+        deployment.chain.block.timestamp = START + 1
+
+    narrowed = time % 2 ** TIME_BITS
+    steps = [
+        (key, "crowdsale", "invest", (address,), ETHER),
+        (key, "token", "transfer", (other, 1), 0),
+        (other_key, "crowdsale", "safeWithdrawal", (), 0),
+    ]
+    original.set_current(narrowed)
+    optimised.set_current(time)
+    for step in steps:
+        assert apply(original, step) == apply(optimised, step), step
+    assert state(original) == state(optimised)
+
+
+@pytest.mark.parametrize("start", [2 ** TIME_BITS - 1, 2 ** TIME_BITS + START, 2 ** 256 - 1])
+def test_start_width(project: Project, start: int):
+    """The optimised crowdsale keeps the low 64 bits of a wider start."""
+    chain = EVMChain(project.compiled_contracts)
+    original = chain.deploy(CONTRACTS[0], [OWNER, MULTISIG, start], key=OWNER_KEY)
+    optimised = chain.deploy(OPTIMISED_CONTRACTS[0], [OWNER, MULTISIG, start], key=OWNER_KEY)
+    chain.mine()
+    assert chain.call(CONTRACTS[0], original, "start") == start
+    assert chain.call(OPTIMISED_CONTRACTS[0], optimised, "start") == start % 2 ** TIME_BITS
+
+
+def test_investment_width(deployments):
+    """Investments around the width of the optimised totals are refused alike, as they buy more than maxGoal."""
+    original, optimised = deployments
+    key, address = ACTORS[0]
+    for deployment in deployments:
+        deployment.chain.set_balance(address, 2 ** (TOTAL_BITS + 2))
+
+    steps = [(OWNER_KEY, "both", "setCurrent", (DEADLINES[-1] - 1,), 0)]
+    steps += [(key, "crowdsale", "invest", (address,), value) for value in [2 ** TOTAL_BITS - 1, 2 ** TOTAL_BITS, 2 ** (TOTAL_BITS + 1)]]
+    for step in steps:
+        outcome = apply(original, step)
+        assert outcome == apply(optimised, step), step
+    assert not outcome[0][0]
+    assert state(original) == state(optimised)
+
+
+def test_gas_saved(project: Project):
+    """The optimised contracts never cost more, print what they save."""
+    original = profile(project.compiled_contracts, contracts=CONTRACTS)
+    optimised = profile(project.compiled_contracts, contracts=OPTIMISED_CONTRACTS)
+    for name in original:
+        saved = original[name] - optimised[name]
+        print("{:<50} {:>8} {:>8} {:>+8}".format(name, original[name], optimised[name], -saved))
+        assert saved >= 0, name
+    assert sum(optimised.values()) < sum(original.values())
@@ -0,0 +1,101 @@
+"""Deployment plans."""
+import populus.chain
+import pytest
+from web3 import Web3
+
+from edgeless.deploy import crowdsale_steps
+from edgeless.evmchain import EVMChain
+from edgeless.evmnode import EVMNode
+from edgeless.plan import Deploy, Plan, PlanError, PlanExecutor, Ref, Send, Transact
+
+
+RECEIVER = "0x" + "42" * 20
+
+
+@pytest.fixture
+def plan(beneficiary, multisig) -> Plan:
+    return Plan(crowdsale_steps(beneficiary, multisig, 1))
+
+
+def test_groups(plan: Plan):
+    """Independent steps are grouped together."""
+    assert plan.groups() == [["crowdsale", "token"], ["set_token", "approve"]]
+
+
+def test_unknown_dependency():
+    """Referring to a step that does not exist is an error."""
+    with pytest.raises(PlanError):
+        Plan([Transact("set_token", Ref("crowdsale"), "setToken", [Ref("token")])])
+
+
+def test_fingerprint(plan: Plan, beneficiary: str, multisig: str):
+    """Changing any step argument changes the fingerprint."""
+    assert plan.fingerprint() == Plan(crowdsale_steps(beneficiary, multisig, 1)).fingerprint()
+    assert plan.fingerprint() != Plan(crowdsale_steps(beneficiary, multisig, 2)).fingerprint()
+
+
+def test_run_and_resume(chain: populus.chain.TesterChain, web3: Web3, plan: Plan, beneficiary: str, tmpdir):
+    """A finished plan is not run again."""
+
+    state_path = str(tmpdir.join("deploy-state.json"))
+    executor = PlanExecutor(web3, chain.get_contract_factory, beneficiary, state_path, timeout=10, assign_nonces=False)
+    results = executor.run(plan)
+
+    token = executor.contract("token")
+    crowdsale = executor.contract("crowdsale")
+    assert crowdsale.call().tokenReward() == token.address
+    assert token.call().allowance(beneficiary, crowdsale.address) == 440000000
+
+    block_number = web3.eth.blockNumber
+    executor = PlanExecutor(web3, chain.get_contract_factory, beneficiary, state_path, timeout=10, assign_nonces=False)
+    assert executor.run(plan) == results
+    assert web3.eth.blockNumber == block_number
+
+
+def test_state_for_other_plan(chain: populus.chain.TesterChain, web3: Web3, plan: Plan, beneficiary: str, tmpdir):
+    """State file of a different plan is refused."""
+
+    state_path = str(tmpdir.join("deploy-state.json"))
+    PlanExecutor(web3, chain.get_contract_factory, beneficiary, state_path, timeout=10, assign_nonces=False).run(
+        Plan([Deploy("token", "EdgelessToken", [beneficiary])]))
+
+    with pytest.raises(PlanError):
+        PlanExecutor(web3, chain.get_contract_factory, beneficiary, state_path, assign_nonces=False).run(plan)
+
+
+class FlakySend(Send):
+    """Fails to send the first ``failures`` times, like a node dropping the connection."""
+
+    def __init__(self, *args, failures=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failures = failures
+
+    def send(self, executor, transaction):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Node went away")
+        return super().send(executor, transaction)
+
+
+def test_assigned_nonces(tmpdir):
+    """Steps of a group get consecutive nonces and are mined in one block, a step that failed to send leaves no gap."""
+    web3 = Web3(EVMNode(EVMChain({}), mine_on_poll=True))
+    sender = web3.eth.accounts[0]
+    plan = Plan([
+        Send("first", RECEIVER, 1),
+        FlakySend("second", RECEIVER, 2, failures=1),
+        Send("third", RECEIVER, 3),
+        Send("after", RECEIVER, 4, depends=["first", "second", "third"]),
+    ])
+
+    executor = PlanExecutor(web3, None, sender, str(tmpdir.join("deploy-state.json")), timeout=5, assign_nonces=True)
+    with pytest.raises(ConnectionError):
+        executor.run(plan)
+
+    results = executor.run(plan)
+    nonces = {name: web3.eth.getTransaction(result["txid"])["nonce"] for name, result in results.items()}
+    assert sorted(nonces.values()) == [0, 1, 2, 3]
+    assert nonces["after"] == 3
+    assert results["first"]["block_number"] == results["second"]["block_number"] == results["third"]["block_number"]
+    assert results["after"]["block_number"] > results["third"]["block_number"]
+    assert web3.eth.getTransactionCount(sender) == 4
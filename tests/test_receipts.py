@@ -0,0 +1,82 @@
+"""Receipt tracker."""
+import pytest
+from web3 import Web3
+from web3.utils.currency import to_wei
+
+from edgeless.evmchain import EVMChain
+from edgeless.evmnode import EVMNode
+from edgeless.receipts import ReceiptTracker, wait_for_transactions
+
+
+class FailingNode(EVMNode):
+    """Drops the connection on the given number of block filter polls."""
+
+    def __init__(self, failures: int):
+        super().__init__(EVMChain({}), mine_on_poll=True)
+        self.failures = failures
+
+    def make_request(self, method, params):
+        if method == "eth_getFilterChanges" and self.failures:
+            self.failures -= 1
+            raise ConnectionError("Connection reset")
+        return super().make_request(method, params)
+
+
+def send(web3: Web3) -> str:
+    return web3.eth.sendTransaction({"from": web3.eth.accounts[0], "to": "0x" + "42" * 20, "value": 1, "gas": 30000})
+
+
+def test_track_many(web3: Web3, customer: str, empty_address: str):
+    """Many transactions resolve to their receipts, callbacks fire."""
+
+    tracker = ReceiptTracker(web3, poll_interval=0.01)
+    done = []
+
+    txids = [web3.eth.sendTransaction({"from": customer, "to": empty_address, "value": to_wei(1, "ether")}) for i in range(5)]
+    futures = [tracker.track(txid) for txid in txids]
+    for future in futures:
+        future.add_done_callback(done.append)
+
+    receipts = tracker.wait(futures, timeout=10)
+    tracker.close()
+
+    assert [r["transactionHash"] for r in receipts] == txids
+    assert len(done) == 5
+
+    # All pending transactions were checked in one pass
+    assert tracker.checks == 1
+
+
+def test_wait_for_transactions(web3: Web3, customer: str, empty_address: str):
+    """Receipts of several transactions are waited for together."""
+
+    txids = [web3.eth.sendTransaction({"from": customer, "to": empty_address, "value": 1}) for i in range(3)]
+    receipts = wait_for_transactions(web3, txids, timeout=10)
+    assert set(receipts.keys()) == set(txids)
+
+
+def test_background_poll_error_retried():
+    """A failed poll in the background thread is tried again on the next interval."""
+    web3 = Web3(FailingNode(failures=1))
+    tracker = ReceiptTracker(web3, poll_interval=0.01)
+    future = tracker.track(send(web3))
+    tracker.start()
+    try:
+        assert future.result(timeout=5)["blockNumber"] == 1
+    finally:
+        tracker.close()
+    assert tracker.errors == 1
+
+
+def test_background_poll_errors_fail_pending():
+    """Pending transactions get the error once polls keep failing."""
+    web3 = Web3(FailingNode(failures=3))
+    tracker = ReceiptTracker(web3, poll_interval=0.01, max_errors=3)
+    future = tracker.track(send(web3))
+    tracker.start()
+    try:
+        with pytest.raises(ConnectionError):
+            future.result(timeout=5)
+    finally:
+        tracker.close()
+    assert not tracker.pending
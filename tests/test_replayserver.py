@@ -0,0 +1,40 @@
+"""Replay JSON-RPC server."""
+from web3 import HTTPProvider, Web3
+
+from edgeless.batchrpc import BatchRPC
+from edgeless.logdecoder import FUND_TRANSFER_TOPIC, TRANSFER_TOPIC
+from edgeless.logscanner import get_logs
+from edgeless.replayserver import SYNTHETIC_ADDRESS, SYNTHETIC_START_BLOCK, RecordedChain, SyntheticChain, record
+
+
+def test_topic_alternatives(replay_server):
+    """A list of topics matches any of them, like on a real node."""
+    server = replay_server(SyntheticChain(30))
+    web3 = Web3(HTTPProvider(server.endpoint_uri))
+    end = SYNTHETIC_START_BLOCK + 9
+
+    everything = get_logs(web3, SYNTHETIC_ADDRESS, [], SYNTHETIC_START_BLOCK, end)
+    assert len(everything) == 30
+    assert get_logs(web3, SYNTHETIC_ADDRESS, [[TRANSFER_TOPIC, FUND_TRANSFER_TOPIC]], SYNTHETIC_START_BLOCK, end) == everything
+    assert get_logs(web3, SYNTHETIC_ADDRESS, [None], SYNTHETIC_START_BLOCK, end) == everything
+    assert get_logs(web3, SYNTHETIC_ADDRESS, [[TRANSFER_TOPIC]], SYNTHETIC_START_BLOCK, end) == []
+
+    # FundTransfer has no indexed arguments
+    assert get_logs(web3, SYNTHETIC_ADDRESS, [FUND_TRANSFER_TOPIC, "0x" + "00" * 32], SYNTHETIC_START_BLOCK, end) == []
+
+
+def test_record_and_replay(replay_server, tmpdir):
+    """A recording made in capped windows serves the same logs and timestamps as the original."""
+    original = replay_server(SyntheticChain(300), max_results=50)
+    web3 = Web3(HTTPProvider(original.endpoint_uri))
+    path = str(tmpdir.join("recording.json"))
+
+    end = web3.eth.blockNumber
+    assert record(web3, BatchRPC.from_web3(web3), SYNTHETIC_ADDRESS, SYNTHETIC_START_BLOCK, end, path, window=1000) == 300
+
+    replayed = Web3(HTTPProvider(replay_server(RecordedChain.load(path)).endpoint_uri))
+    assert replayed.eth.blockNumber == end
+    assert len(get_logs(replayed, SYNTHETIC_ADDRESS, [FUND_TRANSFER_TOPIC], 0, end)) == 300
+    for start in range(SYNTHETIC_START_BLOCK, SYNTHETIC_START_BLOCK + 100, 10):
+        assert get_logs(replayed, SYNTHETIC_ADDRESS, [], start, start + 9) == get_logs(web3, SYNTHETIC_ADDRESS, [], start, start + 9)
+    assert replayed.eth.getBlock(SYNTHETIC_START_BLOCK + 5)["timestamp"] == web3.eth.getBlock(SYNTHETIC_START_BLOCK + 5)["timestamp"]
@@ -0,0 +1,78 @@
+"""Block range sharding and deterministic merge."""
+from web3 import HTTPProvider, Web3
+
+from edgeless.batchrpc import BatchRPC
+from edgeless.export import EventWriter, ExportState, aggregate, sort_events, write_csv
+from edgeless.pipeline import fund_transfer_windows
+from edgeless.replayserver import SYNTHETIC_ADDRESS, SYNTHETIC_START_BLOCK, SyntheticChain
+from edgeless.sharded import shard_ranges
+from edgeless.timestamps import BlockTimestampCache
+
+
+def test_shard_ranges_cover_range():
+    """Shards are contiguous, cover the whole range and differ in size by one block at most."""
+    ranges = shard_ranges(10, 100, 7)
+    assert ranges[0][0] == 10
+    assert ranges[-1][1] == 100
+    assert all(a[1] + 1 == b[0] for a, b in zip(ranges, ranges[1:]))
+
+    sizes = [end - start + 1 for start, end in ranges]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_more_shards_than_blocks():
+    """Every shard has at least one block."""
+    assert shard_ranges(5, 7, 10) == [(5, 5), (6, 6), (7, 7)]
+
+
+def test_sort_events():
+    """Events come out in block and log index order, whatever order the node gave them in."""
+    events = [
+        {"blockNumber": 3, "logIndex": 0},
+        {"blockNumber": 1, "logIndex": 2},
+        {"blockNumber": 1, "logIndex": 0},
+    ]
+    (start, end, ordered), = sort_events([(1, 3, events)])
+    assert [(e["blockNumber"], e["logIndex"]) for e in ordered] == [(1, 0), (1, 2), (3, 0)]
+
+
+def test_empty_range():
+    """A range that ends before it starts has no shards."""
+    assert shard_ranges(10, 9, 4) == []
+    assert shard_ranges(10, 5, 1) == []
+
+
+def test_last_block_never_rewinds():
+    """Windows of an already covered or older range leave the checkpoint block alone."""
+    state = ExportState("0x" + "11" * 20, last_block=100)
+    for window in aggregate([(50, 60, [])], state):
+        pass
+    assert state.last_block == 100
+
+    for window in aggregate([(101, 120, [])], state):
+        pass
+    assert state.last_block == 120
+
+
+def test_same_output_as_single_process(replay_server, tmpdir):
+    """The sharded export writes the same aggregate and event files as the single process one."""
+    chain = SyntheticChain(900, backers=200)
+    web3 = Web3(HTTPProvider(replay_server(chain, max_results=100).endpoint_uri))
+
+    def export(name: str, processes: int):
+        batch = BatchRPC.from_web3(web3)
+        timestamps = BlockTimestampCache(web3, str(tmpdir.join(name + ".sqlite")), batch=batch)
+        state = ExportState(SYNTHETIC_ADDRESS)
+        event_writer = EventWriter(str(tmpdir.join(name + "-events.csv")))
+        scanner, windows = fund_transfer_windows(web3, batch, timestamps, SYNTHETIC_ADDRESS,
+                                                 SYNTHETIC_START_BLOCK, chain.block_number(), window=40, processes=processes)
+        for window in aggregate(event_writer.write(windows), state):
+            pass
+        event_writer.close()
+        timestamps.close()
+        write_csv(state, str(tmpdir.join(name + ".csv")))
+
+    export("single", 1)
+    export("sharded", 3)
+    assert tmpdir.join("sharded.csv").read_binary() == tmpdir.join("single.csv").read_binary()
+    assert tmpdir.join("sharded-events.csv").read_binary() == tmpdir.join("single-events.csv").read_binary()
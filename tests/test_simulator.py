@@ -0,0 +1,118 @@
+"""Reference simulator of crowdsale and token."""
+import random
+
+import pytest
+from populus.project import Project
+
+from edgeless.crosscheck import cross_check
+from edgeless.evmchain import OPTIMISED_CONTRACTS
+from edgeless.simulator import (
+    DEADLINES, MULTISIG, OWNER, OWNER_LOCK_END, PRICES, START, TOKEN_START, Operation, Simulation, random_operations)
+
+
+ETHER = 10 ** 18
+
+
+@pytest.fixture
+def sale() -> Simulation:
+    return Simulation()
+
+
+def test_price_tiers(sale: Simulation):
+    """Price follows the deadlines."""
+    for deadline, price in zip(DEADLINES, PRICES):
+        sale.set_current(deadline - 1)
+        assert sale.crowdsale.price() == price
+    sale.set_current(DEADLINES[-1] + 1)
+    assert sale.crowdsale.price() == PRICES[-1]
+
+
+def test_invest(sale: Simulation):
+    """Tokens come from the beneficiary, nothing changes on a refused buy."""
+    sale.set_current(START - 1)
+    assert not sale.invest(2, 2, ETHER)
+
+    sale.set_current(START + 1)
+    assert sale.invest(2, 3, ETHER)
+    assert not sale.invest(2, 2, PRICES[0] - 1)
+    assert sale.token.balance_of(3) == ETHER // PRICES[0]
+    assert sale.crowdsale.balances == {3: ETHER}
+    assert sale.crowdsale.tokens_sold == ETHER // PRICES[0]
+
+
+def test_max_goal(sale: Simulation):
+    """The buy that would go over the max goal is refused."""
+    sale.set_current(START + 1)
+    assert sale.invest(2, 2, 150000 * ETHER)
+    assert sale.invest(3, 3, 150000 * ETHER)
+    assert not sale.invest(4, 4, 150000 * ETHER)
+    assert sale.crowdsale.tokens_sold == 360000000
+
+
+def test_goal_reached_burns(sale: Simulation):
+    """Closing a successful crowdsale leaves the owner 60M tokens."""
+    sale.set_current(START + 1)
+    assert sale.invest(2, 2, 50000 * ETHER)
+    sale.set_current(DEADLINES[-1] + 1)
+    assert sale.crowdsale.check_goal_reached()
+    assert sale.crowdsale.funding_goal_reached
+    assert sale.token.balance_of(OWNER) == 60000000
+    assert sale.token.total_supply == 60000000 + 60000000
+
+
+def test_refund(sale: Simulation):
+    """Refunds are paid from what the multisig returned."""
+    sale.set_current(START + 1)
+    assert sale.invest(2, 2, ETHER)
+    sale.set_current(DEADLINES[-1] + 1)
+    assert sale.crowdsale.check_goal_reached()
+    assert not sale.crowdsale.funding_goal_reached
+
+    assert sale.crowdsale.safe_withdrawal(2)
+    assert sale.crowdsale.balances[2] == ETHER
+
+    assert sale.crowdsale.receive(MULTISIG, ETHER)
+    assert sale.crowdsale.safe_withdrawal(2)
+    assert sale.crowdsale.balances[2] == 0
+    assert sale.crowdsale.ether == 0
+
+
+def test_owner_lock(sale: Simulation):
+    """The owner keeps 50M tokens for the first year."""
+    sale.set_current(TOKEN_START + 1)
+    assert not sale.token.transfer(OWNER, 2, 450000001)
+    assert not sale.token.batch_transfer(OWNER, [2, 3], [450000000, 1])
+    assert sale.token.transfer(OWNER, 2, 450000000)
+
+    sale.set_current(OWNER_LOCK_END + 1)
+    assert sale.token.transfer(OWNER, 2, 50000000)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_cross_check(project: Project, seed: int):
+    """Random operations give the same results and state on the contracts."""
+    cross_check(project.compiled_contracts, random_operations(random.Random(seed), 200), check_every=10)
+
+
+def test_cross_check_full_crowdsale(project: Project):
+    """Sell out, close, burn and trade, comparing state after every step."""
+    operations = [
+        Operation("setCurrent", OWNER, (START + 1,), 0),
+        Operation("send", 2, (), 150000 * ETHER),
+        Operation("invest", 3, (2,), 150000 * ETHER),
+        Operation("send", 4, (), 150000 * ETHER),
+        Operation("setCurrent", OWNER, (DEADLINES[-1] + 1,), 0),
+        Operation("checkGoalReached", 5, (), 0),
+        Operation("burn", 5, (), 0),
+        Operation("transfer", 2, (3, 1000), 0),
+        Operation("batchTransfer", OWNER, ([3, 4], [5000000, 5000000]), 0),
+        Operation("transfer", OWNER, (3, 1), 0),
+        Operation("setCurrent", OWNER, (OWNER_LOCK_END + 1,), 0),
+        Operation("transfer", OWNER, (3, 1), 0),
+    ]
+    cross_check(project.compiled_contracts, operations)
+
+
+def test_cross_check_optimised(project: Project):
+    """The simulator matches the gas optimised contracts too."""
+    cross_check(project.compiled_contracts, random_operations(random.Random(100), 200), check_every=10, contracts=OPTIMISED_CONTRACTS)
@@ -0,0 +1,77 @@
+"""Token holder balance snapshots."""
+import pytest
+from web3 import Web3
+from web3.contract import Contract
+from web3.utils.currency import to_wei
+
+from edgeless.logdecoder import decode_logs
+from edgeless.logscanner import find_deployment_block
+from edgeless.snapshot import BalanceSnapshots, SnapshotError, get_total_supply
+
+
+def replay_token(web3: Web3, token: Contract, owner: str, checkpoint_interval: int) -> BalanceSnapshots:
+    """Feed all token events to a snapshot engine as one window."""
+    log_filter = web3.eth.filter({"address": token.address, "fromBlock": 0, "toBlock": "latest"})
+    events = decode_logs(web3.eth.getFilterLogs(log_filter.filter_id))
+
+    deployment_block = find_deployment_block(web3, token.address)
+    snapshots = BalanceSnapshots(owner, deployment_block, checkpoint_interval=checkpoint_interval)
+    list(snapshots.replay([(deployment_block, web3.eth.blockNumber, events)]))
+    return snapshots
+
+
+def test_balances_at_blocks(open_crowdsale: Contract, token: Contract, customer: str, customer_2: str, empty_address: str, beneficiary: str, web3: Web3, end: int):
+    """Balances at every block match what the token said at that block."""
+
+    holders = [customer, customer_2, empty_address, beneficiary]
+    expected = {}
+
+    def record(txid):
+        block = web3.eth.getTransactionReceipt(txid)["blockNumber"]
+        expected[block] = {address: token.call().balanceOf(address) for address in holders}
+
+    record(web3.eth.sendTransaction({"from": customer, "to": open_crowdsale.address, "value": to_wei(20, "ether"), "gas": 250000}))
+    record(web3.eth.sendTransaction({"from": customer_2, "to": open_crowdsale.address, "value": to_wei(3, "ether"), "gas": 250000}))
+
+    token.transact().setCurrent(end + 1)
+    record(token.transact({"from": customer}).transfer(empty_address, 1000))
+    record(token.transact({"from": customer_2}).transfer(customer, 1))
+    record(token.transact().burn())
+
+    snapshots = replay_token(web3, token, beneficiary, checkpoint_interval=2)
+    assert len(snapshots.checkpoints) > 1
+
+    for block, balances in expected.items():
+        snapshot = snapshots.balances_at(block)
+        assert {address: snapshot.get(address, 0) for address in holders} == balances
+
+    # Burn took the owner down to the team share
+    assert snapshots.balances_at(max(expected))[beneficiary] == 60000000
+
+    latest = snapshots.last_block
+    snapshots.verify(latest, token.call().totalSupply())
+
+
+def test_verify_mismatch(open_crowdsale: Contract, token: Contract, customer: str, beneficiary: str, web3: Web3):
+    """A missed burn shows up as a supply mismatch."""
+
+    web3.eth.sendTransaction({"from": customer, "to": open_crowdsale.address, "value": to_wei(20, "ether"), "gas": 250000})
+    snapshots = replay_token(web3, token, beneficiary, checkpoint_interval=10000)
+
+    total_supply = get_total_supply(web3, token.address, "latest")
+    snapshots.verify(snapshots.last_block, total_supply)
+
+    with pytest.raises(SnapshotError):
+        snapshots.verify(snapshots.last_block, total_supply - 1)
+
+
+def test_out_of_range(open_crowdsale: Contract, token: Contract, beneficiary: str, web3: Web3):
+    """Blocks before deployment or after the replayed range cannot be answered."""
+
+    snapshots = replay_token(web3, token, beneficiary, checkpoint_interval=10000)
+
+    with pytest.raises(ValueError):
+        snapshots.balances_at(snapshots.deployment_block - 1)
+
+    with pytest.raises(ValueError):
+        snapshots.balances_at(snapshots.last_block + 1)
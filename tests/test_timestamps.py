@@ -0,0 +1,67 @@
+"""Block timestamp cache against the replay server."""
+from web3 import HTTPProvider, Web3
+
+from edgeless.batchrpc import BatchRPC
+from edgeless.replayserver import SYNTHETIC_GENESIS_TIME, SYNTHETIC_START_BLOCK, SyntheticChain
+from edgeless.timestamps import BlockTimestampCache
+
+
+def header_requests(server) -> int:
+    return server.stats()["calls"].get("eth_getBlockByNumber", 0)
+
+
+def test_distinct_blocks_fetched_once(replay_server, tmpdir):
+    """Repeated block numbers cost one header request each, later lookups come from memory."""
+    server = replay_server(SyntheticChain(300))
+    web3 = Web3(HTTPProvider(server.endpoint_uri))
+    cache = BlockTimestampCache(web3, str(tmpdir.join("timestamps.sqlite")))
+
+    blocks = [SYNTHETIC_START_BLOCK + i // 3 for i in range(30)]
+    timestamps = cache.resolve(blocks)
+    assert timestamps == {n: SYNTHETIC_GENESIS_TIME + n * 15 for n in set(blocks)}
+    assert header_requests(server) == 10
+    assert cache.fetches == 10
+
+    assert cache.get(SYNTHETIC_START_BLOCK) == SYNTHETIC_GENESIS_TIME + SYNTHETIC_START_BLOCK * 15
+    assert header_requests(server) == 10
+    cache.close()
+
+
+def test_persisted_across_runs(replay_server, tmpdir):
+    """A second cache on the same file needs no header requests for confirmed blocks."""
+    server = replay_server(SyntheticChain(300))
+    web3 = Web3(HTTPProvider(server.endpoint_uri))
+    path = str(tmpdir.join("timestamps.sqlite"))
+    blocks = list(range(SYNTHETIC_START_BLOCK, SYNTHETIC_START_BLOCK + 20))
+
+    cache = BlockTimestampCache(web3, path, batch=BatchRPC.from_web3(web3))
+    first = cache.resolve(blocks)
+    cache.close()
+    server.reset()
+
+    cache = BlockTimestampCache(web3, path)
+    assert cache.resolve(blocks) == first
+    assert cache.fetches == 0
+    assert cache.hits == 20
+    assert header_requests(server) == 0
+    cache.close()
+
+
+def test_unconfirmed_blocks_not_persisted(replay_server, tmpdir):
+    """Blocks within the confirmation distance of the head are fetched again by the next run."""
+    chain = SyntheticChain(300)
+    server = replay_server(chain)
+    web3 = Web3(HTTPProvider(server.endpoint_uri))
+    path = str(tmpdir.join("timestamps.sqlite"))
+    head = chain.block_number()
+    blocks = list(range(head - 19, head + 1))
+
+    cache = BlockTimestampCache(web3, path, confirmations=12)
+    cache.resolve(blocks)
+    cache.close()
+
+    cache = BlockTimestampCache(web3, path, confirmations=12)
+    cache.resolve(blocks)
+    assert cache.hits == 8
+    assert cache.fetches == 12
+    cache.close()